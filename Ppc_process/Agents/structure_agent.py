@@ -57,12 +57,12 @@ async def url_agent(PROMPT=prompt, items=None, Ad_group=None, Ad_headline=None,
         return None, None, None, None, 0
 
 
-def process_clusters(data):
+async def process_clusters(data):
     config = ClusteringConfig(min_clusters=min_clusters, max_clusters=max_clusters)  
     clusterer = Cluster(config)
     metadata_column = "Keyword"
 
-    results, optimal_cluster = clusterer.process_clustering(data, metadata_column)
+    results, optimal_cluster = await clusterer.aprocess_clustering(data, metadata_column)
     print(f"Optimal number of clusters: {optimal_cluster}")
     
     if isinstance(results, str):
@@ -83,7 +83,7 @@ def process_clusters(data):
             continue  
 
     print(f"Found {len(clusters)} clusters")
-    return clusters
+    return clusters, clusterer.fitted_model
 
 
 async def agent_call_sequential(cluster_items, batch_size=100):
@@ -201,7 +201,7 @@ async def process_single_cluster(cluster_id, cluster_items, batch_size=100):
 
 async def agent_recursion(clusters, batch_size=100): 
     """Process all clusters concurrently"""
-    cluster_data = process_clusters(clusters)
+    cluster_data, fitted_model = await process_clusters(clusters)
     global_token_count = 0 
     
     # Create tasks for all clusters to run concurrently
@@ -225,7 +225,7 @@ async def agent_recursion(clusters, batch_size=100):
     print(f"Processed {len(final_results)} total items across all clusters")
     print(f"Total token usage across all clusters: {global_token_count}")          
 
-    return final_results, global_token_count
+    return final_results, global_token_count, fitted_model
 
 
 # Main entry point to run the code
@@ -240,9 +240,9 @@ async def ppc_main(input_data, batch_size=100):
                          If cluster has <= 100 items: batches run concurrently
                          Clusters always run concurrently regardless of size
     """
-    results, total_token_count = await agent_recursion(input_data, batch_size)
+    results, total_token_count, fitted_model = await agent_recursion(input_data, batch_size)
     print(f"Total token count: {total_token_count}")
-    return results, total_token_count
+    return results, total_token_count, fitted_model
 
 
 # Example usage
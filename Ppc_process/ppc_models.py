@@ -91,4 +91,24 @@ class PPCFileNameUpdate(BaseModel):
     file_name: Optional[str] = None
     def validate(self):
         if not self.file_name:
-            raise ValueError("File name must be provided")    
\ No newline at end of file
+            raise ValueError("File name must be provided")
+
+
+class AssignKeywordRequest(BaseModel):
+    keywords: List[KeywordItem]
+
+
+class BulkKeywordRequest(BaseModel):
+    keywords: List[str]
+    location_ids: Optional[List[Location]] = []
+    language_id: Optional[Language] = None
+    mode: str = "ideas"  # "ideas" (expand seeds) or "historical" (exact volumes for the list)
+    aggregate: str = "max"  # how duplicate ideas merge their volumes: "max" or "avg"
+
+    def validate(self):
+        if not self.keywords:
+            raise ValueError("'keywords' must contain at least one keyword")
+        if self.mode not in ("ideas", "historical"):
+            raise ValueError("'mode' must be 'ideas' or 'historical'")
+        if self.aggregate not in ("max", "avg"):
+            raise ValueError("'aggregate' must be 'max' or 'avg'")
@@ -1,13 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from auth.auth import get_db
-from auth.models import  PPCCluster, PPCFile, PPCCSV
+from auth.models import  PPCCluster, PPCFile, PPCCSV, ClusterModel
 from typing import List
 import pandas as pd
 import io
 from Seo_process.Agents.Keyword_agent import query_keywords_description
-from .ppc_models import KeywordRequest, KeywordItem, ppcPageUpdate, UUIDRequest, KeywordClusterRequest, PPCFileNameUpdate
+from .ppc_models import BulkKeywordRequest, KeywordRequest, KeywordItem, ppcPageUpdate, UUIDRequest, KeywordClusterRequest, PPCFileNameUpdate, AssignKeywordRequest
 from Seo_process.prompts.keywords_prompt import prompt_keyword
 from utils import (  
     extract_keywords,
@@ -23,14 +23,25 @@ from utils import (
 
 from Ppc_process.Agents.structure_agent import ppc_main
 from google_ads.ppc_process import ppc_keywords_main
+from google_ads.bulk_keywords import (
+    ADS_BULK_SYNC_MAX_SEEDS,
+    bulk_seeds,
+    bulk_call_count,
+    run_bulk_keywords,
+    create_bulk_job,
+    get_bulk_job,
+    run_bulk_job,
+    bulk_job_to_dict
+)
 
 from S3_bucket.S3_upload import upload_title_url
 from sqlalchemy.orm import Session
 from S3_bucket.fetch_document import fetch_ppc_cluster_file
 from fastapi.responses import JSONResponse
 from fastapi import Body
-from utils import verify_jwt_token, check_api_limit
-from S3_bucket.utile import  upload_ppc_table
+from utils import verify_jwt_token, check_api_limit, charge_api_calls, refund_api_calls
+from S3_bucket.utile import  upload_ppc_table, upload_cluster_model, load_cluster_model, put_cluster_model, delete_cluster_model
+from clustering_pipeline.incremental import assign_keywords_to_file
 from S3_bucket.delete_doc import  ppc_cluster_delete_document
 from sqlalchemy.orm.attributes import flag_modified
 from auth.auth import get_db
@@ -94,6 +105,62 @@ def ppc_generate_keywords(request: KeywordRequest,user=Depends(check_api_limit("
         raise HTTPException(status_code=400, detail=str(e))
     
 
+@router.post("/ppc_bulk_keywords")
+def ppc_bulk_keywords(
+    request: BulkKeywordRequest,
+    background_tasks: BackgroundTasks,
+    user=Depends(check_api_limit("ppc_keywords")),
+    db: Session = Depends(get_db)
+):
+    """
+    Keyword ideas or exact historical volumes for large seed lists (beyond
+    the 20-keyword limit of /ppc_generate_keywords), fetched in chunks.
+    Costs one API call per ADS_BULK_SEEDS_PER_CALL seeds; lists above
+    ADS_BULK_SYNC_MAX_SEEDS run in the background and return a job to poll
+    at /ppc_bulk_keywords/jobs/{job_id}.
+    """
+    try:
+        request.validate()
+        seeds = bulk_seeds(request.keywords)
+        location_ids = [loc.id for loc in request.location_ids or []] or [2840]
+        language_id = request.language_id.ID if request.language_id else "1000"
+
+        calls = bulk_call_count(seeds)
+        # check_api_limit already charged the first call; all of them are
+        # refunded if the fetch fails
+        charge_api_calls(db, user, "ppc_keywords", calls - 1)
+        charged = 0 if user.role == "admin" else calls
+
+        if len(seeds) > ADS_BULK_SYNC_MAX_SEEDS:
+            job = create_bulk_job(db, user.id, "ppc", request.mode, len(seeds), calls_charged=charged)
+            background_tasks.add_task(
+                run_bulk_job, job.job_id, "ppc", request.mode, seeds, location_ids, language_id, request.aggregate
+            )
+            return JSONResponse(status_code=202, content=bulk_job_to_dict(job))
+
+        try:
+            return run_bulk_keywords("ppc", request.mode, seeds, location_ids, language_id, request.aggregate)
+        except Exception as e:
+            refund_api_calls(db, user.id, "ppc_keywords", charged)
+            if isinstance(e, ValueError):
+                raise
+            print(f"❌ Error in ppc_bulk_keywords: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to fetch keyword data from Google Ads API.")
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/ppc_bulk_keywords/jobs/{job_id}")
+def ppc_bulk_keywords_job(job_id: str, id: str = Depends(verify_jwt_token), db: Session = Depends(get_db)):
+    """Status of a background bulk keyword job, with its rows once completed"""
+    user_id = int(id[1])
+    job = get_bulk_job(db, job_id, user_id, "ppc")
+    if not job:
+        raise HTTPException(status_code=404, detail="Bulk keyword job not found")
+    return JSONResponse(status_code=200, content=bulk_job_to_dict(job))
+
+
 @router.post("/ppc_keyword_clustering")
 async def ppc_keyword_clustering(request: KeywordClusterRequest
                                  ,user=Depends(check_api_limit("ppc_cluster")), 
@@ -130,7 +197,7 @@ async def ppc_keyword_clustering(request: KeywordClusterRequest
         print("Parsed data:", data)  
 
         # result = asyncio.run(ppc_main(data))
-        cluster_data, total_token = await ppc_main(data)
+        cluster_data, total_token, fitted_model = await ppc_main(data)
         print("Result:", cluster_data)
         ppc_data = flatten_ppc_data(cluster_data,df)
         if cluster_data and total_token:
@@ -143,6 +210,8 @@ async def ppc_keyword_clustering(request: KeywordClusterRequest
                 language_data = request.language_id.dict() if request.language_id else None
                 print(f"location:{location_data} and languge:{language_data}")
                 upload_ppc_table(str(unique_id), user_id, filename, ppc_data, location_data, language_data)
+                if fitted_model:
+                    upload_cluster_model(str(unique_id), user_id, "ppc", fitted_model)
          
             ppc_cluster_record = db.query(PPCCluster).filter(PPCCluster.user_id == user.id).first()
 
@@ -370,6 +439,7 @@ async def ppc_delete_document(request: UUIDRequest, id: str = Depends(verify_jwt
 
         if file_record:
             db.delete(file_record)
+            delete_cluster_model(db, uuid, user_id, "ppc")
             db.commit()
 
         return JSONResponse(
@@ -444,6 +514,45 @@ def ppc_delete_page(ppc_file_uuid: str, page_title_id: str, db: Session = Depend
     raise HTTPException(status_code=404, detail="Page not found")
 
 
+@router.post("/ppc-files/{ppc_file_uuid}/keywords")
+async def ppc_assign_keywords(ppc_file_uuid: str, request: AssignKeywordRequest, db: Session = Depends(get_db), id: str = Depends(verify_jwt_token)):
+    """Add keywords to an existing PPC file by assigning them to the stored clusters"""
+    user_id = int(id[1])
+    ppc_file = db.query(PPCFile).filter_by(user_id=user_id, uuid=ppc_file_uuid).first()
+    if not ppc_file:
+        raise HTTPException(status_code=404, detail="PPC file not found")
+    model_record = db.query(ClusterModel).filter_by(user_id=user_id, uuid=ppc_file_uuid, file_type="ppc").first()
+    if not model_record:
+        raise HTTPException(status_code=404, detail="No fitted cluster model for this file, please re-run clustering")
+
+    try:
+        model = load_cluster_model(model_record)
+        json_data, model, summary = await assign_keywords_to_file(
+            ppc_file.json_data, model, [k.dict() for k in request.keywords]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Write the model first so the row never points at a model that was not saved
+    try:
+        put_cluster_model(ppc_file_uuid, user_id, "ppc", model)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save cluster model: {str(e)}")
+
+    ppc_file.json_data = json_data
+    flag_modified(ppc_file, "json_data")
+    model_record.n_samples = model.n_samples
+    model_record.baseline_distance = model.baseline_distance
+    model_record.upload_time = datetime.utcnow()
+    try:
+        db.commit()
+        db.refresh(ppc_file)
+        return summary
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to save changes")
+
+
 @router.patch("/ppc-files/{ppc_file_uuid}/pages/{page_title_id}")
 def ppc_edit_page(ppc_file_uuid: str, page_title_id: str, page_update: ppcPageUpdate, db: Session = Depends(get_db), id: str = Depends(verify_jwt_token)):
 
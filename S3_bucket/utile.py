@@ -1,7 +1,11 @@
+import os
 from sqlalchemy.orm import Session
 from datetime import datetime
-from auth.models import SEOFile, PPCFile
+from botocore.exceptions import ClientError
+from auth.models import SEOFile, PPCFile, ClusterModel
 from auth.auth import get_db
+from S3_bucket.S3_client import s3
+from clustering_pipeline.model_store import FittedClusterModel
 from fastapi import Request, HTTPException, Depends
 from typing import Union
 
@@ -94,5 +98,63 @@ def upload_ppc_table( uuid: str, user_id: int, file_name: str, json_data: Union[
         db.rollback()
         raise Exception(f"Error storing SEO file in table: {str(e)}")
     finally:
-        db.close() 
-    
\ No newline at end of file
+        db.close()
+
+
+S3_BUCKET_NAME = os.environ.get("BUCKET_NAME")
+CLUSTER_MODEL_FILENAME = "cluster_model.joblib"
+
+
+def cluster_model_key(uuid: str, user_id: int, file_type: str) -> str:
+    """S3 key of a file's fitted model, under the prefix the *_cluster_delete_document helpers remove"""
+    return f"User_{user_id}/{file_type}_clustering_data/{uuid}/{CLUSTER_MODEL_FILENAME}"
+
+
+def put_cluster_model(uuid: str, user_id: int, file_type: str, fitted_model: FittedClusterModel):
+    s3.put_object(
+        Bucket=S3_BUCKET_NAME,
+        Key=cluster_model_key(uuid, user_id, file_type),
+        Body=fitted_model.to_bytes()
+    )
+
+
+def load_cluster_model(record: ClusterModel) -> FittedClusterModel:
+    """The fitted model for a ClusterModel row, read from S3"""
+    response = s3.get_object(Bucket=S3_BUCKET_NAME, Key=cluster_model_key(record.uuid, record.user_id, record.file_type))
+    return FittedClusterModel.from_bytes(response["Body"].read())
+
+
+def delete_cluster_model(db: Session, uuid: str, user_id: int, file_type: str):
+    """Remove a file's fitted model from S3 and its ClusterModel row (caller commits)"""
+    try:
+        s3.delete_object(Bucket=S3_BUCKET_NAME, Key=cluster_model_key(uuid, user_id, file_type))
+    except ClientError as e:
+        raise Exception(f"Error deleting cluster model: {str(e)}")
+    db.query(ClusterModel).filter_by(user_id=user_id, uuid=uuid, file_type=file_type).delete()
+
+
+def upload_cluster_model(uuid: str, user_id: int, file_type: str, fitted_model: FittedClusterModel):
+    """Store (or replace) the fitted UMAP reducer and centroids for a SEO/PPC file"""
+    db = next(get_db())
+    try:
+        put_cluster_model(uuid, user_id, file_type, fitted_model)
+
+        record = db.query(ClusterModel).filter_by(user_id=user_id, uuid=uuid, file_type=file_type).first()
+        if not record:
+            record = ClusterModel(user_id=user_id, uuid=uuid, file_type=file_type)
+            db.add(record)
+
+        record.n_samples = fitted_model.n_samples
+        record.baseline_distance = fitted_model.baseline_distance
+        record.upload_time = datetime.utcnow()
+
+        db.commit()
+        db.refresh(record)
+        return record
+
+    except Exception as e:
+        db.rollback()
+        raise Exception(f"Error storing cluster model in table: {str(e)}")
+    finally:
+        db.close()
+
@@ -99,12 +99,12 @@ async def url_agent(PROMPT, items, previous_page_titles=None, previous_URL=None)
         return None, None, None, 0
 
 
-def process_clusters(data):
+async def process_clusters(data):
     # config = ClusteringConfig(min_clusters=int(min_clusters), max_clusters=int(max_clusters)) 
-    clusterer = Cluster()
+    clusterer = Cluster(ClusteringConfig())
     metadata_column = "Keyword"
 
-    results, optimal_cluster = clusterer.process_clustering(data, metadata_column)
+    results, optimal_cluster = await clusterer.aprocess_clustering(data, metadata_column)
     print(f"Optimal number of clusters: {optimal_cluster}")
     
     # Handle results as string or dict
@@ -126,7 +126,7 @@ def process_clusters(data):
             continue  # Skip instead of raising exception
 
     print(f"Found {len(clusters)} clusters")
-    return clusters
+    return clusters, clusterer.fitted_model
 
 
 async def agent_call_sequential(cluster_items, batch_size=100):
@@ -240,7 +240,7 @@ async def process_single_cluster(cluster_id, cluster_items, batch_size=100):
 
 async def agent_recursion(clusters, batch_size=100): 
     """Process all clusters concurrently"""
-    cluster_data = process_clusters(clusters)
+    cluster_data, fitted_model = await process_clusters(clusters)
     global_token_count = 0 
     
     # Create tasks for all clusters to run concurrently
@@ -264,7 +264,7 @@ async def agent_recursion(clusters, batch_size=100):
     print(f"Processed {len(final_results)} total items across all clusters")
     print(f"Total token usage across all clusters: {global_token_count}")          
 
-    return final_results, global_token_count
+    return final_results, global_token_count, fitted_model
 
 
 # Main entry point to run the code
@@ -290,9 +290,9 @@ async def seo_main(input_data, batch_size=100, maintain_context=True):
         
         globals()['agent_call'] = context_preserving_agent_call
     
-    results, total_token_count = await agent_recursion(input_data, batch_size)
+    results, total_token_count, fitted_model = await agent_recursion(input_data, batch_size)
     print(f"Total token count: {total_token_count}")
-    return results, total_token_count
+    return results, total_token_count, fitted_model
 
 
 # Example usage
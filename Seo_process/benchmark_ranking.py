@@ -0,0 +1,118 @@
+"""
+Micro-benchmark: per-row rank bucketing / loop-built time series vs. the
+vectorized RankingKeywordsAnalyzer path, on synthetic Search Console rows.
+
+    python -m Seo_process.benchmark_ranking            # 100k and 1M rows
+    python -m Seo_process.benchmark_ranking 250000     # custom sizes
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from Seo_process.ranking_keyword import RankingKeywordsAnalyzer, RankingFrames, classify_buckets, RANK_BUCKET_KEYS
+from Seo_process.utile import DataProcessor
+
+N_DAYS = 28
+START_DATE = datetime(2024, 1, 1)
+
+
+def synthetic_frame(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n_queries = max(n_rows // 20, 1)
+    impressions = rng.integers(1, 500, n_rows)
+    clicks = rng.binomial(impressions, 0.05)
+    return pd.DataFrame({
+        'query': pd.Categorical.from_codes(rng.integers(0, n_queries, n_rows), [f"keyword {i}" for i in range(n_queries)]).astype(object),
+        'page': pd.Categorical.from_codes(rng.integers(0, 500, n_rows), [f"https://example.com/{i}" for i in range(500)]),
+        'country': pd.Categorical(['usa'] * n_rows),
+        'Date': pd.Timestamp(START_DATE) + pd.to_timedelta(rng.integers(0, N_DAYS, n_rows), unit='D'),
+        'device': pd.Categorical.from_codes(rng.integers(0, 3, n_rows), ['DESKTOP', 'MOBILE', 'TABLET']),
+        'clicks': clicks,
+        'impressions': impressions,
+        'ctr': clicks / impressions,
+        'position': np.round(rng.gamma(2.0, 8.0, n_rows), 1),
+    })
+
+
+def legacy_daily_time_series(analyzer: RankingKeywordsAnalyzer, df_current: pd.DataFrame, start_dt, end_dt) -> list:
+    """The pre-vectorization implementation, kept here only for comparison"""
+    daily_metrics = df_current.groupby(['Date', 'rank_bucket']).agg({
+        'query': 'nunique', 'clicks': 'sum', 'impressions': 'sum', 'ctr': 'mean', 'position': 'mean'
+    }).reset_index()
+    pivots = {}
+    for metric in ['query', 'clicks', 'impressions', 'ctr', 'position']:
+        pivot = daily_metrics.pivot(index='Date', columns='rank_bucket', values=metric).fillna(0)
+        pivot = pivot.reindex(pd.date_range(start=start_dt, end=end_dt, freq='D'), fill_value=0)
+        pivots[metric] = pivot.reindex(columns=analyzer.all_buckets, fill_value=0)
+
+    records = []
+    for date in pd.date_range(start=start_dt, end=end_dt, freq='D'):
+        record = {'date': date.strftime('%Y-%m-%d')}
+        for metric, prefix in [('query', 'keywords'), ('clicks', 'clicks'), ('impressions', 'impressions')]:
+            for bucket in analyzer.all_buckets:
+                record[f"{prefix}_{RANK_BUCKET_KEYS[bucket]}"] = int(pivots[metric].loc[date, bucket])
+        for metric, digits in [('ctr', 4), ('position', 1)]:
+            for bucket in analyzer.all_buckets:
+                record[f"{metric}_{RANK_BUCKET_KEYS[bucket]}"] = round(float(pivots[metric].loc[date, bucket]), digits)
+        records.append(record)
+    return records
+
+
+def assert_same_time_series(legacy: list, vectorized: list):
+    """
+    Both implementations must emit the same records. Counts must match
+    exactly; ctr and position may differ by one unit in the last rounded
+    digit (Python round vs. numpy round on half-way values).
+    """
+    assert len(legacy) == len(vectorized), f"{len(legacy)} vs {len(vectorized)} days"
+    tolerance = {'ctr': 1e-4, 'position': 0.1}
+    for old, new in zip(legacy, vectorized):
+        assert old.keys() == new.keys(), f"keys differ on {old['date']}: {sorted(old.keys() ^ new.keys())}"
+        for key, value in old.items():
+            metric = key.split('_', 1)[0]
+            if metric in tolerance:
+                assert abs(value - new[key]) <= tolerance[metric] + 1e-9, f"{old['date']} {key}: {value} vs {new[key]}"
+            else:
+                assert value == new[key], f"{old['date']} {key}: {value} vs {new[key]}"
+
+
+def _timed(label: str, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<34} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+
+def run(n_rows: int):
+    print(f"\n{n_rows:,} rows")
+    df = synthetic_frame(n_rows)
+    analyzer = RankingKeywordsAnalyzer()
+
+    legacy_buckets, legacy_bucket_time = _timed("bucketing: per-row apply", df['position'].apply, analyzer._classify_bucket)
+    buckets, bucket_time = _timed("bucketing: searchsorted", classify_buckets, df['position'].to_numpy())
+    assert (legacy_buckets.to_numpy() == np.asarray(buckets, dtype=object)).all()
+
+    legacy_groups, legacy_group_time = _timed("rank groups: per-row apply", df['position'].apply, DataProcessor.classify_rank)
+    groups, group_time = _timed("rank groups: searchsorted", DataProcessor.classify_ranks, df['position'].to_numpy())
+    assert (legacy_groups.to_numpy() == np.asarray(groups, dtype=object)).all()
+
+    start_dt = START_DATE
+    end_dt = START_DATE + timedelta(days=N_DAYS - 1)
+    legacy_current = df.assign(rank_bucket=legacy_buckets)
+    legacy_series, legacy_series_time = _timed("time series: loop", legacy_daily_time_series, analyzer, legacy_current, start_dt, end_dt)
+    current = df.assign(rank_bucket=buckets)
+    frames = RankingFrames(combined=current, current=current, prev=current.iloc[:0])
+    series, series_time = _timed("time series: pivot", analyzer._calculate_daily_time_series, frames, start_dt, end_dt)
+    assert_same_time_series(legacy_series, series)
+
+    print(f"  speed-up: bucketing x{legacy_bucket_time / bucket_time:.0f}, "
+          f"rank groups x{legacy_group_time / group_time:.0f}, "
+          f"time series x{legacy_series_time / series_time:.1f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]
+    for size in sizes:
+        run(size)
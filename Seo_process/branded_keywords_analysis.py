@@ -1,8 +1,9 @@
 
 from fastapi import FastAPI, HTTPException, APIRouter, Depends
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from google_clients import get_google_service
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import re
 from pydantic import BaseModel, HttpUrl
@@ -14,6 +15,8 @@ from auth.models import Integration
 from auth.auth import get_db
 import requests
 from utils import verify_jwt_token
+from Seo_process.gsc_ingest import rows_to_frame, classify_branded
+from Seo_process.gsc_fetcher import ShardedSearchConsoleFetcher
 # Load environment variables
 load_dotenv()
 router = APIRouter()
@@ -28,6 +31,9 @@ OAUTH_SCOPE = "https://www.googleapis.com/auth/webmasters.readonly"
 # Batch size for pagination
 BATCH_SIZE = 5000
 
+# Default length of each branded/generic keyword table
+KEYWORD_LIST_TOP_N = int(os.getenv("KEYWORD_LIST_TOP_N", 100))
+
 def refresh_google_access_token(refresh_token: str):
     response = requests.post(
         "https://oauth2.googleapis.com/token",
@@ -83,37 +89,19 @@ def connect_search_console(db: Session, user_id: str):
             client_secret=GOOGLE_CLIENT_SECRET,
             scopes=[OAUTH_SCOPE]
         )
-        return build('webmasters', 'v3', credentials=creds)
+        return get_google_service('webmasters', 'v3', creds)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to connect to Search Console: {str(e)}")
 
 def fetch_all_data_paginated(service, site_url, payload_base, start_date, end_date):
-    """Fetch all data with pagination"""
-    payload = payload_base.copy()
-    payload["startDate"] = start_date
-    payload["endDate"] = end_date
-
-    all_rows = []
-    start_row = 0
-    
-    while True:
-        payload["startRow"] = start_row
-        try:
-            response = service.searchanalytics().query(siteUrl=site_url, body=payload).execute()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"API call failed: {str(e)}")
-
-        rows = response.get("rows", [])
-        if not rows:
-            break
-
-        all_rows.extend(rows)
-        start_row += BATCH_SIZE
-        
-        if len(rows) < BATCH_SIZE:
-            break
+    """
+    Fetch all data with pagination, one day-shard at a time with quota-aware retries.
 
-    return all_rows
+    A single prebuilt service cannot be shared across threads, so this runs the
+    shards sequentially; SearchConsoleService.get_site_data fetches them concurrently.
+    """
+    fetcher = ShardedSearchConsoleFetcher(lambda: service, max_workers=1)
+    return fetcher.fetch_rows(site_url, payload_base, start_date, end_date)
 
 def process_search_console_data(rows, branded_words=None):
     """
@@ -128,39 +116,28 @@ def process_search_console_data(rows, branded_words=None):
     """
     if rows is None:
         return pd.DataFrame()
-    
-    data = []
-    
-    for row in rows:
-        # Handle missing or malformed row data
-        if not row or "keys" not in row or len(row["keys"]) < 5:
-            continue
-            
-        keyword = row["keys"][0]
-        
-        # Determine brand category
-        if not branded_words:
-            brand_category = "Non-Branded"
-        else:
-            # Create pattern from branded words list
-            escaped_words = [re.escape(word) for word in branded_words]
-            brand_pattern = r"(?i).*(" + "|".join(escaped_words) + ").*"
-            brand_category = "Branded" if re.search(brand_pattern, keyword) else "Non-Branded"
-        
-        data.append({
-            "keyword": keyword,
-            "country": row["keys"][1] if len(row["keys"]) > 1 else None,
-            "device": row["keys"][2] if len(row["keys"]) > 2 else None,
-            "date": row["keys"][3] if len(row["keys"]) > 3 else None,
-            "page": row["keys"][4] if len(row["keys"]) > 4 else None,
-            "clicks": row.get("clicks", 0),
-            "impressions": row.get("impressions", 0),
-            "ctr": row.get("ctr", 0),
-            "position": row.get("position", 0),
-            "brand_category": brand_category
-        })
-    
-    return pd.DataFrame(data)
+
+    return rows_to_frame(
+        rows,
+        dimensions=["query", "country", "device", "date", "page"],
+        column_names={"query": "keyword"},
+        parse_dates=False,
+        branded_words=branded_words or [],
+    )
+
+
+def prepare_branded_frame(df, branded_words=None):
+    """
+    Shape a warehouse frame (see Seo_process.gsc_warehouse) like
+    process_search_console_data output: query renamed to keyword and a
+    brand_category column added.
+    """
+    if df.empty:
+        return df
+
+    df = df.rename(columns={"query": "keyword"})
+    df["brand_category"] = classify_branded(df["keyword"], branded_words)
+    return df
 
 
 def safe_divide(a, b, default=0):
@@ -212,6 +189,7 @@ class SearchConsoleRequest(BaseModel):
     start_date: Optional[str] = None  # YYYY-MM-DD format, defaults to last 30 days
     end_date: Optional[str] = None    # YYYY-MM-DD format, defaults to today
     branded_words: Optional[List[str]] = None  # List of branded keywords, if None all keywords are non-branded
+    top_n: Optional[int] = KEYWORD_LIST_TOP_N  # Keywords per table, None returns every keyword
 
 class KeywordMetrics(BaseModel):
     impressions: Dict[str, Any]  # {"Actual": value, "fluctuation": "+/-value"}
@@ -225,24 +203,28 @@ class KeywordClicksEntry(BaseModel):
     pos_last_30_days: int
     pos_before_30_days: int
     change: int
+    change_percentage: float
 
 class KeywordImpressionsEntry(BaseModel):
     keyword: str
     pos_last_30_days: int
     pos_before_30_days: int
     change: int
+    change_percentage: float
 
 class KeywordCTREntry(BaseModel):
     keyword: str
     pos_last_30_days: float
     pos_before_30_days: float
     change: float
+    change_percentage: float
 
 class KeywordPositionEntry(BaseModel):
     keyword: str
     pos_last_30_days: float
     pos_before_30_days: float
     change: float
+    change_percentage: float
 
 class KeywordLists(BaseModel):
     clicks: List[KeywordClicksEntry]
@@ -277,3 +259,309 @@ class SearchConsoleResponse(BaseModel):
     branded_keyword_list: KeywordLists
     generic_keyword_list: KeywordLists
     daily_metrics: List[DailyMetrics]
+
+
+KEYWORD_AGGREGATES = {
+    'position': 'mean',
+    'clicks': 'sum',
+    'impressions': 'sum',
+    'ctr': 'mean'
+}
+
+
+def _top_keywords(merged: pd.DataFrame, rank_column: str, top_n: Optional[int]) -> pd.DataFrame:
+    if top_n is None:
+        return merged.sort_values(rank_column, ascending=False)
+    return merged.nlargest(top_n, rank_column)
+
+
+def _diff_records(frame: pd.DataFrame, metric: str, scale: float = 1, digits: Optional[int] = None) -> List[Dict]:
+    current = frame[f"{metric}_curr"] * scale
+    previous = frame[f"{metric}_prev"] * scale
+    change = (frame[f"{metric}_curr"] - frame[f"{metric}_prev"]) * scale
+    # Same rule as safe_percentage: 0 when there is no previous value
+    prev_values = frame[f"{metric}_prev"].to_numpy(dtype=float)
+    curr_values = frame[f"{metric}_curr"].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_percentage = np.where(prev_values != 0, (curr_values - prev_values) / prev_values * 100, 0.0)
+    if digits is None:
+        current, previous, change = current.astype(int), previous.astype(int), change.astype(int)
+    else:
+        current, previous, change = current.round(digits), previous.round(digits), change.round(digits)
+    return pd.DataFrame({
+        "keyword": frame["keyword"].to_numpy(),
+        "pos_last_30_days": current.to_numpy(),
+        "pos_before_30_days": previous.to_numpy(),
+        "change": change.to_numpy(),
+        "change_percentage": np.round(change_percentage, 2)
+    }).to_dict('records')
+
+
+def keyword_diff_tables(current: pd.DataFrame, previous: pd.DataFrame, top_n: Optional[int] = KEYWORD_LIST_TOP_N) -> Dict[str, List[Dict]]:
+    """
+    Current vs. previous period keyword tables from one outer merge of the
+    two per-keyword aggregates. Keywords missing from a period count as 0.
+
+    clicks and impressions lists are ranked by their current value; the ctr
+    and avg_position lists are ranked by current impressions so they show
+    the most visible keywords rather than rare long-tail ones with a 100%
+    CTR or a top position from a single impression.
+    """
+    merged = pd.merge(
+        current.groupby('keyword').agg(KEYWORD_AGGREGATES),
+        previous.groupby('keyword').agg(KEYWORD_AGGREGATES),
+        left_index=True, right_index=True, how='outer', suffixes=('_curr', '_prev')
+    ).fillna(0).rename_axis('keyword').reset_index()
+
+    return {
+        "clicks": _diff_records(_top_keywords(merged, 'clicks_curr', top_n), 'clicks'),
+        "impressions": _diff_records(_top_keywords(merged, 'impressions_curr', top_n), 'impressions'),
+        "ctr": _diff_records(_top_keywords(merged, 'impressions_curr', top_n), 'ctr', scale=100, digits=2),
+        "avg_position": _diff_records(_top_keywords(merged, 'impressions_curr', top_n), 'position', digits=2)
+    }
+
+
+def daily_brand_metrics(df_current: pd.DataFrame) -> List[Dict]:
+    """Per-day branded and generic totals, one row per date in df_current"""
+    daily = df_current.groupby(['date', 'brand_category'], observed=True).agg({
+        'clicks': 'sum',
+        'impressions': 'sum',
+        'ctr': 'mean',
+        'position': 'mean'
+    }).unstack('brand_category')
+    daily.columns = [f"{metric}|{category}" for metric, category in daily.columns]
+    daily = daily.reindex(
+        columns=[f"{metric}|{category}" for metric in ['clicks', 'impressions', 'ctr', 'position']
+                 for category in ['Branded', 'Non-Branded']]
+    ).fillna(0).sort_index()
+
+    out = pd.DataFrame({"date": daily.index.astype(str)})
+    for prefix, category in [("branded", "Branded"), ("generic", "Non-Branded")]:
+        out[f"{prefix}_clicks"] = daily[f"clicks|{category}"].to_numpy().astype(int)
+        out[f"{prefix}_impressions"] = daily[f"impressions|{category}"].to_numpy().astype(int)
+        out[f"{prefix}_ctr"] = (daily[f"ctr|{category}"].to_numpy() * 100).round(2)
+        out[f"{prefix}_avg_position"] = daily[f"position|{category}"].to_numpy().round(2)
+
+    columns = ["date"] + [f"{prefix}_{metric}" for prefix in ["branded", "generic"]
+                          for metric in ["clicks", "impressions", "ctr", "avg_position"]]
+    return out[columns].to_dict('records')
+
+
+def build_branded_analysis(df_all, start_date, end_date, prev_start_date, prev_end_date,
+                           top_n: Optional[int] = KEYWORD_LIST_TOP_N) -> SearchConsoleResponse:
+    """
+    Compute the branded vs. non-branded dashboard from a frame prepared by
+    prepare_branded_frame (string dates, keyword and brand_category columns).
+
+    top_n caps every keyword list (None returns all keywords).
+    """
+    # Split data into current and previous periods
+    df_current = df_all[(df_all['date'] >= start_date) & (df_all['date'] <= end_date)]
+    df_prev = df_all[(df_all['date'] >= prev_start_date) & (df_all['date'] <= prev_end_date)]
+
+    print(f"\nData Split Details:")
+    print(f"Total rows fetched: {len(df_all)}")
+    print(f"Current period rows: {len(df_current)}")
+    print(f"Previous period rows: {len(df_prev)}")
+
+    # Categorize data into branded and non-branded
+    branded_current = df_current[df_current['brand_category'] == 'Branded']
+    non_branded_current = df_current[df_current['brand_category'] == 'Non-Branded']
+    branded_prev = df_prev[df_prev['brand_category'] == 'Branded']
+    non_branded_prev = df_prev[df_prev['brand_category'] == 'Non-Branded']
+
+    # Calculate total metrics
+    total_clicks = df_current['clicks'].sum()
+    total_impressions = df_current['impressions'].sum()
+
+    # Calculate pie chart data for clicks
+    total_branded_clicks = int(branded_current['clicks'].sum())
+    total_generic_clicks = int(non_branded_current['clicks'].sum())
+    total_clicks = total_branded_clicks + total_generic_clicks
+
+    # Calculate pie chart data for impressions
+    total_branded_impressions = int(branded_current['impressions'].sum())
+    total_generic_impressions = int(non_branded_current['impressions'].sum())
+    total_impressions = total_branded_impressions + total_generic_impressions
+
+    # Calculate CTR values for pie chart and diff calculations - MOVED HERE
+    branded_curr_ctr_for_diff = safe_divide(branded_current['clicks'].sum(), branded_current['impressions'].sum()) * 100
+    branded_prev_ctr_for_diff = safe_divide(branded_prev['clicks'].sum(), branded_prev['impressions'].sum()) * 100 if not branded_prev.empty else 0
+    generic_curr_ctr_for_diff = safe_divide(non_branded_current['clicks'].sum(), non_branded_current['impressions'].sum()) * 100
+    generic_prev_ctr_for_diff = safe_divide(non_branded_prev['clicks'].sum(), non_branded_prev['impressions'].sum()) * 100 if not non_branded_prev.empty else 0
+
+    # Calculate pie chart data for CTR
+    branded_curr_ctr = branded_curr_ctr_for_diff
+    generic_curr_ctr = generic_curr_ctr_for_diff
+    total_curr_ctr = safe_divide(total_clicks, total_impressions) * 100
+
+    # Calculate Position values for pie chart and diff calculations - MOVED HERE
+    branded_curr_pos_for_diff = branded_current['position'].mean() if len(branded_current) > 0 else 0
+    branded_prev_pos_for_diff = branded_prev['position'].mean() if len(branded_prev) > 0 else 0
+    generic_curr_pos_for_diff = non_branded_current['position'].mean() if len(non_branded_current) > 0 else 0
+    generic_prev_pos_for_diff = non_branded_prev['position'].mean() if len(non_branded_prev) > 0 else 0
+
+    if pd.isna(branded_curr_pos_for_diff): branded_curr_pos_for_diff = 0
+    if pd.isna(branded_prev_pos_for_diff): branded_prev_pos_for_diff = 0
+    if pd.isna(generic_curr_pos_for_diff): generic_curr_pos_for_diff = 0
+    if pd.isna(generic_prev_pos_for_diff): generic_prev_pos_for_diff = 0
+
+    # Calculate pie chart data for Position (Average)
+    branded_curr_pos = branded_curr_pos_for_diff
+    generic_curr_pos = generic_curr_pos_for_diff
+    total_curr_pos = df_current['position'].mean() if len(df_current) > 0 else 0
+
+    if pd.isna(total_curr_pos): total_curr_pos = 0
+
+    # Combine all pie chart data into a single structure
+    pie_chart_data = {
+        "clicks": {
+            "branded_value": total_branded_clicks,
+            "branded_percentage": round((total_branded_clicks / total_clicks) * 100, 1) if total_clicks > 0 else 0,
+            "generic_value": total_generic_clicks,
+            "generic_percentage": round((total_generic_clicks / total_clicks) * 100, 1) if total_clicks > 0 else 0,
+            "total": total_clicks,
+            "branded_pct_diff": safe_percentage(branded_current['clicks'].sum(), branded_prev['clicks'].sum()),
+            "generic_pct_diff": safe_percentage(non_branded_current['clicks'].sum(), non_branded_prev['clicks'].sum())
+        },
+        "impressions": {
+            "branded_value": total_branded_impressions,
+            "branded_percentage": round((total_branded_impressions / total_impressions) * 100, 1) if total_impressions > 0 else 0,
+            "generic_value": total_generic_impressions,
+            "generic_percentage": round((total_generic_impressions / total_impressions) * 100, 1) if total_impressions > 0 else 0,
+            "total": total_impressions,
+            "branded_pct_diff": safe_percentage(branded_current['impressions'].sum(), branded_prev['impressions'].sum()),
+            "generic_pct_diff": safe_percentage(non_branded_current['impressions'].sum(), non_branded_prev['impressions'].sum())
+        },
+        "ctr": {
+            "branded_value": round(branded_curr_ctr, 2),
+            "branded_percentage": round((branded_curr_ctr / total_curr_ctr) * 100, 1) if total_curr_ctr > 0 else 0,
+            "generic_value": round(generic_curr_ctr, 2),
+            "generic_percentage": round((generic_curr_ctr / total_curr_ctr) * 100, 1) if total_curr_ctr > 0 else 0,
+            "total": round(total_curr_ctr, 2),
+            "branded_pct_diff": branded_curr_ctr_for_diff - branded_prev_ctr_for_diff, 
+            "generic_pct_diff": generic_curr_ctr_for_diff - generic_prev_ctr_for_diff
+        },
+        "position": {
+            "branded_value": round(float(branded_curr_pos), 2),
+            "branded_percentage": round((branded_curr_pos / total_curr_pos) * 100, 1) if total_curr_pos > 0 else 0,
+            "generic_value": round(float(generic_curr_pos), 2),
+            "generic_percentage": round((generic_curr_pos / total_curr_pos) * 100, 1) if total_curr_pos > 0 else 0,
+            "total": round(float(total_curr_pos), 2),
+            "branded_pct_diff": round(float(branded_curr_pos_for_diff - branded_prev_pos_for_diff), 2),
+            "generic_pct_diff": round(float(generic_curr_pos_for_diff - generic_prev_pos_for_diff), 2)
+        }
+    }
+
+    # Calculate percentage data for clicks and impressions
+    click_percentage = {
+        "branded": safe_divide(branded_current['clicks'].sum(), total_clicks) * 100,
+        "generic": safe_divide(non_branded_current['clicks'].sum(), total_clicks) * 100
+    }
+
+    impression_percentage = {
+        "branded": safe_divide(branded_current['impressions'].sum(), total_impressions) * 100,
+        "generic": safe_divide(non_branded_current['impressions'].sum(), total_impressions) * 100
+    }
+
+    # Branded metrics calculations
+    branded_curr_imp = branded_current['impressions'].sum()
+    branded_prev_imp = branded_prev['impressions'].sum()
+    branded_curr_clicks = branded_current['clicks'].sum()
+    branded_prev_clicks = branded_prev['clicks'].sum()
+    branded_curr_keywords = len(branded_current['keyword'].unique())
+    branded_prev_keywords = len(branded_prev['keyword'].unique())
+    branded_curr_ctr = safe_divide(branded_curr_clicks, branded_curr_imp) * 100
+    branded_prev_ctr = safe_divide(branded_prev_clicks, branded_prev_imp) * 100
+    branded_curr_pos = branded_current['position'].mean() if len(branded_current) > 0 else 0
+    branded_prev_pos = branded_prev['position'].mean() if len(branded_prev) > 0 else 0
+
+    if pd.isna(branded_curr_pos):
+        branded_curr_pos = 0
+    if pd.isna(branded_prev_pos):
+        branded_prev_pos = 0
+
+    branded_metrics = {
+        "impressions": {
+            "Actual": int(branded_curr_imp),
+            "fluctuation": format_fluctuation(safe_percentage(branded_curr_imp, branded_prev_imp))
+        },
+        "clicks": {
+            "Actual": int(branded_curr_clicks),
+            "fluctuation": format_fluctuation(safe_percentage(branded_curr_clicks, branded_prev_clicks))
+        },
+        "no_of_keywords": {
+            "Actual": branded_curr_keywords,
+            "fluctuation": format_fluctuation(safe_percentage(branded_curr_keywords, branded_prev_keywords))
+        },
+        "ctr": {
+            "Actual": f"{round(branded_curr_ctr, 2)}%",
+            "fluctuation": format_fluctuation(branded_curr_ctr - branded_prev_ctr)
+        },
+        "avg_position": {
+            "Actual": round(float(branded_curr_pos), 2),
+            "fluctuation": format_fluctuation(branded_curr_pos - branded_prev_pos)
+        }
+    }
+
+    # Non-branded metrics calculations
+    non_branded_curr_imp = non_branded_current['impressions'].sum()
+    non_branded_prev_imp = non_branded_prev['impressions'].sum()
+    non_branded_curr_clicks = non_branded_current['clicks'].sum()
+    non_branded_prev_clicks = non_branded_prev['clicks'].sum()
+    non_branded_curr_keywords = len(non_branded_current['keyword'].unique())
+    non_branded_prev_keywords = len(non_branded_prev['keyword'].unique())
+    non_branded_curr_ctr = safe_divide(non_branded_curr_clicks, non_branded_curr_imp) * 100
+    non_branded_prev_ctr = safe_divide(non_branded_prev_clicks, non_branded_prev_imp) * 100
+    non_branded_curr_pos = non_branded_current['position'].mean() if len(non_branded_current) > 0 else 0
+    non_branded_prev_pos = non_branded_prev['position'].mean() if len(non_branded_prev) > 0 else 0
+
+    if pd.isna(non_branded_curr_pos):
+        non_branded_curr_pos = 0
+    if pd.isna(non_branded_prev_pos):
+        non_branded_prev_pos = 0
+
+    non_branded_metrics = {
+        "impressions": {
+            "Actual": int(non_branded_curr_imp),
+            "fluctuation": format_fluctuation(safe_percentage(non_branded_curr_imp, non_branded_prev_imp))
+        },
+        "clicks": {
+            "Actual": int(non_branded_curr_clicks),
+            "fluctuation": format_fluctuation(safe_percentage(non_branded_curr_clicks, non_branded_prev_clicks))
+        },
+        "no_of_keywords": {
+            "Actual": non_branded_curr_keywords,
+            "fluctuation": format_fluctuation(safe_percentage(non_branded_curr_keywords, non_branded_prev_keywords))
+        },
+        "ctr": {
+            "Actual": f"{round(non_branded_curr_ctr, 2)}%",
+            "fluctuation": format_fluctuation(non_branded_curr_ctr - non_branded_prev_ctr)
+        },
+        "avg_position": {
+            "Actual": round(float(non_branded_curr_pos), 2),
+            "fluctuation": format_fluctuation(non_branded_curr_pos - non_branded_prev_pos)
+        }
+    }
+
+    # Keyword-level diff tables
+    if len(df_current) > 0:
+        branded_keyword_lists = keyword_diff_tables(branded_current, branded_prev, top_n)
+        generic_keyword_lists = keyword_diff_tables(non_branded_current, non_branded_prev, top_n)
+    else:
+        branded_keyword_lists = {"clicks": [], "impressions": [], "ctr": [], "avg_position": []}
+        generic_keyword_lists = {"clicks": [], "impressions": [], "ctr": [], "avg_position": []}
+
+    # Daily metrics
+    daily_metrics = daily_brand_metrics(df_current) if len(df_current) > 0 else []
+
+    return SearchConsoleResponse(
+        click_percentage=click_percentage,
+        impression_percentage=impression_percentage,
+        pie_chart_data=pie_chart_data,
+        branded_keywords=branded_metrics,
+        non_branded_keywords=non_branded_metrics,
+        branded_keyword_list=branded_keyword_lists,
+        generic_keyword_list=generic_keyword_lists,
+        daily_metrics=daily_metrics
+    )
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from Seo_process.utile import build_search_console_overview
+from Seo_process.gsc_rollup import DailyRollup
+from Seo_process.ranking_keyword import ranking_analyzer
+from Seo_process.branded_keywords_analysis import (
+    build_branded_analysis, get_previous_period_dates, prepare_branded_frame
+)
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+class SearchConsoleDashboard:
+    """
+    Computes every v2 Search Console view (overview cards and device split,
+    ranking keywords, branded vs. generic) from one shared frame, so a
+    dashboard load needs a single fetch.
+
+    The frame must be structured like SearchConsoleService.get_site_frame
+    output (datetime `date` column) and cover fetch_window(start, end).
+    When the matching DailyRollup is passed (get_site_rollup), the overview
+    charts and distinct counts are answered from its cube and keys; the raw
+    rows then only feed the keyword-level tables.
+    """
+
+    def __init__(self, df: pd.DataFrame, start_date: str, end_date: str, rollup: Optional[DailyRollup] = None):
+        self.df = df
+        self.rollup = rollup if rollup is not None else DailyRollup.from_frame(df)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.overview_start_date, self.prev_start_date, self.prev_end_date = self._windows(start_date, end_date)
+
+    @staticmethod
+    def _windows(start_date: str, end_date: str) -> tuple:
+        start_dt = datetime.strptime(start_date, DATE_FORMAT)
+        end_dt = datetime.strptime(end_date, DATE_FORMAT)
+        # Same extended range /search_console/ uses for its comparisons
+        overview_start = (start_dt - timedelta(days=(end_dt - start_dt).days * 2)).strftime(DATE_FORMAT)
+        prev_start_date, prev_end_date = get_previous_period_dates(start_date, end_date)
+        return overview_start, prev_start_date, prev_end_date
+
+    @classmethod
+    def fetch_window(cls, start_date: str, end_date: str) -> tuple:
+        """(start, end) range that covers every view"""
+        overview_start, prev_start_date, _ = cls._windows(start_date, end_date)
+        return min(overview_start, prev_start_date), end_date
+
+    def _slice(self, start_date: str) -> pd.DataFrame:
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(self.end_date)
+        return self.df[(self.df['date'] >= start) & (self.df['date'] <= end)]
+
+    def overview(self) -> Dict[str, Any]:
+        return build_search_console_overview(
+            self.rollup.window(self.overview_start_date, self.end_date),
+            self.start_date, self.end_date, self.overview_start_date
+        )
+
+    def ranking(self) -> Dict[str, Any]:
+        return ranking_analyzer.analyze_frame(
+            self._slice(self.prev_start_date), self.start_date, self.end_date
+        )
+
+    def branded(self, branded_words: Optional[List[str]] = None):
+        df = self._slice(self.prev_start_date)
+        if not df.empty:
+            # The branded views compare and report dates as strings; format
+            # each distinct day once instead of every row
+            codes, days = pd.factorize(df['date'])
+            df = df.assign(date=np.asarray(days.strftime(DATE_FORMAT), dtype=object)[codes])
+        df_all = prepare_branded_frame(df, branded_words)
+        return build_branded_analysis(
+            df_all, self.start_date, self.end_date, self.prev_start_date, self.prev_end_date
+        )
+
+    def build(self, branded_words: Optional[List[str]] = None) -> Dict[str, Any]:
+        return {
+            "search_console": self.overview(),
+            "ranking_keywords": self.ranking(),
+            "branded_word_analysis": self.branded(branded_words).dict(),
+            "date_range": {
+                "fetched": f"{self.fetch_window(self.start_date, self.end_date)[0]} to {self.end_date}",
+                "current_period": f"{self.start_date} to {self.end_date}",
+            },
+        }
@@ -0,0 +1,186 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+from fastapi import HTTPException
+from googleapiclient.errors import HttpError
+from dotenv import load_dotenv
+from Seo_process.gsc_ingest import CATEGORICAL_DIMENSIONS, rows_to_frame
+load_dotenv()
+
+GSC_MAX_CONCURRENCY = int(os.environ.get("GSC_MAX_CONCURRENCY", 4))
+GSC_SHARD_DAYS = int(os.environ.get("GSC_SHARD_DAYS", 1))
+GSC_MAX_RETRIES = int(os.environ.get("GSC_MAX_RETRIES", 5))
+
+MAX_ROW_LIMIT = 25000
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+QUOTA_REASONS = ("quotaExceeded", "rateLimitExceeded", "userRateLimitExceeded")
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def date_shards(start_date: str, end_date: str, shard_days: int = GSC_SHARD_DAYS) -> List[Tuple[str, str]]:
+    """
+    Split [start_date, end_date] into consecutive (start, end) shards of
+    shard_days days. Raises ValueError for malformed dates or an end date
+    before the start date.
+    """
+    start_dt = datetime.strptime(start_date, DATE_FORMAT)
+    end_dt = datetime.strptime(end_date, DATE_FORMAT)
+    if end_dt < start_dt:
+        raise ValueError(f"end_date {end_date} is before start_date {start_date}")
+    shard_days = max(1, int(shard_days))
+
+    shards = []
+    current = start_dt
+    while current <= end_dt:
+        shard_end = min(current + timedelta(days=shard_days - 1), end_dt)
+        shards.append((current.strftime(DATE_FORMAT), shard_end.strftime(DATE_FORMAT)))
+        current = shard_end + timedelta(days=1)
+    return shards
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, HttpError):
+        status = getattr(error.resp, "status", None)
+        if status in RETRYABLE_STATUS:
+            return True
+        if status == 403:
+            return any(reason in str(error) for reason in QUOTA_REASONS)
+        return False
+    return isinstance(error, (ConnectionError, TimeoutError, OSError))
+
+
+class ShardedSearchConsoleFetcher:
+    """
+    Fetches searchanalytics rows for a date range by splitting it into
+    per-day (or per-N-day) shards and paginating the shards concurrently on
+    a bounded thread pool.
+
+    googleapiclient services are not thread-safe, so service_factory is
+    called once per worker thread to build that thread's own client.
+    Rate-limit, quota and 5xx errors are retried with exponential backoff
+    and jitter; any other error aborts the fetch.
+    """
+
+    def __init__(
+        self,
+        service_factory: Callable,
+        max_workers: int = GSC_MAX_CONCURRENCY,
+        shard_days: int = GSC_SHARD_DAYS,
+        max_retries: int = GSC_MAX_RETRIES,
+        backoff_base: float = 1.0,
+    ):
+        self.service_factory = service_factory
+        self.max_workers = max(1, int(max_workers))
+        self.shard_days = shard_days
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._local = threading.local()
+
+    def _service(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = self.service_factory()
+            self._local.service = service
+        return service
+
+    def _execute(self, site_url: str, body: Dict) -> Dict:
+        attempt = 0
+        while True:
+            try:
+                return self._service().searchanalytics().query(siteUrl=site_url, body=body).execute()
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_base * (2 ** attempt) + random.uniform(0, self.backoff_base)
+                print(f"Search Console request failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+
+    def _fetch_shard(self, site_url: str, body_base: Dict, start_date: str, end_date: str) -> List[Dict]:
+        body = dict(body_base)
+        body["startDate"] = start_date
+        body["endDate"] = end_date
+        row_limit = min(int(body.get("rowLimit") or MAX_ROW_LIMIT), MAX_ROW_LIMIT)
+        body["rowLimit"] = row_limit
+
+        rows = []
+        start_row = 0
+        while True:
+            body["startRow"] = start_row
+            page = self._execute(site_url, body).get("rows", [])
+            if not page:
+                break
+            rows.extend(page)
+            if len(page) < row_limit:
+                break
+            start_row += len(page)
+        return rows
+
+    def _run(self, site_url: str, body_base: Dict, start_date: str, end_date: str, on_shard: Callable):
+        try:
+            shards = date_shards(start_date, end_date, self.shard_days)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid date range: {str(e)}")
+        if not shards:
+            return []
+        results = [None] * len(shards)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(shards))) as executor:
+            futures = {
+                executor.submit(self._fetch_shard, site_url, body_base, shard_start, shard_end): i
+                for i, (shard_start, shard_end) in enumerate(shards)
+            }
+            try:
+                for future in as_completed(futures):
+                    # Convert each shard as soon as it lands so the raw row dicts
+                    # can be released while the other shards are still in flight
+                    results[futures[future]] = on_shard(future.result())
+            except Exception as e:
+                for future in futures:
+                    future.cancel()
+                raise HTTPException(status_code=500, detail=f"Error fetching site data: {str(e)}")
+
+        print(f"Fetched {len(shards)} Search Console shards for {start_date} to {end_date}")
+        return results
+
+    def fetch_rows(self, site_url: str, body_base: Dict, start_date: str, end_date: str) -> List[Dict]:
+        """Raw rows for the whole range, in shard (date) order"""
+        rows = []
+        for shard_rows in self._run(site_url, body_base, start_date, end_date, lambda shard_rows: shard_rows):
+            rows.extend(shard_rows)
+        return rows
+
+    def fetch_frame(
+        self,
+        site_url: str,
+        body_base: Dict,
+        start_date: str,
+        end_date: str,
+        parse_dates: bool = True,
+    ) -> pd.DataFrame:
+        """The whole range as one typed DataFrame built shard by shard with rows_to_frame"""
+        dimensions = list(body_base["dimensions"])
+        frames = self._run(
+            site_url, body_base, start_date, end_date,
+            lambda shard_rows: rows_to_frame(shard_rows, dimensions=dimensions, parse_dates=parse_dates),
+        )
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame()
+        # Shards carry their own categories, which concat widens back to object
+        df = pd.concat(frames, ignore_index=True)
+        for dimension in CATEGORICAL_DIMENSIONS:
+            if dimension in df.columns and not isinstance(df[dimension].dtype, pd.CategoricalDtype):
+                df[dimension] = pd.Categorical(df[dimension])
+        return df
+
+    async def afetch_frame(self, *args, **kwargs) -> pd.DataFrame:
+        """fetch_frame without blocking the event loop"""
+        return await asyncio.to_thread(self.fetch_frame, *args, **kwargs)
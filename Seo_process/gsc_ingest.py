@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Optional, Iterable
+from branded_matcher import branded_mask
+
+# Low-cardinality dimensions that are stored as pandas categoricals
+CATEGORICAL_DIMENSIONS = ("country", "device", "page")
+METRIC_COLUMNS = {
+    "clicks": np.int64,
+    "impressions": np.int64,
+    "ctr": np.float64,
+    "position": np.float64,
+}
+
+
+def classify_branded(keywords: pd.Series, branded_words: Optional[Iterable[str]]) -> pd.Categorical:
+    """Label every keyword 'Branded' or 'Non-Branded' in one vectorized pass"""
+    is_branded = branded_mask(keywords.to_numpy(), branded_words)
+    return pd.Categorical.from_codes(
+        np.where(is_branded, 0, 1), categories=["Branded", "Non-Branded"]
+    )
+
+
+def rows_to_frame(
+    rows: List[Dict],
+    dimensions: List[str],
+    column_names: Optional[Dict[str, str]] = None,
+    parse_dates: bool = True,
+    branded_words: Optional[List[str]] = None,
+    keyword_dimension: str = "query",
+) -> pd.DataFrame:
+    """
+    Turn a raw searchanalytics `rows` payload into a typed DataFrame.
+
+    Each key position becomes its own column (categoricals for country,
+    device and page, datetime64 for date when parse_dates is set) and the
+    metrics are read straight into int64/float64 arrays. Rows with fewer keys
+    than requested dimensions are dropped. When branded_words is given a
+    categorical `brand_category` column is added from keyword_dimension.
+
+    column_names optionally renames dimensions, e.g. {"date": "Date"}.
+    """
+    if not rows:
+        return pd.DataFrame()
+
+    n_dims = len(dimensions)
+    rows = [row for row in rows if row and len(row.get("keys") or ()) >= n_dims]
+    if not rows:
+        return pd.DataFrame()
+
+    column_names = column_names or {}
+    key_columns = zip(*(row["keys"][:n_dims] for row in rows))
+
+    data = {}
+    for dimension, values in zip(dimensions, key_columns):
+        if dimension in CATEGORICAL_DIMENSIONS:
+            column = pd.Categorical(values)
+        elif dimension == "date" and parse_dates:
+            column = pd.to_datetime(values, format="%Y-%m-%d")
+        else:
+            column = np.array(values, dtype=object)
+        data[column_names.get(dimension, dimension)] = column
+
+    count = len(rows)
+    for metric, dtype in METRIC_COLUMNS.items():
+        data[metric] = np.fromiter((row.get(metric, 0) for row in rows), dtype=dtype, count=count)
+
+    df = pd.DataFrame(data)
+
+    if branded_words is not None:
+        keyword_column = column_names.get(keyword_dimension, keyword_dimension)
+        df["brand_category"] = classify_branded(df[keyword_column], branded_words)
+
+    return df
@@ -0,0 +1,222 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+RANK_GROUPS = ["Top 3", "Top 10", "Top 20+"]
+RANK_GROUP_EDGES = np.array([3, 10], dtype=float)
+
+# Cube grain and additive measures. Means are stored as sums so any slice of
+# the cube gives the same average as the raw rows it was built from.
+ROLLUP_DIMENSIONS = ["date", "device", "rank_group"]
+ROLLUP_MEASURES = {
+    "clicks": "int64",
+    "impressions": "int64",
+    "ctr_sum": "float64",
+    "position_sum": "float64",
+    "rows": "int64",
+}
+
+# Unique counts are not additive, so each day also keeps its distinct
+# (date, device, value) keys per dimension; a window's count is the nunique
+# of the keys in it
+DISTINCT_DIMENSIONS = ["query", "page"]
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def classify_rank_groups(positions) -> pd.Categorical:
+    """Top 3 / Top 10 / Top 20+ for a whole position column"""
+    codes = np.searchsorted(RANK_GROUP_EDGES, np.asarray(positions, dtype=float), side="left")
+    return pd.Categorical.from_codes(codes, categories=RANK_GROUPS)
+
+
+def empty_rollup() -> pd.DataFrame:
+    data = {
+        "date": pd.Series(dtype="datetime64[ns]"),
+        "device": pd.Categorical([]),
+        "rank_group": pd.Categorical([], categories=RANK_GROUPS),
+    }
+    for measure, dtype in ROLLUP_MEASURES.items():
+        data[measure] = pd.Series(dtype=dtype)
+    return pd.DataFrame(data)
+
+
+def finalize_rollup(cube: pd.DataFrame) -> pd.DataFrame:
+    """Restore cube dtypes after a concat or a Parquet round trip"""
+    if cube.empty:
+        return empty_rollup()
+    cube = cube.reset_index(drop=True)
+    if not pd.api.types.is_datetime64_any_dtype(cube["date"]):
+        cube["date"] = pd.to_datetime(cube["date"], format=DATE_FORMAT)
+    cube["device"] = pd.Categorical(cube["device"].astype(object))
+    cube["rank_group"] = pd.Categorical(cube["rank_group"].astype(object), categories=RANK_GROUPS)
+    return cube
+
+
+def empty_keys() -> pd.DataFrame:
+    return pd.DataFrame({
+        "date": pd.Series(dtype="datetime64[ns]"),
+        "device": pd.Categorical([]),
+        "dimension": pd.Categorical([], categories=DISTINCT_DIMENSIONS),
+        "value": pd.Series(dtype=object),
+    })
+
+
+def finalize_keys(keys: pd.DataFrame) -> pd.DataFrame:
+    """Restore distinct-key dtypes after a concat or a Parquet round trip"""
+    if keys.empty:
+        return empty_keys()
+    keys = keys.reset_index(drop=True)
+    if not pd.api.types.is_datetime64_any_dtype(keys["date"]):
+        keys["date"] = pd.to_datetime(keys["date"], format=DATE_FORMAT)
+    keys["device"] = pd.Categorical(keys["device"].astype(object))
+    keys["dimension"] = pd.Categorical(keys["dimension"].astype(object), categories=DISTINCT_DIMENSIONS)
+    return keys
+
+
+def build_distinct_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Distinct query and page values per date x device, in long format
+    (date, device, dimension, value). Much smaller than the raw rows, which
+    repeat each query for every page and country.
+    """
+    if df.empty:
+        return empty_keys()
+    parts = [
+        df[["date", "device", dimension]].drop_duplicates()
+        .rename(columns={dimension: "value"})
+        .assign(dimension=dimension)
+        for dimension in DISTINCT_DIMENSIONS if dimension in df.columns
+    ]
+    if not parts:
+        return empty_keys()
+    keys = pd.concat(parts, ignore_index=True)
+    keys["device"] = keys["device"].astype(object)
+    keys["value"] = keys["value"].astype(object)
+    return finalize_keys(keys[["date", "device", "dimension", "value"]])
+
+
+def build_rollup(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregate Search Console rows to one row per date x device x rank_group.
+
+    Accepts rows_to_frame / warehouse output with either string or datetime
+    dates. Unique query and page counts are not additive across days; they
+    come from build_distinct_keys instead.
+    """
+    if df.empty:
+        return empty_rollup()
+
+    dates = df["date"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format=DATE_FORMAT)
+    rank_group = pd.Series(classify_rank_groups(df["position"].to_numpy()), index=df.index, name="rank_group")
+
+    cube = df.groupby([dates.rename("date"), df["device"], rank_group], observed=True).agg(
+        clicks=("clicks", "sum"),
+        impressions=("impressions", "sum"),
+        ctr_sum=("ctr", "sum"),
+        position_sum=("position", "sum"),
+        rows=("position", "size"),
+    ).reset_index()
+    return finalize_rollup(cube)
+
+
+class DailyRollup:
+    """
+    A date x device x rank_group cube plus, optionally, the per-day distinct
+    query/page keys (`keys`) and the raw rows it was built from (`detail`).
+    Totals, averages, device splits and per-day series are answered from
+    the cube and distinct counts from the keys; without keys, distinct
+    counts fall back to the detail rows.
+    """
+
+    def __init__(self, cube: pd.DataFrame, detail: Optional[pd.DataFrame] = None,
+                 keys: Optional[pd.DataFrame] = None):
+        self.cube = cube
+        self.detail = detail
+        self.keys = keys
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "DailyRollup":
+        return cls(build_rollup(df), detail=df)
+
+    @property
+    def empty(self) -> bool:
+        return self.cube.empty
+
+    def _filter(self, cube_mask, detail_mask) -> "DailyRollup":
+        detail = None
+        if self.detail is not None and not self.detail.empty:
+            detail = self.detail[detail_mask(self.detail)]
+        keys = self.keys[detail_mask(self.keys)] if self.keys is not None else None
+        return DailyRollup(self.cube[cube_mask(self.cube)], detail, keys)
+
+    def window(self, start=None, end=None, end_inclusive: bool = True) -> "DailyRollup":
+        """Days in [start, end] (or [start, end) with end_inclusive=False)"""
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+
+        def mask(frame):
+            keep = np.ones(len(frame), dtype=bool)
+            if start is not None:
+                keep &= (frame["date"] >= start).to_numpy()
+            if end is not None:
+                keep &= (frame["date"] <= end if end_inclusive else frame["date"] < end).to_numpy()
+            return keep
+
+        return self._filter(mask, mask)
+
+    def for_device(self, device) -> "DailyRollup":
+        mask = lambda frame: (frame["device"] == device).to_numpy()
+        return self._filter(mask, mask)
+
+    @property
+    def row_count(self) -> int:
+        return int(self.cube["rows"].sum()) if not self.cube.empty else 0
+
+    def devices(self) -> List:
+        """Devices in order of first appearance by date"""
+        return list(pd.unique(self.cube.sort_values("date")["device"].astype(object)))
+
+    def distinct(self, column: str) -> int:
+        if self.keys is not None:
+            return int(self.keys.loc[(self.keys["dimension"] == column).to_numpy(), "value"].nunique())
+        if self.detail is None or self.detail.empty or column not in self.detail.columns:
+            return 0
+        return int(self.detail[column].nunique())
+
+    def totals(self) -> Dict[str, float]:
+        sums = self.cube[list(ROLLUP_MEASURES)].sum()
+        rows = int(sums["rows"])
+        return {
+            "clicks": int(sums["clicks"]),
+            "impressions": int(sums["impressions"]),
+            "ctr": float(sums["ctr_sum"] / rows) if rows else float("nan"),
+            "position": float(sums["position_sum"] / rows) if rows else float("nan"),
+            "rows": rows,
+        }
+
+    @staticmethod
+    def _means(grouped: pd.DataFrame) -> pd.DataFrame:
+        return pd.DataFrame({
+            "clicks": grouped["clicks"],
+            "impressions": grouped["impressions"],
+            "ctr": grouped["ctr_sum"] / grouped["rows"],
+            "position": grouped["position_sum"] / grouped["rows"],
+            "rows": grouped["rows"],
+        }, index=grouped.index)
+
+    def daily(self) -> pd.DataFrame:
+        """clicks/impressions sums and ctr/position means per date"""
+        return self._means(self.cube.groupby("date")[list(ROLLUP_MEASURES)].sum())
+
+    def by_device(self) -> pd.DataFrame:
+        """clicks/impressions sums and ctr/position means per device"""
+        return self._means(self.cube.groupby("device", observed=True)[list(ROLLUP_MEASURES)].sum())
+
+    def rank_counts(self) -> pd.DataFrame:
+        """Row count per date and rank group, one column per group"""
+        counts = self.cube.groupby(["date", "rank_group"], observed=True)["rows"].sum().unstack(fill_value=0).sort_index()
+        counts.columns = counts.columns.astype(str)
+        return counts.reindex(columns=RANK_GROUPS, fill_value=0)
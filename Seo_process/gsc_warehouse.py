@@ -0,0 +1,338 @@
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import pandas as pd
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from Seo_process.gsc_ingest import CATEGORICAL_DIMENSIONS, METRIC_COLUMNS, rows_to_frame
+from Seo_process.gsc_rollup import DailyRollup, build_distinct_keys, build_rollup, finalize_keys, finalize_rollup
+load_dotenv()
+
+GSC_WAREHOUSE_DIR = os.environ.get("GSC_WAREHOUSE_DIR", "gsc_warehouse")
+# Search Console keeps revising the most recent days, so they are always
+# re-fetched and never written to the warehouse.
+GSC_FRESHNESS_DAYS = int(os.environ.get("GSC_FRESHNESS_DAYS", 3))
+# Search Console only keeps 16 months of data; older days are deleted
+GSC_WAREHOUSE_RETENTION_DAYS = int(os.environ.get("GSC_WAREHOUSE_RETENTION_DAYS", 490))
+# Partitions nobody has loaded for this long are removed entirely
+GSC_WAREHOUSE_IDLE_DAYS = int(os.environ.get("GSC_WAREHOUSE_IDLE_DAYS", 30))
+GSC_WAREHOUSE_CLEANUP_INTERVAL = int(os.environ.get("GSC_WAREHOUSE_CLEANUP_INTERVAL", 3600))
+
+# Dimension order every partition is stored (and fetched) in
+WAREHOUSE_DIMENSIONS = ["query", "page", "country", "date", "device"]
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def _day_range(start_date: str, end_date: str) -> List[str]:
+    start_dt = datetime.strptime(start_date, DATE_FORMAT)
+    end_dt = datetime.strptime(end_date, DATE_FORMAT)
+    return [(start_dt + timedelta(days=i)).strftime(DATE_FORMAT) for i in range((end_dt - start_dt).days + 1)]
+
+
+def _contiguous_ranges(days: List[str]) -> List[Tuple[str, str]]:
+    """Collapse a sorted list of days into (start, end) runs"""
+    ranges = []
+    for day in days:
+        day_dt = datetime.strptime(day, DATE_FORMAT)
+        if ranges and datetime.strptime(ranges[-1][1], DATE_FORMAT) + timedelta(days=1) == day_dt:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+def _empty_partition() -> pd.DataFrame:
+    data = {dimension: pd.Series(dtype=object) for dimension in WAREHOUSE_DIMENSIONS}
+    for metric, dtype in METRIC_COLUMNS.items():
+        data[metric] = pd.Series(dtype=dtype)
+    return pd.DataFrame(data)
+
+
+def _finalize(df: pd.DataFrame, parse_dates: bool) -> pd.DataFrame:
+    """Give a concatenated warehouse frame the same dtypes as rows_to_frame"""
+    if df.empty:
+        return pd.DataFrame()
+    df = df.reset_index(drop=True)
+    for dimension in CATEGORICAL_DIMENSIONS:
+        if dimension in df.columns:
+            df[dimension] = pd.Categorical(df[dimension])
+    if parse_dates and "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], format=DATE_FORMAT)
+    return df
+
+
+class SearchConsoleWarehouse:
+    """
+    Local store of Search Console rows, one Parquet file per day.
+
+    Partitions live under <root>/<partition key>/<YYYY-MM-DD>.parquet, where
+    the partition key is derived from (site, search type, country, device).
+    Each stored day also gets its date x device x rank_group rollup cube
+    (see Seo_process.gsc_rollup) under <partition key>/rollups/ and its
+    distinct query/page keys under <partition key>/keys/, both written once
+    when the day is ingested.
+    A load only calls the API for days that are missing (grouped into
+    contiguous ranges) or still inside the freshness window; everything
+    else is read from disk. Days with no data are stored as empty files so
+    they are not fetched again.
+
+    Partitions are shared by everyone who can read the property, so every
+    load runs the caller's authorize() check first, even when no API call
+    would be needed. Days past the retention window and partitions idle
+    for GSC_WAREHOUSE_IDLE_DAYS are removed by cleanup().
+    """
+
+    def __init__(self, root: str = GSC_WAREHOUSE_DIR, freshness_days: int = GSC_FRESHNESS_DAYS,
+                 retention_days: int = GSC_WAREHOUSE_RETENTION_DAYS, idle_days: int = GSC_WAREHOUSE_IDLE_DAYS):
+        self.root = root
+        self.freshness_days = freshness_days
+        self.retention_days = retention_days
+        self.idle_days = idle_days
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._last_cleanup = 0.0
+
+    @staticmethod
+    def partition_key(site_url: str, search_type: str, country: Optional[str], device: Optional[str]) -> str:
+        device = (device or "all").lower()
+        country = (country or "all").lower()
+        raw = "|".join([str(site_url).strip().lower(), (search_type or "web").lower(), country, device])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _partition_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _day_path(self, key: str, day: str) -> str:
+        return os.path.join(self._partition_dir(key), f"{day}.parquet")
+
+    def _rollup_path(self, key: str, day: str) -> str:
+        return os.path.join(self._partition_dir(key), "rollups", f"{day}.parquet")
+
+    def _keys_path(self, key: str, day: str) -> str:
+        return os.path.join(self._partition_dir(key), "keys", f"{day}.parquet")
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _is_fresh(self, day: str) -> bool:
+        cutoff = (datetime.utcnow() - timedelta(days=self.freshness_days)).strftime(DATE_FORMAT)
+        return day >= cutoff
+
+    def cached_days(self, key: str) -> set:
+        directory = self._partition_dir(key)
+        if not os.path.isdir(directory):
+            return set()
+        return {name[:-len(".parquet")] for name in os.listdir(directory) if name.endswith(".parquet")}
+
+    @staticmethod
+    def _write_parquet(path: str, frame: pd.DataFrame):
+        # Unique temp name: other worker processes may write the same day
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _touch(self, key: str):
+        marker = os.path.join(self._partition_dir(key), ".last_access")
+        with open(marker, "a"):
+            pass
+        os.utime(marker, None)
+
+    def _evict_old_days(self, key: str):
+        cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).strftime(DATE_FORMAT)
+        for day in self.cached_days(key):
+            if day < cutoff:
+                for path in (self._day_path(key, day), self._rollup_path(key, day), self._keys_path(key, day)):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def cleanup(self):
+        """Drop days older than the retention window and partitions idle for idle_days"""
+        if not os.path.isdir(self.root):
+            return
+        idle_cutoff = time.time() - self.idle_days * 86400
+        for key in os.listdir(self.root):
+            directory = self._partition_dir(key)
+            if not os.path.isdir(directory):
+                continue
+            with self._lock_for(key):
+                marker = os.path.join(directory, ".last_access")
+                last_access = os.path.getmtime(marker) if os.path.exists(marker) else os.path.getmtime(directory)
+                if last_access < idle_cutoff:
+                    print(f"Search Console warehouse: removing idle partition {key}")
+                    shutil.rmtree(directory, ignore_errors=True)
+                else:
+                    self._evict_old_days(key)
+
+    def _maybe_cleanup(self):
+        with self._locks_guard:
+            if time.monotonic() - self._last_cleanup < GSC_WAREHOUSE_CLEANUP_INTERVAL and self._last_cleanup:
+                return
+            self._last_cleanup = time.monotonic()
+        try:
+            self.cleanup()
+        except OSError as e:
+            print(f"Search Console warehouse cleanup failed: {e}")
+
+    def _write_day(self, key: str, day: str, frame: pd.DataFrame):
+        # Rollup and keys first: a day only counts as cached once its rows file exists
+        self._write_derived(self._rollup_path(key, day), build_rollup(frame))
+        self._write_derived(self._keys_path(key, day), build_distinct_keys(frame))
+        self._write_parquet(self._day_path(key, day), frame)
+
+    def _write_derived(self, path: str, frame: pd.DataFrame):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_parquet(path, frame)
+
+    def _read_derived(self, path: str, key: str, day: str, build: Callable) -> pd.DataFrame:
+        if os.path.exists(path):
+            return pd.read_parquet(path)
+        # Day ingested before this file existed: build and keep it now
+        derived = build(pd.read_parquet(self._day_path(key, day)))
+        self._write_derived(path, derived)
+        return derived
+
+    def _read_rollup(self, key: str, day: str) -> pd.DataFrame:
+        return self._read_derived(self._rollup_path(key, day), key, day, build_rollup)
+
+    def _read_keys(self, key: str, day: str) -> pd.DataFrame:
+        return self._read_derived(self._keys_path(key, day), key, day, build_distinct_keys)
+
+    def _fetch_range(self, fetch_rows: Callable, start_date: str, end_date: str) -> pd.DataFrame:
+        fetched = fetch_rows(start_date, end_date)
+        if isinstance(fetched, pd.DataFrame):
+            df = fetched
+        else:
+            df = rows_to_frame(fetched, dimensions=WAREHOUSE_DIMENSIONS, parse_dates=False)
+        if df.empty:
+            return _empty_partition()
+        for dimension in CATEGORICAL_DIMENSIONS:
+            df[dimension] = df[dimension].astype(object)
+        return df
+
+    def load(
+        self,
+        site_url: str,
+        search_type: str,
+        country: Optional[str],
+        device: Optional[str],
+        start_date: str,
+        end_date: str,
+        fetch_rows: Callable[[str, str], list],
+        authorize: Callable[[], None],
+        parse_dates: bool = True,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Return every row between start_date and end_date (inclusive).
+
+        fetch_rows(start_date, end_date) must return raw searchanalytics rows
+        with WAREHOUSE_DIMENSIONS as keys, or an already structured frame with
+        string dates; it is only called for the days the warehouse cannot
+        serve. authorize() must raise if the caller may not read site_url;
+        it runs before anything is read. columns, when given, limits which
+        columns are read back.
+        """
+        return self._load(
+            site_url, search_type, country, device, start_date, end_date,
+            fetch_rows, authorize, parse_dates, columns, with_rollup=False, with_detail=True
+        )
+
+    def load_rollup(
+        self,
+        site_url: str,
+        search_type: str,
+        country: Optional[str],
+        device: Optional[str],
+        start_date: str,
+        end_date: str,
+        fetch_rows: Callable[[str, str], list],
+        authorize: Callable[[], None],
+        columns: Optional[List[str]] = None,
+        with_detail: bool = True,
+    ) -> DailyRollup:
+        """
+        Like load, but returns a DailyRollup. Stored days are answered from
+        their precomputed cubes and distinct keys. The raw rows (limited to
+        columns) are only read back as the rollup's detail when with_detail
+        is set; views that need nothing beyond totals, series and distinct
+        counts should pass with_detail=False.
+        """
+        return self._load(
+            site_url, search_type, country, device, start_date, end_date,
+            fetch_rows, authorize, True, columns, with_rollup=True, with_detail=with_detail
+        )
+
+    def _load(self, site_url, search_type, country, device, start_date, end_date,
+              fetch_rows, authorize, parse_dates, columns, with_rollup, with_detail):
+        authorize()
+        self._maybe_cleanup()
+        key = self.partition_key(site_url, search_type, country, device)
+        days = _day_range(start_date, end_date)
+
+        with self._lock_for(key):
+            os.makedirs(self._partition_dir(key), exist_ok=True)
+            self._touch(key)
+            cached = self.cached_days(key)
+            to_fetch = [day for day in days if day not in cached or self._is_fresh(day)]
+
+            fetched = []
+            for range_start, range_end in _contiguous_ranges(to_fetch):
+                print(f"Search Console warehouse: fetching {range_start} to {range_end}")
+                df = self._fetch_range(fetch_rows, range_start, range_end)
+                fetched.append(df)
+
+                by_day = dict(tuple(df.groupby("date", sort=False))) if not df.empty else {}
+                for day in _day_range(range_start, range_end):
+                    if self._is_fresh(day):
+                        continue
+                    self._write_day(key, day, by_day.get(day, _empty_partition()))
+
+            fetched_days = set(to_fetch)
+            stored_days = [day for day in days if day not in fetched_days]
+            frames = [pd.read_parquet(self._day_path(key, day), columns=columns) for day in stored_days] if with_detail else []
+            cubes = [self._read_rollup(key, day) for day in stored_days] if with_rollup else []
+            keys = [self._read_keys(key, day) for day in stored_days] if with_rollup else []
+
+        print(f"Search Console warehouse: {len(days) - len(to_fetch)} days from disk, {len(to_fetch)} days from the API")
+        if with_rollup:
+            cubes += [build_rollup(frame) for frame in fetched]
+            keys += [build_distinct_keys(frame) for frame in fetched]
+        if not with_detail:
+            fetched = []
+        if columns is not None:
+            fetched = [df[[column for column in columns if column in df.columns]] for df in fetched]
+        frames = [frame for frame in frames + fetched if not frame.empty]
+        df = _finalize(pd.concat(frames, ignore_index=True), parse_dates) if frames else pd.DataFrame()
+        if not with_rollup:
+            return df
+
+        cubes = [cube for cube in cubes if not cube.empty]
+        cube = finalize_rollup(pd.concat(cubes, ignore_index=True) if cubes else pd.DataFrame())
+        keys = [frame for frame in keys if not frame.empty]
+        keys = finalize_keys(pd.concat(keys, ignore_index=True) if keys else pd.DataFrame())
+        return DailyRollup(cube, detail=df if with_detail else None, keys=keys)
+
+
+_warehouse: Optional[SearchConsoleWarehouse] = None
+_warehouse_lock = threading.Lock()
+
+
+def get_warehouse() -> SearchConsoleWarehouse:
+    """Process-wide warehouse instance"""
+    global _warehouse
+    with _warehouse_lock:
+        if _warehouse is None:
+            _warehouse = SearchConsoleWarehouse()
+        return _warehouse
@@ -2,18 +2,76 @@ import pandas as pd
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import numpy as np
+from dataclasses import dataclass
+from functools import cached_property
+from Seo_process.gsc_ingest import rows_to_frame
+
+RANK_BUCKETS = ["Top 3", "Top 4–10", "Top 11–20", "Pos 21+"]
+# Upper (inclusive) position bound of every bucket except the last
+RANK_BUCKET_EDGES = np.array([3, 10, 20], dtype=float)
+# Two URLs this many positions apart (or more) no longer count as overlapping
+POSITION_OVERLAP_WINDOW = 10.0
+# Column suffix used for each bucket in the daily time series
+RANK_BUCKET_KEYS = {
+    "Top 3": "top_3",
+    "Top 4–10": "top_4_10",
+    "Top 11–20": "top_11_20",
+    "Pos 21+": "pos_21_plus",
+}
+
+
+def classify_buckets(positions) -> pd.Categorical:
+    """
+    Vectorized equivalent of RankingKeywordsAnalyzer._classify_bucket.
+
+    searchsorted(side='left') maps pos <= 3 to 0, 3 < pos <= 10 to 1 and so
+    on; NaN sorts past every edge so it lands in "Pos 21+" like before.
+    """
+    codes = np.searchsorted(RANK_BUCKET_EDGES, np.asarray(positions, dtype=float), side="left")
+    return pd.Categorical.from_codes(codes, categories=RANK_BUCKETS)
+
+
+def aggregate_query_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-query position mean and click/impression sums for one period"""
+    return df.groupby('query').agg({
+        'position': 'mean',
+        'clicks': 'sum',
+        'impressions': 'sum'
+    })
+
+
+@dataclass(frozen=True)
+class RankingFrames:
+    """
+    Immutable inputs for one analysis: the structured frame and its current
+    and previous period slices. Per-query aggregates are computed on first
+    use and shared by every view built from the same frames.
+    """
+    combined: pd.DataFrame
+    current: pd.DataFrame
+    prev: pd.DataFrame
+
+    @cached_property
+    def current_query_metrics(self) -> pd.DataFrame:
+        return aggregate_query_metrics(self.current)
+
+    @cached_property
+    def prev_query_metrics(self) -> pd.DataFrame:
+        return aggregate_query_metrics(self.prev)
+
 
 class RankingKeywordsAnalyzer:
     """
     A comprehensive class to analyze SEO ranking keywords data.
     Handles data processing, period comparisons, and metric calculations.
+    
+    The analyzer keeps no per-request state: every stage takes and returns
+    frames (see RankingFrames), so one instance can serve concurrent
+    requests from a thread pool.
     """
     
     def __init__(self):
-        self.all_buckets = ["Top 3", "Top 4–10", "Top 11–20", "Pos 21+"]
-        self.df_current = None
-        self.df_prev = None
-        self.df_combined = None
+        self.all_buckets = RANK_BUCKETS
         
     def analyze_keywords(self, 
                         site_url: str,
@@ -33,7 +91,7 @@ class RankingKeywordsAnalyzer:
             search_type: Search type (WEB, IMAGE, VIDEO)
             start_date: Start date in YYYY-MM-DD format
             end_date: End date in YYYY-MM-DD format
-            get_site_data_func: Function to fetch raw data
+            get_site_data_func: Function returning raw rows or a structured DataFrame
             
         Returns:
             Dict containing all analyzed data
@@ -53,20 +111,36 @@ class RankingKeywordsAnalyzer:
                 end_date=end_dt.strftime("%Y-%m-%d")
             )
             
-            if not raw_data:
+            if raw_data is None or len(raw_data) == 0:
                 return self._empty_response()
             
+            return self.analyze_frame(raw_data, start_date, end_date)
+            
+        except Exception as e:
+            raise Exception(f"Error in RankingKeywordsAnalyzer: {str(e)}")
+    
+    def analyze_frame(self, raw_data, start_date: str, end_date: str) -> Dict[str, Any]:
+        """
+        Run the analysis on data that has already been fetched.
+        
+        Args:
+            raw_data: Raw rows or a structured DataFrame covering at least the
+                previous and current periods
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+        """
+        try:
+            start_dt, end_dt, prev_start_dt, prev_end_dt = self._calculate_periods(start_date, end_date)
+            
             # 3. Structure dataframe and split periods
-            self.df_combined = self._structure_dataframe(raw_data)
-            if self.df_combined.empty:
+            frames = self.prepare_frames(raw_data, start_date, end_date)
+            if frames is None:
                 return self._empty_response()
-                
-            self._split_periods(start_dt, end_dt, prev_start_dt, prev_end_dt)
             
             # 4. Generate all analysis components
-            bucket_matrix = self._calculate_bucket_matrix()
-            daily_time_series = self._calculate_daily_time_series(start_dt, end_dt)
-            improved_keywords, declined_keywords = self._calculate_keyword_changes()
+            bucket_matrix = self._calculate_bucket_matrix(frames)
+            daily_time_series = self._calculate_daily_time_series(frames, start_dt, end_dt)
+            improved_keywords, declined_keywords = self._calculate_keyword_changes(frames)
             
             # 5. Return comprehensive response
             return {
@@ -79,12 +153,21 @@ class RankingKeywordsAnalyzer:
                     "start_date": start_dt.strftime('%Y-%m-%d'),
                     "end_date": end_dt.strftime('%Y-%m-%d')
                 },
-                # "summary_stats": self._calculate_summary_stats()
+                # "summary_stats": self._calculate_summary_stats(frames)
             }
             
         except Exception as e:
             raise Exception(f"Error in RankingKeywordsAnalyzer: {str(e)}")
     
+    def prepare_frames(self, raw_data, start_date: str, end_date: str) -> Optional[RankingFrames]:
+        """Structure raw data and split it into periods; None when there is nothing to analyze."""
+        start_dt, end_dt, prev_start_dt, prev_end_dt = self._calculate_periods(start_date, end_date)
+        combined = self._structure_dataframe(raw_data)
+        if combined.empty:
+            return None
+        current, prev = self._split_periods(combined, start_dt, end_dt, prev_start_dt, prev_end_dt)
+        return RankingFrames(combined=combined, current=current, prev=prev)
+    
     def _calculate_periods(self, start_date: str, end_date: str) -> tuple:
         """Calculate current and previous periods."""
         start_dt = datetime.strptime(start_date, "%Y-%m-%d")
@@ -99,20 +182,26 @@ class RankingKeywordsAnalyzer:
     def _structure_dataframe(self, raw_data: List[Dict]) -> pd.DataFrame:
         """Convert raw data to structured DataFrame."""
         try:
-            if not raw_data or len(raw_data) == 0:
+            if raw_data is None or len(raw_data) == 0:
                 return pd.DataFrame()
             
-            df = pd.DataFrame(raw_data)
-            keys_df = pd.DataFrame(df['keys'].tolist(),columns=['query','page','country','Date','device'])
-            df = pd.concat([keys_df, df.drop(columns=['keys'])], axis=1)
-            df['Date'] = pd.to_datetime(df['Date'])
-            df[['clicks','impressions','ctr','position']] = df[['clicks','impressions','ctr','position']].apply(pd.to_numeric)
+            if isinstance(raw_data, pd.DataFrame):
+                # Already structured (e.g. served from the Search Console warehouse)
+                df = raw_data.rename(columns={'date': 'Date'})
+            else:
+                df = rows_to_frame(
+                    raw_data,
+                    dimensions=['query', 'page', 'country', 'date', 'device'],
+                    column_names={'date': 'Date'}
+                )
+            if df.empty:
+                return df
 
             # Ensure Date column is datetime
             # df['Date'] = pd.to_datetime(df['Date'])
             
             # Add ranking bucket
-            df['rank_bucket'] = df['position'].apply(self._classify_bucket)
+            df['rank_bucket'] = classify_buckets(df['position'].to_numpy())
             
             return df
             
@@ -133,25 +222,24 @@ class RankingKeywordsAnalyzer:
         else:
             return "Pos 21+"
     
-    def _split_periods(self, start_dt, end_dt, prev_start_dt, prev_end_dt):
+    def _split_periods(self, df_combined: pd.DataFrame, start_dt, end_dt, prev_start_dt, prev_end_dt) -> tuple:
         """Split combined dataframe into current and previous periods."""
-        mask_cur = (self.df_combined['Date'] >= start_dt) & (self.df_combined['Date'] <= end_dt)
-        mask_prv = (self.df_combined['Date'] >= prev_start_dt) & (self.df_combined['Date'] <= prev_end_dt)
+        mask_cur = (df_combined['Date'] >= start_dt) & (df_combined['Date'] <= end_dt)
+        mask_prv = (df_combined['Date'] >= prev_start_dt) & (df_combined['Date'] <= prev_end_dt)
         
-        self.df_current = self.df_combined.loc[mask_cur].copy()
-        self.df_prev = self.df_combined.loc[mask_prv].copy()
+        return df_combined.loc[mask_cur], df_combined.loc[mask_prv]
     
-    def _calculate_bucket_matrix(self) -> List[Dict]:
+    def _calculate_bucket_matrix(self, frames: RankingFrames) -> List[Dict]:
         """Calculate bucket matrix with counts and changes."""
         # Count unique keywords per bucket
         cur_counts = (
-            self.df_current.groupby('rank_bucket')['query']
+            frames.current.groupby('rank_bucket', observed=True)['query']
             .nunique()
             .reindex(self.all_buckets, fill_value=0)
         )
         
         prev_counts = (
-            self.df_prev.groupby('rank_bucket')['query']
+            frames.prev.groupby('rank_bucket', observed=True)['query']
             .nunique()
             .reindex(self.all_buckets, fill_value=0)
         )
@@ -165,17 +253,19 @@ class RankingKeywordsAnalyzer:
         bucket_matrix['delta_abs'] = bucket_matrix['current_count'] - bucket_matrix['previous_count']
         
         # Calculate percentage change
-        bucket_matrix['delta_pct'] = bucket_matrix.apply(
-            lambda row: (
-                (row['current_count'] - row['previous_count']) / row['previous_count'] * 100
-                if row['previous_count'] > 0 
-                else (100 if row['current_count'] > 0 else 0)
-            ), axis=1
-        ).round(1)
+        current = bucket_matrix['current_count'].to_numpy(dtype=float)
+        previous = bucket_matrix['previous_count'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_pct = np.where(
+                previous > 0,
+                (current - previous) / previous * 100,
+                np.where(current > 0, 100.0, 0.0)
+            )
+        bucket_matrix['delta_pct'] = np.round(delta_pct, 1)
         
         return bucket_matrix.to_dict('records')
     
-    def _calculate_daily_time_series(self, start_dt, end_dt) -> List[Dict]:
+    def _calculate_daily_time_series(self, frames: RankingFrames, start_dt, end_dt) -> List[Dict]:
         """Calculate comprehensive daily time series with all metrics."""
         # Prepare aggregation functions
         agg_functions = {
@@ -185,87 +275,41 @@ class RankingKeywordsAnalyzer:
             'ctr': 'mean',
             'position': 'mean'
         }
+        # (aggregated column, output prefix, formatter)
+        metric_columns = [
+            ('query', 'keywords', lambda values: values.astype(np.int64)),
+            ('clicks', 'clicks', lambda values: values.astype(np.int64)),
+            ('impressions', 'impressions', lambda values: values.astype(np.int64)),
+            # CTR (keep as decimal, frontend will convert to percentage)
+            ('ctr', 'ctr', lambda values: values.round(4)),
+            ('position', 'position', lambda values: values.round(1)),
+        ]
+        
+        all_dates = pd.date_range(start=start_dt, end=end_dt, freq='D')
+        
+        # One groupby, then pivot every metric to a (date x bucket) grid at once
+        daily_metrics = frames.current.groupby(['Date', 'rank_bucket'], observed=True).agg(agg_functions)
+        wide = daily_metrics.unstack('rank_bucket') if not daily_metrics.empty else None
+        
+        columns = {'date': all_dates.strftime('%Y-%m-%d')}
+        for metric, prefix, formatter in metric_columns:
+            if wide is None:
+                grid = pd.DataFrame(0.0, index=all_dates, columns=self.all_buckets)
+            else:
+                grid = wide[metric]
+                grid.columns = grid.columns.astype(str)
+                grid = grid.reindex(index=all_dates, columns=self.all_buckets).fillna(0)
+            for bucket in self.all_buckets:
+                columns[f"{prefix}_{RANK_BUCKET_KEYS[bucket]}"] = formatter(grid[bucket].to_numpy(dtype=float))
         
-        # Group by date and rank bucket
-        daily_metrics = self.df_current.groupby(['Date', 'rank_bucket']).agg(agg_functions).reset_index()
-        daily_metrics = daily_metrics.rename(columns={
-            'query': 'keywords_count',
-            'clicks': 'total_clicks',
-            'impressions': 'total_impressions',
-            'ctr': 'avg_ctr',
-            'position': 'avg_position'
-        })
-        
-        # Create pivot tables for each metric
-        metrics_pivots = {}
-        for metric in ['keywords_count', 'total_clicks', 'total_impressions', 'avg_ctr', 'avg_position']:
-            pivot = daily_metrics.pivot(
-                index='Date',
-                columns='rank_bucket',
-                values=metric
-            ).fillna(0)
-            
-            # Ensure all dates and buckets are present
-            all_dates = pd.date_range(start=start_dt, end=end_dt, freq='D')
-            pivot = pivot.reindex(all_dates, fill_value=0)
-            pivot = pivot.reindex(columns=self.all_buckets, fill_value=0)
-            
-            metrics_pivots[metric] = pivot
-        
-        # Combine into comprehensive daily records
-        daily_time_series = []
-        for date in pd.date_range(start=start_dt, end=end_dt, freq='D'):
-            daily_record = {
-                'date': date.strftime('%Y-%m-%d'),
-                # Keywords count
-                'keywords_top_3': int(metrics_pivots['keywords_count'].loc[date, 'Top 3']),
-                'keywords_top_4_10': int(metrics_pivots['keywords_count'].loc[date, 'Top 4–10']),
-                'keywords_top_11_20': int(metrics_pivots['keywords_count'].loc[date, 'Top 11–20']),
-                'keywords_pos_21_plus': int(metrics_pivots['keywords_count'].loc[date, 'Pos 21+']),
-                
-                # Clicks
-                'clicks_top_3': int(metrics_pivots['total_clicks'].loc[date, 'Top 3']),
-                'clicks_top_4_10': int(metrics_pivots['total_clicks'].loc[date, 'Top 4–10']),
-                'clicks_top_11_20': int(metrics_pivots['total_clicks'].loc[date, 'Top 11–20']),
-                'clicks_pos_21_plus': int(metrics_pivots['total_clicks'].loc[date, 'Pos 21+']),
-                
-                # Impressions
-                'impressions_top_3': int(metrics_pivots['total_impressions'].loc[date, 'Top 3']),
-                'impressions_top_4_10': int(metrics_pivots['total_impressions'].loc[date, 'Top 4–10']),
-                'impressions_top_11_20': int(metrics_pivots['total_impressions'].loc[date, 'Top 11–20']),
-                'impressions_pos_21_plus': int(metrics_pivots['total_impressions'].loc[date, 'Pos 21+']),
-                
-                # CTR (keep as decimal, frontend will convert to percentage)
-                'ctr_top_3': round(float(metrics_pivots['avg_ctr'].loc[date, 'Top 3']), 4),
-                'ctr_top_4_10': round(float(metrics_pivots['avg_ctr'].loc[date, 'Top 4–10']), 4),
-                'ctr_top_11_20': round(float(metrics_pivots['avg_ctr'].loc[date, 'Top 11–20']), 4),
-                'ctr_pos_21_plus': round(float(metrics_pivots['avg_ctr'].loc[date, 'Pos 21+']), 4),
-                
-                # Average Position
-                'position_top_3': round(float(metrics_pivots['avg_position'].loc[date, 'Top 3']), 1),
-                'position_top_4_10': round(float(metrics_pivots['avg_position'].loc[date, 'Top 4–10']), 1),
-                'position_top_11_20': round(float(metrics_pivots['avg_position'].loc[date, 'Top 11–20']), 1),
-                'position_pos_21_plus': round(float(metrics_pivots['avg_position'].loc[date, 'Pos 21+']), 1),
-            }
-            daily_time_series.append(daily_record)
-        
-        return daily_time_series
+        return pd.DataFrame(columns).to_dict('records')
     
-    def _calculate_keyword_changes(self) -> tuple:
+    def _calculate_keyword_changes(self, frames: RankingFrames) -> tuple:
         """Calculate improved and declined keywords with clicks, impressions, CTR and position changes."""
         
         # Calculate aggregated metrics for each keyword in both periods
-        current_metrics = self.df_current.groupby('query').agg({
-            'position': 'mean',
-            'clicks': 'sum',
-            'impressions': 'sum'
-        }).round(1)
-        
-        prev_metrics = self.df_prev.groupby('query').agg({
-            'position': 'mean',
-            'clicks': 'sum',
-            'impressions': 'sum'
-        }).round(1)
+        current_metrics = frames.current_query_metrics.round(1)
+        prev_metrics = frames.prev_query_metrics.round(1)
         
         # Calculate CTR for both periods
         current_metrics['ctr'] = (current_metrics['clicks'] / current_metrics['impressions'] * 100).round(2)
@@ -383,25 +427,25 @@ class RankingKeywordsAnalyzer:
         
         return improved_keywords.to_dict('records'), declined_keywords.to_dict('records')
     
-    def _calculate_summary_stats(self) -> Dict[str, Any]:
+    def _calculate_summary_stats(self, frames: RankingFrames) -> Dict[str, Any]:
         """Calculate summary statistics for the dashboard."""
-        if self.df_current.empty or self.df_prev.empty:
+        if frames.current.empty or frames.prev.empty:
             return {}
         
         current_stats = {
-            'total_keywords': self.df_current['query'].nunique(),
-            'total_clicks': self.df_current['clicks'].sum(),
-            'total_impressions': self.df_current['impressions'].sum(),
-            'avg_ctr': self.df_current['ctr'].mean(),
-            'avg_position': self.df_current['position'].mean()
+            'total_keywords': len(frames.current_query_metrics),
+            'total_clicks': frames.current_query_metrics['clicks'].sum(),
+            'total_impressions': frames.current_query_metrics['impressions'].sum(),
+            'avg_ctr': frames.current['ctr'].mean(),
+            'avg_position': frames.current['position'].mean()
         }
         
         previous_stats = {
-            'total_keywords': self.df_prev['query'].nunique(),
-            'total_clicks': self.df_prev['clicks'].sum(),
-            'total_impressions': self.df_prev['impressions'].sum(),
-            'avg_ctr': self.df_prev['ctr'].mean(),
-            'avg_position': self.df_prev['position'].mean()
+            'total_keywords': len(frames.prev_query_metrics),
+            'total_clicks': frames.prev_query_metrics['clicks'].sum(),
+            'total_impressions': frames.prev_query_metrics['impressions'].sum(),
+            'avg_ctr': frames.prev['ctr'].mean(),
+            'avg_position': frames.prev['position'].mean()
         }
         
         # Calculate changes
@@ -432,6 +476,9 @@ class RankingKeywordsAnalyzer:
             "summary_stats": {}
         }
 
+# Stateless, so one instance is shared by every request
+ranking_analyzer = RankingKeywordsAnalyzer()
+
 # Additional utility functions that can be used independently
 
 class SEOMetricsCalculator:
@@ -450,27 +497,79 @@ class SEOMetricsCalculator:
         return round((weighted_score / total_possible) * 100, 2) if total_possible > 0 else 0.0
     
     @staticmethod
-    def detect_keyword_cannibalization(df: pd.DataFrame) -> List[Dict]:
-        """Detect potential keyword cannibalization."""
-        cannibalization_issues = []
+    def detect_keyword_cannibalization(df: pd.DataFrame, top_n: int = 10,
+                                       overlap_window: float = POSITION_OVERLAP_WINDOW) -> List[Dict]:
+        """
+        Detect potential keyword cannibalization (several URLs ranking for one query).
         
-        # Group by query and count unique URLs
-        query_urls = df.groupby('query')['page'].nunique().reset_index()
-        query_urls = query_urls[query_urls['page'] > 1]  # Multiple URLs for same query
+        Everything is computed from one (query, page) groupby: queries with
+        more than one URL are ranked by total impressions and the top_n are
+        returned. Competing URLs are ordered by click share, then position.
+        position_overlap is 1 when the two best URLs rank at the same average
+        position and falls to 0 once they are overlap_window positions apart.
+        """
+        if df.empty:
+            return []
+        
+        # Per (query, URL) aggregates in a single pass
+        pages = df.groupby(['query', 'page'], observed=True, sort=False).agg(
+            clicks=('clicks', 'sum'),
+            impressions=('impressions', 'sum'),
+            position=('position', 'mean')
+        ).reset_index()
+        
+        url_counts = pages.groupby('query', sort=False)['page'].transform('size')
+        pages = pages[url_counts > 1]
+        if pages.empty:
+            return []
+        
+        # Query level totals, restricted to the top_n by impressions
+        competing = df[df['query'].isin(pages['query'].unique())]
+        queries = competing.groupby('query', sort=False).agg(
+            avg_position=('position', 'mean'),
+            total_impressions=('impressions', 'sum'),
+            total_clicks=('clicks', 'sum')
+        ).nlargest(top_n, 'total_impressions')
+        
+        pages = pages[pages['query'].isin(queries.index)]
+        query_clicks = pages['query'].map(queries['total_clicks'])
+        query_impressions = pages['query'].map(queries['total_impressions'])
+        pages = pages.assign(
+            click_share=np.where(query_clicks > 0, pages['clicks'] / query_clicks.where(query_clicks > 0, 1), 0.0),
+            impression_share=np.where(query_impressions > 0, pages['impressions'] / query_impressions.where(query_impressions > 0, 1), 0.0)
+        )
         
-        for _, row in query_urls.iterrows():
-            query = row['query']
-            query_data = df[df['query'] == query]
-            urls = query_data['page'].unique()
-            
+        # Gap between the two best ranked URLs of every query
+        by_position = pages.sort_values(['query', 'position'])
+        position_rank = by_position.groupby('query', sort=False).cumcount()
+        best = by_position.loc[position_rank == 0].set_index('query')['position']
+        runner_up = by_position.loc[position_rank == 1].set_index('query')['position']
+        gap = (runner_up - best).reindex(queries.index)
+        queries['position_overlap'] = (1 - (gap / overlap_window).clip(0, 1)).round(3)
+        
+        pages = pages.assign(position_gap=pages['position'] - pages['query'].map(best))
+        pages = pages.sort_values(['query', 'click_share', 'position'], ascending=[True, False, True])
+        url_details = {
+            query: group[['page', 'clicks', 'impressions', 'click_share', 'impression_share', 'position', 'position_gap']]
+            .round({'click_share': 4, 'impression_share': 4, 'position': 2, 'position_gap': 2})
+            .to_dict('records')
+            for query, group in pages.groupby('query', sort=False)
+        }
+        
+        cannibalization_issues = []
+        for query, row in zip(queries.index, queries.itertuples(index=False)):
+            urls = url_details[query]
             cannibalization_issues.append({
                 'keyword': query,
-                'competing_urls': list(urls),
-                'avg_position': query_data['position'].mean(),
-                'total_impressions': query_data['impressions'].sum()
+                'competing_urls': [url['page'] for url in urls],
+                'avg_position': float(row.avg_position),
+                'total_impressions': int(row.total_impressions),
+                'total_clicks': int(row.total_clicks),
+                'position_overlap': float(row.position_overlap),
+                'urls': urls
             })
         
-        return sorted(cannibalization_issues, key=lambda x: x['total_impressions'], reverse=True)[:10]
+        return cannibalization_issues
     
 
 
@@ -74,6 +74,22 @@ class KeywordClusterRequest(BaseModel):
     language_id: Optional[Language] = None      
 
 
+class BulkKeywordRequest(BaseModel):
+    keywords: List[str]
+    location_ids: Optional[List[Location]] = []
+    language_id: Optional[Language] = None
+    mode: str = "ideas"  # "ideas" (expand seeds) or "historical" (exact volumes for the list)
+    aggregate: str = "max"  # how duplicate ideas merge their volumes: "max" or "avg"
+
+    def validate(self):
+        if not self.keywords:
+            raise ValueError("'keywords' must contain at least one keyword")
+        if self.mode not in ("ideas", "historical"):
+            raise ValueError("'mode' must be 'ideas' or 'historical'")
+        if self.aggregate not in ("max", "avg"):
+            raise ValueError("'aggregate' must be 'max' or 'avg'")
+
+
 class SiteData(BaseModel):
     site_url: str
     search_type: str = "web"  # e.g., "web", "image", "video"
@@ -83,5 +99,17 @@ class SiteData(BaseModel):
     end_date: str       
 
 
+class DashboardRequest(SiteData):
+    branded_words: Optional[List[str]] = None  # if None all keywords are non-branded
+
+
+class CannibalizationRequest(SiteData):
+    top_n: int = 10  # number of cannibalized keywords to return
+
+
 class SEOFileNameUpdate(BaseModel):
-    file_name: str    
\ No newline at end of file
+    file_name: str
+
+
+class AssignKeywordRequest(BaseModel):
+    keywords: List[KeywordItem]
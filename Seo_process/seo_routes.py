@@ -1,12 +1,12 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Body
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Body, BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from auth.auth import get_db
-from auth.models import SEOCluster ,SEOCSV, SEOFile
+from auth.models import SEOCluster ,SEOCSV, SEOFile, ClusterModel
 import json
 import pandas as pd
 import io
-from .seo_models import KeywordRequest, SuggestionKeywordRequest, KeywordItem, UUIDRequest, PageUpdate, RemoveKeyword, KeywordClusterRequest, SEOFileNameUpdate
+from .seo_models import BulkKeywordRequest, KeywordRequest, SuggestionKeywordRequest, KeywordItem, UUIDRequest, PageUpdate, RemoveKeyword, KeywordClusterRequest, SEOFileNameUpdate, AssignKeywordRequest
 from utils import (  
     extract_keywords,
     filter_keywords_by_searches,
@@ -19,16 +19,27 @@ from utils import (
     check_api_limit,
     map_seo_pages_with_search_volume
 )
-from S3_bucket.utile import upload_seo_table
+from S3_bucket.utile import upload_seo_table, upload_cluster_model, load_cluster_model, put_cluster_model, delete_cluster_model
+from clustering_pipeline.incremental import assign_keywords_to_file
 from S3_bucket.delete_doc import seo_cluster_delete_document
 from google_ads.seo_planner import seo_keywords_main
+from google_ads.bulk_keywords import (
+    ADS_BULK_SYNC_MAX_SEEDS,
+    bulk_seeds,
+    bulk_call_count,
+    run_bulk_keywords,
+    create_bulk_job,
+    get_bulk_job,
+    run_bulk_job,
+    bulk_job_to_dict
+)
 from Seo_process.Agents.Keyword_agent import query_keyword_suggestion,query_keywords_description
 from Seo_process.Agents.clusterURL_keyword import seo_main
 from Seo_process.prompts.keywords_prompt import prompt_keyword,prompt_keyword_suggestion
 from S3_bucket.S3_upload import upload_title_url
 from S3_bucket.fetch_document import  fetch_seo_cluster_file
 from fastapi.responses import JSONResponse
-from utils import verify_jwt_token, check_api_limit
+from utils import verify_jwt_token, check_api_limit, charge_api_calls, refund_api_calls
 from sqlalchemy.orm.attributes import flag_modified
 from auth.auth import get_db
 import uuid
@@ -98,6 +109,62 @@ def seo_generate_keywords(request: KeywordRequest, user=Depends(check_api_limit(
         raise HTTPException(status_code=400, detail=str(e))
     
 
+@router.post("/seo_bulk_keywords")
+def seo_bulk_keywords(
+    request: BulkKeywordRequest,
+    background_tasks: BackgroundTasks,
+    user=Depends(check_api_limit("seo_keywords")),
+    db: Session = Depends(get_db)
+):
+    """
+    Keyword ideas or exact historical volumes for large seed lists (beyond
+    the 20-keyword limit of /seo_generate_keywords), fetched in chunks.
+    Costs one API call per ADS_BULK_SEEDS_PER_CALL seeds; lists above
+    ADS_BULK_SYNC_MAX_SEEDS run in the background and return a job to poll
+    at /seo_bulk_keywords/jobs/{job_id}.
+    """
+    try:
+        request.validate()
+        seeds = bulk_seeds(request.keywords)
+        location_ids = [loc.id for loc in request.location_ids or []] or [2826]
+        language_id = request.language_id.ID if request.language_id else 1000
+
+        calls = bulk_call_count(seeds)
+        # check_api_limit already charged the first call; all of them are
+        # refunded if the fetch fails
+        charge_api_calls(db, user, "seo_keywords", calls - 1)
+        charged = 0 if user.role == "admin" else calls
+
+        if len(seeds) > ADS_BULK_SYNC_MAX_SEEDS:
+            job = create_bulk_job(db, user.id, "seo", request.mode, len(seeds), calls_charged=charged)
+            background_tasks.add_task(
+                run_bulk_job, job.job_id, "seo", request.mode, seeds, location_ids, language_id, request.aggregate
+            )
+            return JSONResponse(status_code=202, content=bulk_job_to_dict(job))
+
+        try:
+            return run_bulk_keywords("seo", request.mode, seeds, location_ids, language_id, request.aggregate)
+        except Exception as e:
+            refund_api_calls(db, user.id, "seo_keywords", charged)
+            if isinstance(e, ValueError):
+                raise
+            print(f"❌ Error in seo_bulk_keywords: {str(e)}")
+            raise HTTPException(status_code=500, detail="Failed to fetch keyword data from Google Ads API.")
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/seo_bulk_keywords/jobs/{job_id}")
+def seo_bulk_keywords_job(job_id: str, id: str = Depends(verify_jwt_token), db: Session = Depends(get_db)):
+    """Status of a background bulk keyword job, with its rows once completed"""
+    user_id = int(id[1])
+    job = get_bulk_job(db, job_id, user_id, "seo")
+    if not job:
+        raise HTTPException(status_code=404, detail="Bulk keyword job not found")
+    return JSONResponse(status_code=200, content=bulk_job_to_dict(job))
+
+
 @router.post("/seo_keyword_suggestion")
 def seo_keyword_suggestion(request: SuggestionKeywordRequest):
     try:
@@ -151,7 +218,7 @@ async def seo_keyword_clustering(request: KeywordClusterRequest,
         print("Parsed DataFrame:", df1.head())
         data= df1.to_dict(orient="records")
         print("Parsed data:", data)
-        cluster_data, total_token  = await seo_main(df1.to_dict(orient="records")) 
+        cluster_data, total_token, fitted_model  = await seo_main(df1.to_dict(orient="records")) 
         print("Clustered data:", cluster_data) 
         # result = flatten_seo_data(cluster_data,df)
         result = map_seo_pages_with_search_volume(cluster_data, df)
@@ -170,6 +237,8 @@ async def seo_keyword_clustering(request: KeywordClusterRequest,
                 language_data = request.language_id.dict() if request.language_id else None
                 print(f"location:{location_data} and languge:{language_data}")
                 upload_seo_table(str(unique_id), user_id, filename, result, location_data, language_data)
+                if fitted_model:
+                    upload_cluster_model(str(unique_id), user_id, "seo", fitted_model)
                 
 
             seo_cluster_record = db.query(SEOCluster).filter(SEOCluster.user_id == user.id).first()
@@ -407,6 +476,7 @@ async def ppc_delete_document(request: UUIDRequest, id: str = Depends(verify_jwt
 
         if file_record:
             db.delete(file_record)
+            delete_cluster_model(db, uuid, user_id, "seo")
             db.commit()
 
         return JSONResponse(
@@ -482,6 +552,44 @@ async def seo_delete_page(seo_file_uuid: str, page_title_id: str, db: Session =
                 raise HTTPException(status_code=500, detail="Failed to save changes")
     raise HTTPException(status_code=404, detail="Page not found")
 
+@router.post("/seo-files/{seo_file_uuid}/keywords")
+async def seo_assign_keywords(seo_file_uuid: str, request: AssignKeywordRequest, db: Session = Depends(get_db), id: str = Depends(verify_jwt_token)):
+    """Add keywords to an existing SEO file by assigning them to the stored clusters"""
+    user_id = int(id[1])
+    seo_file = db.query(SEOFile).filter_by(user_id=user_id, uuid=seo_file_uuid).first()
+    if not seo_file:
+        raise HTTPException(status_code=404, detail="SEO file not found")
+    model_record = db.query(ClusterModel).filter_by(user_id=user_id, uuid=seo_file_uuid, file_type="seo").first()
+    if not model_record:
+        raise HTTPException(status_code=404, detail="No fitted cluster model for this file, please re-run clustering")
+
+    try:
+        model = load_cluster_model(model_record)
+        json_data, model, summary = await assign_keywords_to_file(
+            seo_file.json_data, model, [k.dict() for k in request.keywords]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Write the model first so the row never points at a model that was not saved
+    try:
+        put_cluster_model(seo_file_uuid, user_id, "seo", model)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save cluster model: {str(e)}")
+
+    seo_file.json_data = json_data
+    flag_modified(seo_file, "json_data")
+    model_record.n_samples = model.n_samples
+    model_record.baseline_distance = model.baseline_distance
+    model_record.upload_time = datetime.utcnow()
+    try:
+        db.commit()
+        db.refresh(seo_file)
+        return summary
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to save changes")
+
 # Edit a page by Page_title_id
 @router.patch("/seo-files/{seo_file_uuid}/pages/{page_title_id}")
 async def seo_edit_page(seo_file_uuid: str, page_title_id: str, page_update: PageUpdate, db: Session = Depends(get_db), id: str = Depends(verify_jwt_token)):
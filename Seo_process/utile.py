@@ -1,10 +1,17 @@
-from googleapiclient.discovery import build
 import os
-from googleapiclient.discovery import build
+import time
+import hashlib
+import threading
 from google.oauth2.credentials import Credentials
+from googleapiclient.errors import HttpError
+from google_clients import get_google_service
 import pandas as pd
 from fastapi import APIRouter, UploadFile, File, HTTPException
 import numpy as np
+from Seo_process.gsc_ingest import rows_to_frame
+from Seo_process.gsc_warehouse import get_warehouse
+from Seo_process.gsc_rollup import DailyRollup, classify_rank_groups
+from Seo_process.gsc_fetcher import ShardedSearchConsoleFetcher
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
@@ -13,6 +20,13 @@ GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 
 
 
+# How long a successful sites().get access check is trusted before the
+# warehouse serves cached days to the same credentials again
+GSC_ACCESS_CHECK_TTL = int(os.environ.get("GSC_ACCESS_CHECK_TTL", 300))
+_verified_access = {}
+_verified_access_lock = threading.Lock()
+
+
 class SearchConsoleService:
     """Service class for Google Search Console operations"""
     
@@ -23,80 +37,134 @@ class SearchConsoleService:
         self.client_secret = client_secret
         self.service = None
     
+    def _build_service(self):
+        creds = Credentials(
+            token=self.access_token,
+            refresh_token=self.refresh_token,
+            token_uri="https://oauth2.googleapis.com/token",
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            scopes=["https://www.googleapis.com/auth/webmasters.readonly"]
+        )
+        return get_google_service('webmasters', 'v3', creds)
+
     def connect(self):
         """Establish connection to Google Search Console API"""
         try:
-            creds = Credentials(
-                token=self.access_token,
-                refresh_token=self.refresh_token,
-                token_uri="https://oauth2.googleapis.com/token",
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-                scopes=["https://www.googleapis.com/auth/webmasters.readonly"]
-            )
-            self.service = build('webmasters', 'v3', credentials=creds)
+            self.service = self._build_service()
             return self.service
         except Exception as e:
             raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
-    
-    def get_site_data(self, site_url: str, device: str, country: str, search_type: str, 
-                      start_date: str, end_date: str) -> list:
-        """Fetch site data from Google Search Console"""
-        if not self.service:
-            self.connect()
-        
-        # Build payload
+
+    def _credential_fingerprint(self) -> str:
+        token = self.refresh_token or self.access_token or ""
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def verify_site_access(self, site_url: str):
+        """
+        Make sure these credentials can read site_url before anything is
+        served from the shared warehouse, which is keyed by property only.
+        Raises 403 otherwise; successful checks are cached for
+        GSC_ACCESS_CHECK_TTL seconds.
+        """
+        key = (self._credential_fingerprint(), str(site_url).strip().lower())
+        with _verified_access_lock:
+            verified_at = _verified_access.get(key)
+        if verified_at is not None and time.monotonic() - verified_at < GSC_ACCESS_CHECK_TTL:
+            return
+
+        try:
+            service = self._build_service()
+            site = service.sites().get(siteUrl=site_url).execute()
+        except HttpError as e:
+            if e.resp.status in (403, 404):
+                raise HTTPException(status_code=403, detail=f"No Search Console access to {site_url}")
+            raise HTTPException(status_code=502, detail=f"Search Console access check failed: {str(e)}")
+        if site.get("permissionLevel") == "siteUnverifiedUser":
+            raise HTTPException(status_code=403, detail=f"No Search Console access to {site_url}")
+
+        with _verified_access_lock:
+            _verified_access[key] = time.monotonic()
+
+    def _fetcher(self) -> ShardedSearchConsoleFetcher:
+        # googleapiclient clients are not thread-safe, so each worker builds its own
+        return ShardedSearchConsoleFetcher(self._build_service)
+
+    @staticmethod
+    def _build_payload(device: str, country: str, search_type: str) -> dict:
         payload = {
-            'startDate': start_date,
-            'endDate': end_date,
             'dimensions': ['query', 'page', 'country', 'date', 'device'],  # Fixed capitalization
             'type': search_type,
             'dimensionFilterGroups': [{
-                'filters': [{
-                    "dimension": "country",
-                    'expression': country
-                }]
+                'filters': []
             }],
             'rowLimit': 25000
         }
 
+        if country:
+            payload['dimensionFilterGroups'][0]['filters'].append({
+                'dimension': 'country',
+                'expression': country
+            })
+
         # Add device filter if not "all" - when "all", we want data from all devices
-        if device.lower() != "all":
+        if device and device.lower() != "all":
             payload['dimensionFilterGroups'][0]['filters'].append({
                 'dimension': 'device',
                 'expression': device
             })
-        
-        try:
-            all_rows = []
-            start_row = 0
-            
-            while True:
-                # Add pagination
-                current_payload = payload.copy()
-                current_payload['startRow'] = start_row
-                
-                response = self.service.searchanalytics().query(
-                    siteUrl=site_url, 
-                    body=current_payload
-                ).execute()
-                
-                rows = response.get('rows', [])
-                if not rows:
-                    break
-                
-                all_rows.extend(rows)
-                
-                # Check if we got fewer rows than requested (end of data)
-                if len(rows) < 25000:
-                    break
-                
-                start_row += len(rows)
-            
-            return all_rows
-            
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error fetching site data: {str(e)}")
+        return payload
+    
+    def get_site_data(self, site_url: str, device: str, country: str, search_type: str, 
+                      start_date: str, end_date: str) -> list:
+        """Fetch site data from Google Search Console, one concurrent shard per day"""
+        payload = self._build_payload(device, country, search_type)
+        return self._fetcher().fetch_rows(site_url, payload, start_date, end_date)
+
+    def get_site_data_frame(self, site_url: str, device: str, country: str, search_type: str,
+                            start_date: str, end_date: str, parse_dates: bool = True) -> pd.DataFrame:
+        """Like get_site_data, but each shard goes straight into a typed DataFrame"""
+        payload = self._build_payload(device, country, search_type)
+        return self._fetcher().fetch_frame(site_url, payload, start_date, end_date, parse_dates=parse_dates)
+
+    def get_site_frame(self, site_url: str, device: str, country: str, search_type: str,
+                       start_date: str, end_date: str, parse_dates: bool = True) -> pd.DataFrame:
+        """Site data as a typed DataFrame, served from the local warehouse where possible"""
+        return get_warehouse().load(
+            site_url=site_url,
+            search_type=search_type,
+            country=country,
+            device=device,
+            start_date=start_date,
+            end_date=end_date,
+            fetch_rows=lambda range_start, range_end: self.get_site_data_frame(
+                site_url, device, country, search_type, range_start, range_end, parse_dates=False
+            ),
+            authorize=lambda: self.verify_site_access(site_url),
+            parse_dates=parse_dates
+        )
+
+    def get_site_rollup(self, site_url: str, device: str, country: str, search_type: str,
+                        start_date: str, end_date: str, columns: list = None,
+                        with_detail: bool = True) -> DailyRollup:
+        """
+        Daily rollup cube and distinct query/page keys for the range, plus
+        the raw rows (limited to columns) as detail unless with_detail=False
+        """
+        return get_warehouse().load_rollup(
+            site_url=site_url,
+            search_type=search_type,
+            country=country,
+            device=device,
+            start_date=start_date,
+            end_date=end_date,
+            fetch_rows=lambda range_start, range_end: self.get_site_data_frame(
+                site_url, device, country, search_type, range_start, range_end, parse_dates=False
+            ),
+            authorize=lambda: self.verify_site_access(site_url),
+            columns=columns,
+            with_detail=with_detail
+        )
 
 class DataProcessor:
     """Class for processing Search Console data"""
@@ -107,23 +175,7 @@ class DataProcessor:
         if not data:
             return pd.DataFrame()
         
-        df = pd.DataFrame(data)
-        
-        # Extract keys into separate columns
-        keys_df = pd.DataFrame(
-            df['keys'].tolist(),
-            columns=['query', 'page', 'country', 'date', 'device']  # Fixed capitalization
-        )
-        
-        # Combine with metrics
-        df = pd.concat([keys_df, df.drop(columns=['keys'])], axis=1)
-        
-        # Convert data types
-        df['date'] = pd.to_datetime(df['date'])  # Fixed column name
-        numeric_columns = ['clicks', 'impressions', 'ctr', 'position']
-        df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
-        
-        return df
+        return rows_to_frame(data, dimensions=['query', 'page', 'country', 'date', 'device'])
     
     @staticmethod
     def summarize_metrics(df: pd.DataFrame) -> dict:
@@ -228,43 +280,66 @@ class DataProcessor:
         return result
     
     @staticmethod
-    def create_comparison_matrix(df: pd.DataFrame) -> dict:
+    def as_rollup(data) -> DailyRollup:
+        """Accept either raw rows (DataFrame) or an already built DailyRollup"""
+        return data if isinstance(data, DailyRollup) else DailyRollup.from_frame(data)
+
+    @staticmethod
+    def summarize_rollup(rollup: DailyRollup) -> dict:
+        """summarize_metrics answered from a rollup cube"""
+        if rollup.empty:
+            return DataProcessor.summarize_metrics(pd.DataFrame())
+
+        totals = rollup.totals()
+        ctr = (totals['clicks'] / totals['impressions']) * 100 if totals['impressions'] > 0 else 0
+
+        return {
+            'Clicks': totals['clicks'],
+            'Impressions': totals['impressions'],
+            'CTR': round(float(ctr), 2),
+            'AvgPosition': round(totals['position'], 2),
+            'Ranking_Keywords': rollup.distinct('query'),
+            'Ranking_URLs': rollup.distinct('page')
+        }
+
+    @staticmethod
+    def create_comparison_matrix(data) -> dict:
         """Create comparison matrix by splitting data into two periods"""
-        if df.empty:
+        rollup = DataProcessor.as_rollup(data)
+        if rollup.empty:
             return {}
         
-        df = df.sort_values('date')  # Fixed column name
-        start_date = df['date'].min()
-        end_date = df['date'].max()
+        start_date = rollup.cube['date'].min()
+        end_date = rollup.cube['date'].max()
         
         # Calculate midpoint
         mid_date = start_date + (end_date - start_date) / 2
         mid_date = pd.to_datetime(mid_date).floor('D')
         
         # Split into two halves
-        previous_df = df[(df['date'] >= start_date) & (df['date'] < mid_date)]
-        current_df = df[(df['date'] >= mid_date) & (df['date'] <= end_date)]
+        previous = rollup.window(start_date, mid_date, end_inclusive=False)
+        current = rollup.window(mid_date, end_date)
         
-        current_metrics = DataProcessor.summarize_metrics(current_df)
-        previous_metrics = DataProcessor.summarize_metrics(previous_df)
+        current_metrics = DataProcessor.summarize_rollup(current)
+        previous_metrics = DataProcessor.summarize_rollup(previous)
         
         return DataProcessor.compare_metrics(current_metrics, previous_metrics)
     
     @staticmethod
-    def create_device_performance_comparison(df: pd.DataFrame, original_start_date: str, original_end_date: str) -> dict:
+    def create_device_performance_comparison(data, original_start_date: str, original_end_date: str) -> dict:
         """Create device-based performance comparison between current and previous periods"""
-        if df.empty:
+        rollup = DataProcessor.as_rollup(data)
+        if rollup.empty:
             return {}
         
-        df = df.sort_values('date')
-        
         # Parse original date range
         original_start = pd.to_datetime(original_start_date)
         original_end = pd.to_datetime(original_end_date)
         
         # Split data into current (original range) and previous periods
-        current_period = df[(df['date'] >= original_start) & (df['date'] <= original_end)]
-        previous_period = df[df['date'] < original_start]
+        current_period = rollup.window(original_start, original_end)
+        previous_period = rollup.window(end=original_start, end_inclusive=False)
+        previous_first_day = previous_period.cube['date'].min() if not previous_period.empty else None
         
         device_comparison = {}
         device_summary = {
@@ -275,7 +350,7 @@ class DataProcessor:
         }
         
         # Get all unique devices
-        all_devices = df['device'].unique()
+        all_devices = rollup.devices()
         device_summary['total_devices'] = len(all_devices)
         
         best_clicks = 0
@@ -283,12 +358,12 @@ class DataProcessor:
         
         for device in all_devices:
             # Filter data for current device
-            current_device_data = current_period[current_period['device'] == device]
-            previous_device_data = previous_period[previous_period['device'] == device]
+            current_device_data = current_period.for_device(device)
+            previous_device_data = previous_period.for_device(device)
             
             # Calculate metrics for each period
-            current_metrics = DataProcessor.summarize_metrics(current_device_data)
-            previous_metrics = DataProcessor.summarize_metrics(previous_device_data)
+            current_metrics = DataProcessor.summarize_rollup(current_device_data)
+            previous_metrics = DataProcessor.summarize_rollup(previous_device_data)
             
             # Compare metrics
             device_comparison[device] = DataProcessor.compare_metrics(current_metrics, previous_metrics)
@@ -306,17 +381,18 @@ class DataProcessor:
                     device_summary['highest_growth_device'] = device
             
             # Add additional device-specific stats
+            previous_rows = previous_device_data.row_count
             device_comparison[device]['current_period_stats'] = {
-                'total_queries': len(current_device_data),
-                'unique_pages': current_device_data['page'].nunique() if not current_device_data.empty else 0,
+                'total_queries': current_device_data.row_count,
+                'unique_pages': current_device_data.distinct('page'),
                 'date_range': f"{original_start_date} to {original_end_date}",
                 'avg_daily_clicks': round(current_metrics['Clicks'] / max(1, (original_end - original_start).days), 2)
             }
             device_comparison[device]['previous_period_stats'] = {
-                'total_queries': len(previous_device_data),
-                'unique_pages': previous_device_data['page'].nunique() if not previous_device_data.empty else 0,
-                'date_range': f"{previous_period['date'].min().strftime('%Y-%m-%d') if not previous_period.empty else 'N/A'} to {(original_start - pd.Timedelta(days=1)).strftime('%Y-%m-%d')}",
-                'avg_daily_clicks': round(previous_metrics['Clicks'] / max(1, len(previous_device_data) // 30 if len(previous_device_data) > 0 else 1), 2)
+                'total_queries': previous_rows,
+                'unique_pages': previous_device_data.distinct('page'),
+                'date_range': f"{previous_first_day.strftime('%Y-%m-%d') if previous_first_day is not None else 'N/A'} to {(original_start - pd.Timedelta(days=1)).strftime('%Y-%m-%d')}",
+                'avg_daily_clicks': round(previous_metrics['Clicks'] / max(1, previous_rows // 30 if previous_rows > 0 else 1), 2)
             }
             
             # Add performance overview for this device
@@ -333,28 +409,28 @@ class DataProcessor:
         }
     
     @staticmethod
-    def create_device_distribution_data(df: pd.DataFrame, original_start_date: str, original_end_date: str) -> dict:
+    def create_device_distribution_data(data, original_start_date: str, original_end_date: str) -> dict:
         """Create device distribution data for pie chart visualization"""
-        if df.empty:
+        rollup = DataProcessor.as_rollup(data)
+        if rollup.empty:
             return {}
         
         # Filter to current period only
-        original_start = pd.to_datetime(original_start_date)
-        original_end = pd.to_datetime(original_end_date)
-        current_period = df[(df['date'] >= original_start) & (df['date'] <= original_end)]
+        current_period = rollup.window(original_start_date, original_end_date)
         
         if current_period.empty:
             return {}
         
-        # Group by device and sum clicks
-        device_clicks = current_period.groupby('device')['clicks'].sum().sort_values(ascending=False)
-        total_clicks = device_clicks.sum()
+        # Per-device sums and means, largest click share first
+        devices = current_period.by_device().sort_values('clicks', ascending=False)
+        total_clicks = devices['clicks'].sum()
         
         # Create pie chart data
         pie_data = []
         device_stats = []
         
-        for device, clicks in device_clicks.items():
+        for device, stats in devices.iterrows():
+            clicks = stats['clicks']
             percentage = (clicks / total_clicks * 100) if total_clicks > 0 else 0
             
             pie_data.append({
@@ -363,14 +439,12 @@ class DataProcessor:
                 'percentage': round(percentage, 1)
             })
             
-            # Get additional stats for this device
-            device_data = current_period[current_period['device'] == device]
             device_stats.append({
                 'device': device,
                 'clicks': int(clicks),
-                'impressions': int(device_data['impressions'].sum()),
-                'ctr': round(device_data['ctr'].mean(), 2),
-                'avg_position': round(device_data['position'].mean(), 2),
+                'impressions': int(stats['impressions']),
+                'ctr': round(stats['ctr'], 2),
+                'avg_position': round(stats['position'], 2),
                 'percentage': round(percentage, 1)
             })
         
@@ -380,6 +454,11 @@ class DataProcessor:
             'total_clicks': int(total_clicks)
         }
     
+    @staticmethod
+    def classify_ranks(positions) -> pd.Categorical:
+        """Vectorized classify_rank over a whole position column"""
+        return classify_rank_groups(positions)
+
     @staticmethod
     def classify_rank(position: float) -> str:
         """Classify position into rank groups"""
@@ -391,20 +470,14 @@ class DataProcessor:
             return 'Top 20+'
     
     @staticmethod
-    def prepare_line_plot_data(df: pd.DataFrame) -> tuple:
+    def prepare_line_plot_data(data) -> tuple:
         """Prepare data for line plot visualization"""
-        if df.empty:
+        rollup = DataProcessor.as_rollup(data)
+        if rollup.empty:
             return pd.DataFrame(), pd.DataFrame()
         
-        df['date'] = pd.to_datetime(df['date'])  # Fixed column name
-        
-        # Group by date and aggregate metrics
-        daily = df.groupby('date').agg({
-            'clicks': 'sum',
-            'impressions': 'sum',
-            'ctr': 'mean',
-            'position': 'mean'
-        }).asfreq('D', fill_value=0)
+        # Daily sums and means straight from the cube
+        daily = rollup.daily()[['clicks', 'impressions', 'ctr', 'position']].asfreq('D', fill_value=0)
         
         # Split into two periods
         half_days = len(daily) // 2
@@ -426,4 +499,66 @@ def convert_numpy_types(data):
     elif isinstance(data, np.ndarray):
         return data.tolist()
     else:
-        return data
\ No newline at end of file
+        return data
+
+
+def build_search_console_overview(data, start_date: str, end_date: str, fetched_start_date: str) -> dict:
+    """
+    Card matrix, device split, line plots and rank distribution for the
+    /search_console/ dashboard.
+
+    data is either the structured frame or a DailyRollup (see
+    SearchConsoleService.get_site_rollup); every chart is answered from the
+    rollup cube, the raw rows are only read for distinct query/page counts.
+    """
+    rollup = DataProcessor.as_rollup(data)
+    print(f"Processed {rollup.row_count} records")
+
+    # Generate comparison matrix
+    card_matrix = DataProcessor.create_comparison_matrix(rollup)
+    card_matrix = convert_numpy_types(card_matrix)
+
+    # Generate device performance comparison
+    device_performance = DataProcessor.create_device_performance_comparison(
+        rollup, start_date, end_date
+    )
+    device_performance = convert_numpy_types(device_performance)
+
+    # Generate device distribution data
+    device_distribution = DataProcessor.create_device_distribution_data(
+        rollup, start_date, end_date
+    )
+    device_distribution = convert_numpy_types(device_distribution)
+
+    # Prepare line plot data
+    line_plot1, line_plot2 = DataProcessor.prepare_line_plot_data(rollup)
+
+    # Calculate keyword ranking distribution
+    rank_counts = rollup.rank_counts()
+
+    period1_with_index = line_plot1.reset_index().reset_index().rename(columns={'index': 'row_number'})
+    period1_data = period1_with_index.to_dict('records')
+
+    period2_with_index = line_plot2.reset_index().reset_index().rename(columns={'index': 'row_number'})
+    period2_data = period2_with_index.to_dict('records')
+    # Prepare response
+    response_data = {
+        "card_matrix": card_matrix,
+        "device_performance": device_performance,
+        "device_distribution": device_distribution,
+        "line_plot_data": {
+            "period1": period1_data,
+            "period2": period2_data
+        },
+        "keywords_ranking": rank_counts.reset_index().to_dict('records'),
+        "summary": {
+            "total_records": rollup.row_count,
+            "date_range": f"{fetched_start_date} to {end_date}",
+            "current_period": f"{start_date} to {end_date}",
+            "unique_queries": rollup.distinct('query'),
+            "unique_pages": rollup.distinct('page'),
+            "devices_analyzed": len(rollup.devices())
+        }
+    }
+
+    return response_data
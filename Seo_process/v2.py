@@ -1,15 +1,16 @@
 from oauth2client.client import OAuth2WebServerFlow
-from googleapiclient.discovery import build
 import httplib2
 import os
+import asyncio
 import pandas as pd
-from Seo_process.seo_models import SiteData
+from Seo_process.seo_models import SiteData, DashboardRequest, CannibalizationRequest
+from Seo_process.dashboard_engine import SearchConsoleDashboard
 from datetime import datetime, timedelta
 import numpy as np
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Body
 from auth.models import Integration
-from Seo_process.utile import SearchConsoleService, DataProcessor
-from Seo_process.ranking_keyword import RankingKeywordsAnalyzer, SEOMetricsCalculator
+from Seo_process.utile import SearchConsoleService, DataProcessor, build_search_console_overview
+from Seo_process.ranking_keyword import RankingKeywordsAnalyzer, SEOMetricsCalculator, ranking_analyzer
 router = APIRouter()
 from sqlalchemy.orm import Session
 from auth.auth import get_db
@@ -21,13 +22,13 @@ from Seo_process.branded_keywords_analysis import (
     BATCH_SIZE, DailyMetrics, KeywordCTREntry, KeywordClicksEntry,
     KeywordImpressionsEntry, KeywordLists, KeywordMetrics, KeywordPositionEntry,
     SearchConsoleRequest, SearchConsoleResponse, fetch_all_data_paginated,
-    format_fluctuation, get_previous_period_dates, process_search_console_data,
+    format_fluctuation, get_previous_period_dates, prepare_branded_frame, build_branded_analysis,
     safe_divide, safe_percentage, DiffMetrics
 )
 import requests
 from google.auth.exceptions import RefreshError
-from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
+from google_clients import get_google_service
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
@@ -59,7 +60,7 @@ def connect_search_console(access_token, refresh_token, client_id, client_secret
         client_secret=client_secret,
         scopes=["https://www.googleapis.com/auth/webmasters.readonly"]
     )
-    service = build('webmasters', 'v3', credentials=creds)
+    service = get_google_service('webmasters', 'v3', creds)
     return service
 
 
@@ -158,83 +159,23 @@ async def get_search_console_data(
             client_id=GOOGLE_CLIENT_ID,
             client_secret=GOOGLE_CLIENT_SECRET
         )
-        # Fetch data
-        raw_data = search_console.get_site_data(
+        # Fetch data (only days missing from the local warehouse hit the API);
+        # stored days come back as precomputed rollups and distinct keys, no raw rows
+        rollup = await asyncio.to_thread(
+            search_console.get_site_rollup,
             site_url=data.site_url,
             device=data.device_type,
             country=data.country,
             search_type=data.search_type,
             start_date=new_start_date,
-            end_date=data.end_date
+            end_date=data.end_date,
+            with_detail=False
         )
         
-        if not raw_data:
+        if rollup.empty:
             raise HTTPException(status_code=404, detail="No data found for the specified site")
         
-        # Process data
-        df = DataProcessor.structure_dataframe(raw_data)
-        
-        if df.empty:
-            raise HTTPException(status_code=404, detail="No data available after processing")
-        
-        print(f"Processed {len(df)} records")
-        
-        # Generate comparison matrix
-        card_matrix = DataProcessor.create_comparison_matrix(df)
-        card_matrix = convert_numpy_types(card_matrix)
-        
-        # Generate device performance comparison
-        device_performance = DataProcessor.create_device_performance_comparison(
-            df, data.start_date, data.end_date
-        )
-        device_performance = convert_numpy_types(device_performance)
-        
-        # Generate device distribution data
-        device_distribution = DataProcessor.create_device_distribution_data(
-            df, data.start_date, data.end_date
-        )
-        device_distribution = convert_numpy_types(device_distribution)
-        
-        # Prepare line plot data
-        line_plot1, line_plot2 = DataProcessor.prepare_line_plot_data(df)
-        
-        # Calculate keyword ranking distribution
-        df['rank_group'] = df['position'].apply(DataProcessor.classify_rank)
-        rank_counts = df.groupby(['date', 'rank_group']).size().unstack(fill_value=0).sort_index()
-        
-        # Ensure all rank groups are present
-        for col in ['Top 3', 'Top 10', 'Top 20+']:
-            if col not in rank_counts.columns:
-                rank_counts[col] = 0
-        
-        rank_counts = rank_counts[['Top 3', 'Top 10', 'Top 20+']]
-
-        period1_with_index = line_plot1.reset_index().reset_index().rename(columns={'index': 'row_number'})
-        period1_data = period1_with_index.to_dict('records')
-        
-        period2_with_index = line_plot2.reset_index().reset_index().rename(columns={'index': 'row_number'})
-        period2_data = period2_with_index.to_dict('records')
-        # Prepare response
-        response_data = {
-            "card_matrix": card_matrix,
-            "device_performance": device_performance,
-            "device_distribution": device_distribution,
-            "line_plot_data": {
-                "period1": period1_data,
-                "period2": period2_data
-            },
-            "keywords_ranking": rank_counts.reset_index().to_dict('records'),
-            "summary": {
-                "total_records": len(df),
-                "date_range": f"{new_start_date} to {data.end_date}",
-                "current_period": f"{data.start_date} to {data.end_date}",
-                "unique_queries": df['query'].nunique() if 'query' in df.columns else 0,
-                "unique_pages": df['page'].nunique() if 'page' in df.columns else 0,
-                "devices_analyzed": df['device'].nunique() if 'device' in df.columns else 0
-            }
-        }
-        
-        return response_data
+        return build_search_console_overview(rollup, data.start_date, data.end_date, new_start_date)
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
@@ -264,8 +205,6 @@ async def get_ranking_keywords_analysis(data: SiteData,
         ).first()
         if not user_auth:
             raise HTTPException(status_code=404, detail="Google Search Console account not linked")
-        # Initialize the analyzer
-        analyzer = RankingKeywordsAnalyzer()
 
         search_console = SearchConsoleService(
             access_token=user_auth.access_token,
@@ -274,15 +213,16 @@ async def get_ranking_keywords_analysis(data: SiteData,
             client_secret=GOOGLE_CLIENT_SECRET
         )
         
-        # Perform complete analysis
-        result = analyzer.analyze_keywords(
+        # Perform complete analysis off the event loop
+        result = await asyncio.to_thread(
+            ranking_analyzer.analyze_keywords,
             site_url=data.site_url,
             device_type=data.device_type,
             country=data.country,
             search_type=data.search_type,
             start_date=data.start_date,
             end_date=data.end_date,
-            get_site_data_func=search_console.get_site_data
+            get_site_data_func=search_console.get_site_frame
         )
         
         # Optional: Add additional SEO metrics
@@ -304,6 +244,58 @@ async def get_ranking_keywords_analysis(data: SiteData,
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+@router.post("/ranking_keywords/cannibalization")
+async def get_keyword_cannibalization(data: CannibalizationRequest,
+    user_id: str = Depends(verify_jwt_token),
+    db: Session = Depends(get_db)):
+    """
+    Keywords for which several URLs of the site compete, over start_date..end_date.
+
+    Returns the top_n keywords by impressions with their competing URLs ranked
+    by click share, plus a position-overlap score per keyword.
+    """
+    try:
+        user_id = user_id[1]
+        if data.top_n < 1:
+            raise HTTPException(status_code=400, detail="top_n must be at least 1")
+
+        user_auth = db.query(Integration).filter(
+            Integration.user_id == user_id,
+            Integration.provider == "GOOGLE_SEARCH_CONSOLE"
+        ).first()
+        if not user_auth:
+            raise HTTPException(status_code=404, detail="Google Search Console account not linked")
+
+        search_console = SearchConsoleService(
+            access_token=user_auth.access_token,
+            refresh_token=user_auth.refresh_token,
+            client_id=GOOGLE_CLIENT_ID,
+            client_secret=GOOGLE_CLIENT_SECRET
+        )
+
+        df = await asyncio.to_thread(
+            search_console.get_site_frame,
+            site_url=data.site_url,
+            device=data.device_type or "all",
+            country=data.country,
+            search_type=data.search_type,
+            start_date=data.start_date,
+            end_date=data.end_date
+        )
+
+        issues = await asyncio.to_thread(SEOMetricsCalculator.detect_keyword_cannibalization, df, data.top_n)
+        return {
+            "cannibalization_issues": issues,
+            "date_range": {"start_date": data.start_date, "end_date": data.end_date}
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in cannibalization analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+
 @router.post("/branded_word_analysis", response_model=SearchConsoleResponse)
 async def get_search_console_metrics(
     request: SearchConsoleRequest,
@@ -378,8 +370,7 @@ async def get_search_console_metrics(
             end_date = datetime.now().strftime("%Y-%m-%d")
             start_date = (datetime.now() - timedelta(days=29)).strftime("%Y-%m-%d")
 
-        # Connect to Search Console API
-        service = connect_search_console(
+        search_console = SearchConsoleService(
             access_token=user_auth.access_token,
             refresh_token=user_auth.refresh_token,
             client_id=GOOGLE_CLIENT_ID,
@@ -389,426 +380,100 @@ async def get_search_console_metrics(
         # Calculate previous period for comparison
         prev_start_date, prev_end_date = get_previous_period_dates(start_date, end_date)
 
-        # Prepare API payload
-        payload_base = {
-            'dimensions': ['query', 'country', 'device', 'date', 'page'],
-            'type': request.search_type,
-            'rowLimit': BATCH_SIZE
-        }
-
-        filters = []
-        if request.device_type:
-            filters.append({
-                'dimension': 'device',
-                'expression': request.device_type.upper()
-            })
-
-        if request.country:
-            filters.append({
-                'dimension': 'country',
-                'expression': request.country.upper()
-            })
-
-        if filters:
-            payload_base['dimensionFilterGroups'] = [{'filters': filters}]
-
         # Fetch and process data
         print(f"\nAPI Call Details:")
         print(f"Fetching data for {request.search_type} search type, {request.device_type} device, {request.country} country")
         print(f"Fetching data for site: {request.site_url}")
         print(f"Fetching data from {prev_start_date} to {end_date}")
 
-        all_rows = fetch_all_data_paginated(service, str(request.site_url), payload_base, prev_start_date, end_date)
-        df_all =process_search_console_data(all_rows, request.branded_words)
-
-        # Split data into current and previous periods
-        df_current = df_all[(df_all['date'] >= start_date) & (df_all['date'] <= end_date)]
-        df_prev = df_all[(df_all['date'] >= prev_start_date) & (df_all['date'] <= prev_end_date)]
-
-        print(f"\nData Split Details:")
-        print(f"Total rows fetched: {len(df_all)}")
-        print(f"Current period rows: {len(df_current)}")
-        print(f"Previous period rows: {len(df_prev)}")
-
-        # Categorize data into branded and non-branded
-        branded_current = df_current[df_current['brand_category'] == 'Branded']
-        non_branded_current = df_current[df_current['brand_category'] == 'Non-Branded']
-        branded_prev = df_prev[df_prev['brand_category'] == 'Branded']
-        non_branded_prev = df_prev[df_prev['brand_category'] == 'Non-Branded']
-
-        # Calculate total metrics
-        total_clicks = df_current['clicks'].sum()
-        total_impressions = df_current['impressions'].sum()
-
-        # Calculate pie chart data for clicks
-        total_branded_clicks = int(branded_current['clicks'].sum())
-        total_generic_clicks = int(non_branded_current['clicks'].sum())
-        total_clicks = total_branded_clicks + total_generic_clicks
-
-        # Calculate pie chart data for impressions
-        total_branded_impressions = int(branded_current['impressions'].sum())
-        total_generic_impressions = int(non_branded_current['impressions'].sum())
-        total_impressions = total_branded_impressions + total_generic_impressions
-
-        # Calculate CTR values for pie chart and diff calculations - MOVED HERE
-        branded_curr_ctr_for_diff = safe_divide(branded_current['clicks'].sum(), branded_current['impressions'].sum()) * 100
-        branded_prev_ctr_for_diff = safe_divide(branded_prev['clicks'].sum(), branded_prev['impressions'].sum()) * 100 if not branded_prev.empty else 0
-        generic_curr_ctr_for_diff = safe_divide(non_branded_current['clicks'].sum(), non_branded_current['impressions'].sum()) * 100
-        generic_prev_ctr_for_diff = safe_divide(non_branded_prev['clicks'].sum(), non_branded_prev['impressions'].sum()) * 100 if not non_branded_prev.empty else 0
-
-        # Calculate pie chart data for CTR
-        branded_curr_ctr = branded_curr_ctr_for_diff
-        generic_curr_ctr = generic_curr_ctr_for_diff
-        total_curr_ctr = safe_divide(total_clicks, total_impressions) * 100
-
-        # Calculate Position values for pie chart and diff calculations - MOVED HERE
-        branded_curr_pos_for_diff = branded_current['position'].mean() if len(branded_current) > 0 else 0
-        branded_prev_pos_for_diff = branded_prev['position'].mean() if len(branded_prev) > 0 else 0
-        generic_curr_pos_for_diff = non_branded_current['position'].mean() if len(non_branded_current) > 0 else 0
-        generic_prev_pos_for_diff = non_branded_prev['position'].mean() if len(non_branded_prev) > 0 else 0
-
-        if pd.isna(branded_curr_pos_for_diff): branded_curr_pos_for_diff = 0
-        if pd.isna(branded_prev_pos_for_diff): branded_prev_pos_for_diff = 0
-        if pd.isna(generic_curr_pos_for_diff): generic_curr_pos_for_diff = 0
-        if pd.isna(generic_prev_pos_for_diff): generic_prev_pos_for_diff = 0
-
-        # Calculate pie chart data for Position (Average)
-        branded_curr_pos = branded_curr_pos_for_diff
-        generic_curr_pos = generic_curr_pos_for_diff
-        total_curr_pos = df_current['position'].mean() if len(df_current) > 0 else 0
-
-        if pd.isna(total_curr_pos): total_curr_pos = 0
-
-        # Combine all pie chart data into a single structure
-        pie_chart_data = {
-            "clicks": {
-                "branded_value": total_branded_clicks,
-                "branded_percentage": round((total_branded_clicks / total_clicks) * 100, 1) if total_clicks > 0 else 0,
-                "generic_value": total_generic_clicks,
-                "generic_percentage": round((total_generic_clicks / total_clicks) * 100, 1) if total_clicks > 0 else 0,
-                "total": total_clicks,
-                "branded_pct_diff": safe_percentage(branded_current['clicks'].sum(), branded_prev['clicks'].sum()),
-                "generic_pct_diff": safe_percentage(non_branded_current['clicks'].sum(), non_branded_prev['clicks'].sum())
-            },
-            "impressions": {
-                "branded_value": total_branded_impressions,
-                "branded_percentage": round((total_branded_impressions / total_impressions) * 100, 1) if total_impressions > 0 else 0,
-                "generic_value": total_generic_impressions,
-                "generic_percentage": round((total_generic_impressions / total_impressions) * 100, 1) if total_impressions > 0 else 0,
-                "total": total_impressions,
-                "branded_pct_diff": safe_percentage(branded_current['impressions'].sum(), branded_prev['impressions'].sum()),
-                "generic_pct_diff": safe_percentage(non_branded_current['impressions'].sum(), non_branded_prev['impressions'].sum())
-            },
-            "ctr": {
-                "branded_value": round(branded_curr_ctr, 2),
-                "branded_percentage": round((branded_curr_ctr / total_curr_ctr) * 100, 1) if total_curr_ctr > 0 else 0,
-                "generic_value": round(generic_curr_ctr, 2),
-                "generic_percentage": round((generic_curr_ctr / total_curr_ctr) * 100, 1) if total_curr_ctr > 0 else 0,
-                "total": round(total_curr_ctr, 2),
-                "branded_pct_diff": branded_curr_ctr_for_diff - branded_prev_ctr_for_diff, 
-                "generic_pct_diff": generic_curr_ctr_for_diff - generic_prev_ctr_for_diff
-            },
-            "position": {
-                "branded_value": round(float(branded_curr_pos), 2),
-                "branded_percentage": round((branded_curr_pos / total_curr_pos) * 100, 1) if total_curr_pos > 0 else 0,
-                "generic_value": round(float(generic_curr_pos), 2),
-                "generic_percentage": round((generic_curr_pos / total_curr_pos) * 100, 1) if total_curr_pos > 0 else 0,
-                "total": round(float(total_curr_pos), 2),
-                "branded_pct_diff": round(float(branded_curr_pos_for_diff - branded_prev_pos_for_diff), 2),
-                "generic_pct_diff": round(float(generic_curr_pos_for_diff - generic_prev_pos_for_diff), 2)
-            }
-        }
+        site_frame = await asyncio.to_thread(
+            search_console.get_site_frame,
+            site_url=str(request.site_url),
+            device=request.device_type or "all",
+            country=request.country,
+            search_type=request.search_type,
+            start_date=prev_start_date,
+            end_date=end_date,
+            parse_dates=False
+        )
+        df_all = prepare_branded_frame(site_frame, request.branded_words)
 
-        # Calculate percentage data for clicks and impressions
-        click_percentage = {
-            "branded": safe_divide(branded_current['clicks'].sum(), total_clicks) * 100,
-            "generic": safe_divide(non_branded_current['clicks'].sum(), total_clicks) * 100
-        }
+        return build_branded_analysis(df_all, start_date, end_date, prev_start_date, prev_end_date, request.top_n)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-        impression_percentage = {
-            "branded": safe_divide(branded_current['impressions'].sum(), total_impressions) * 100,
-            "generic": safe_divide(non_branded_current['impressions'].sum(), total_impressions) * 100
-        }
+@router.post("/search_console/dashboard")
+async def get_search_console_dashboard(
+    data: DashboardRequest,
+    user_id: str = Depends(verify_jwt_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Every v2 dashboard view from a single fetch.
 
-        # Branded metrics calculations
-        branded_curr_imp = branded_current['impressions'].sum()
-        branded_prev_imp = branded_prev['impressions'].sum()
-        branded_curr_clicks = branded_current['clicks'].sum()
-        branded_prev_clicks = branded_prev['clicks'].sum()
-        branded_curr_keywords = len(branded_current['keyword'].unique())
-        branded_prev_keywords = len(branded_prev['keyword'].unique())
-        branded_curr_ctr = safe_divide(branded_curr_clicks, branded_curr_imp) * 100
-        branded_prev_ctr = safe_divide(branded_prev_clicks, branded_prev_imp) * 100
-        branded_curr_pos = branded_current['position'].mean() if len(branded_current) > 0 else 0
-        branded_prev_pos = branded_prev['position'].mean() if len(branded_prev) > 0 else 0
-
-        if pd.isna(branded_curr_pos):
-            branded_curr_pos = 0
-        if pd.isna(branded_prev_pos):
-            branded_prev_pos = 0
-
-        branded_metrics = {
-            "impressions": {
-                "Actual": int(branded_curr_imp),
-                "fluctuation": format_fluctuation(safe_percentage(branded_curr_imp, branded_prev_imp))
-            },
-            "clicks": {
-                "Actual": int(branded_curr_clicks),
-                "fluctuation": format_fluctuation(safe_percentage(branded_curr_clicks, branded_prev_clicks))
-            },
-            "no_of_keywords": {
-                "Actual": branded_curr_keywords,
-                "fluctuation": format_fluctuation(safe_percentage(branded_curr_keywords, branded_prev_keywords))
-            },
-            "ctr": {
-                "Actual": f"{round(branded_curr_ctr, 2)}%",
-                "fluctuation": format_fluctuation(branded_curr_ctr - branded_prev_ctr)
-            },
-            "avg_position": {
-                "Actual": round(float(branded_curr_pos), 2),
-                "fluctuation": format_fluctuation(branded_curr_pos - branded_prev_pos)
-            }
-        }
+    Returns the /search_console/, /ranking_keywords/ and /branded_word_analysis
+    payloads, all computed from one frame covering the widest range they need.
+    """
+    try:
+        user_id = user_id[1]
+        start_dt = datetime.strptime(data.start_date, "%Y-%m-%d")
+        end_dt = datetime.strptime(data.end_date, "%Y-%m-%d")
+        if start_dt > end_dt:
+            raise HTTPException(status_code=400, detail="Start date must be before end date")
 
-        # Non-branded metrics calculations
-        non_branded_curr_imp = non_branded_current['impressions'].sum()
-        non_branded_prev_imp = non_branded_prev['impressions'].sum()
-        non_branded_curr_clicks = non_branded_current['clicks'].sum()
-        non_branded_prev_clicks = non_branded_prev['clicks'].sum()
-        non_branded_curr_keywords = len(non_branded_current['keyword'].unique())
-        non_branded_prev_keywords = len(non_branded_prev['keyword'].unique())
-        non_branded_curr_ctr = safe_divide(non_branded_curr_clicks, non_branded_curr_imp) * 100
-        non_branded_prev_ctr = safe_divide(non_branded_prev_clicks, non_branded_prev_imp) * 100
-        non_branded_curr_pos = non_branded_current['position'].mean() if len(non_branded_current) > 0 else 0
-        non_branded_prev_pos = non_branded_prev['position'].mean() if len(non_branded_prev) > 0 else 0
-
-        if pd.isna(non_branded_curr_pos):
-            non_branded_curr_pos = 0
-        if pd.isna(non_branded_prev_pos):
-            non_branded_prev_pos = 0
-
-        non_branded_metrics = {
-            "impressions": {
-                "Actual": int(non_branded_curr_imp),
-                "fluctuation": format_fluctuation(safe_percentage(non_branded_curr_imp, non_branded_prev_imp))
-            },
-            "clicks": {
-                "Actual": int(non_branded_curr_clicks),
-                "fluctuation": format_fluctuation(safe_percentage(non_branded_curr_clicks, non_branded_prev_clicks))
-            },
-            "no_of_keywords": {
-                "Actual": non_branded_curr_keywords,
-                "fluctuation": format_fluctuation(safe_percentage(non_branded_curr_keywords, non_branded_prev_keywords))
-            },
-            "ctr": {
-                "Actual": f"{round(non_branded_curr_ctr, 2)}%",
-                "fluctuation": format_fluctuation(non_branded_curr_ctr - non_branded_prev_ctr)
-            },
-            "avg_position": {
-                "Actual": round(float(non_branded_curr_pos), 2),
-                "fluctuation": format_fluctuation(non_branded_curr_pos - non_branded_prev_pos)
-            }
-        }
+        user_auth = db.query(Integration).filter(
+            Integration.user_id == user_id,
+            Integration.provider == "GOOGLE_SEARCH_CONSOLE"
+        ).first()
+        if not user_auth:
+            raise HTTPException(status_code=404, detail="Google Search Console account not linked")
 
-        # Branded keyword-level data
-        branded_keyword_lists = {
-            "clicks": [],
-            "impressions": [],
-            "ctr": [],
-            "avg_position": []
-        }
+        # Refresh access token if expired or near expiry
+        now = datetime.utcnow()
+        if not user_auth.expires_at or user_auth.expires_at < now + timedelta(seconds=60):
+            if not user_auth.refresh_token:
+                raise HTTPException(status_code=401, detail="No refresh token available, please re-authenticate")
+            try:
+                new_access_token, new_expires_at = refresh_google_access_token(user_auth.refresh_token)
+                user_auth.access_token = new_access_token
+                user_auth.expires_at = new_expires_at
+            except Exception as e:
+                raise HTTPException(status_code=401, detail=f"Failed to refresh access token: {str(e)}")
 
-        if len(df_current) > 0:
-            branded_current_agg = branded_current.groupby('keyword').agg({
-                'position': 'mean',
-                'clicks': 'sum',
-                'impressions': 'sum',
-                'ctr': 'mean'
-            }).reset_index()
-
-            branded_prev_agg = branded_prev.groupby('keyword').agg({
-                'position': 'mean',
-                'clicks': 'sum',
-                'impressions': 'sum',
-                'ctr': 'mean'
-            }).reset_index()
-
-            all_branded_keywords = set(branded_current_agg['keyword'].tolist() + branded_prev_agg['keyword'].tolist())
-
-            for keyword in all_branded_keywords:
-                current_data = branded_current_agg[branded_current_agg['keyword'] == keyword]
-                prev_data = branded_prev_agg[branded_prev_agg['keyword'] == keyword]
-
-                curr_pos = current_data['position'].iloc[0] if len(current_data) > 0 else 0
-                curr_clicks = int(current_data['clicks'].iloc[0]) if len(current_data) > 0 else 0
-                curr_impressions = int(current_data['impressions'].iloc[0]) if len(current_data) > 0 else 0
-                curr_ctr = current_data['ctr'].iloc[0] if len(current_data) > 0 else 0
-
-                prev_pos = prev_data['position'].iloc[0] if len(prev_data) > 0 else 0
-                prev_clicks = int(prev_data['clicks'].iloc[0]) if len(prev_data) > 0 else 0
-                prev_impressions = int(prev_data['impressions'].iloc[0]) if len(prev_data) > 0 else 0
-                prev_ctr = prev_data['ctr'].iloc[0] if len(prev_data) > 0 else 0
-
-                if pd.isna(curr_pos): curr_pos = 0
-                if pd.isna(prev_pos): prev_pos = 0
-                if pd.isna(curr_ctr): curr_ctr = 0
-                if pd.isna(prev_ctr): prev_ctr = 0
-
-                branded_keyword_lists["clicks"].append({
-                    "keyword": keyword,
-                    "pos_last_30_days": curr_clicks,
-                    "pos_before_30_days": prev_clicks,
-                    "change": curr_clicks - prev_clicks
-                })
-
-                branded_keyword_lists["impressions"].append({
-                    "keyword": keyword,
-                    "pos_last_30_days": curr_impressions,
-                    "pos_before_30_days": prev_impressions,
-                    "change": curr_impressions - prev_impressions
-                })
-
-                branded_keyword_lists["ctr"].append({
-                    "keyword": keyword,
-                    "pos_last_30_days": round(float(curr_ctr * 100), 2),
-                    "pos_before_30_days": round(float(prev_ctr * 100), 2),
-                    "change": round(float((curr_ctr - prev_ctr) * 100), 2)
-                })
-
-                branded_keyword_lists["avg_position"].append({
-                    "keyword": keyword,
-                    "pos_last_30_days": round(float(curr_pos), 2),
-                    "pos_before_30_days": round(float(prev_pos), 2),
-                    "change": round(float(curr_pos - prev_pos), 2)
-                })
-
-        # Non-branded keyword-level data
-        generic_keyword_lists = {
-            "clicks": [],
-            "impressions": [],
-            "ctr": [],
-            "avg_position": []
-        }
+        user_auth.selected_site = data.site_url
+        db.commit()
 
-        if len(df_current) > 0:
-            generic_current_agg = non_branded_current.groupby('keyword').agg({
-                'position': 'mean',
-                'clicks': 'sum',
-                'impressions': 'sum',
-                'ctr': 'mean'
-            }).reset_index()
-
-            generic_prev_agg = non_branded_prev.groupby('keyword').agg({
-                'position': 'mean',
-                'clicks': 'sum',
-                'impressions': 'sum',
-                'ctr': 'mean'
-            }).reset_index()
-
-            all_generic_keywords = set(generic_current_agg['keyword'].tolist() + generic_prev_agg['keyword'].tolist())
-
-            for keyword in all_generic_keywords:
-                current_data = generic_current_agg[generic_current_agg['keyword'] == keyword]
-                prev_data = generic_prev_agg[generic_prev_agg['keyword'] == keyword]
-
-                curr_pos = current_data['position'].iloc[0] if len(current_data) > 0 else 0
-                curr_clicks = int(current_data['clicks'].iloc[0]) if len(current_data) > 0 else 0
-                curr_impressions = int(current_data['impressions'].iloc[0]) if len(current_data) > 0 else 0
-                curr_ctr = current_data['ctr'].iloc[0] if len(current_data) > 0 else 0
-
-                prev_pos = prev_data['position'].iloc[0] if len(prev_data) > 0 else 0
-                prev_clicks = int(prev_data['clicks'].iloc[0]) if len(prev_data) > 0 else 0
-                prev_impressions = int(prev_data['impressions'].iloc[0]) if len(prev_data) > 0 else 0
-                prev_ctr = prev_data['ctr'].iloc[0] if len(prev_data) > 0 else 0
-
-                if pd.isna(curr_pos): curr_pos = 0
-                if pd.isna(prev_pos): prev_pos = 0
-                if pd.isna(curr_ctr): curr_ctr = 0
-                if pd.isna(prev_ctr): prev_ctr = 0
-
-                generic_keyword_lists["clicks"].append({
-                    "keyword": keyword,
-                    "pos_last_30_days": curr_clicks,
-                    "pos_before_30_days": prev_clicks,
-                    "change": curr_clicks - prev_clicks
-                })
-
-                generic_keyword_lists["impressions"].append({
-                    "keyword": keyword,
-                    "pos_last_30_days": curr_impressions,
-                    "pos_before_30_days": prev_impressions,
-                    "change": curr_impressions - prev_impressions
-                })
-
-                generic_keyword_lists["ctr"].append({
-                    "keyword": keyword,
-                    "pos_last_30_days": round(float(curr_ctr * 100), 2),
-                    "pos_before_30_days": round(float(prev_ctr * 100), 2),
-                    "change": round(float((curr_ctr - prev_ctr) * 100), 2)
-                })
-
-                generic_keyword_lists["avg_position"].append({
-                    "keyword": keyword,
-                    "pos_last_30_days": round(float(curr_pos), 2),
-                    "pos_before_30_days": round(float(prev_pos), 2),
-                    "change": round(float(curr_pos - prev_pos), 2)
-                })
-
-        # Daily metrics
-        daily_metrics = []
-        if len(df_current) > 0:
-            daily_data = df_current.groupby(['date', 'brand_category']).agg({
-                'clicks': 'sum',
-                'impressions': 'sum',
-                'ctr': 'mean',
-                'position': 'mean'
-            }).reset_index()
-
-            unique_dates = sorted(df_current['date'].unique())
-
-            for date in unique_dates:
-                date_data = daily_data[daily_data['date'] == date]
-
-                branded_day = date_data[date_data['brand_category'] == 'Branded']
-                branded_clicks = int(branded_day['clicks'].sum()) if len(branded_day) > 0 else 0
-                branded_impressions = int(branded_day['impressions'].sum()) if len(branded_day) > 0 else 0
-                branded_ctr = branded_day['ctr'].mean() if len(branded_day) > 0 else 0
-                branded_pos = branded_day['position'].mean() if len(branded_day) > 0 else 0
-
-                generic_day = date_data[date_data['brand_category'] == 'Non-Branded']
-                generic_clicks = int(generic_day['clicks'].sum()) if len(generic_day) > 0 else 0
-                generic_impressions = int(generic_day['impressions'].sum()) if len(generic_day) > 0 else 0
-                generic_ctr = generic_day['ctr'].mean() if len(generic_day) > 0 else 0
-                generic_pos = generic_day['position'].mean() if len(generic_day) > 0 else 0
-
-                if pd.isna(branded_ctr): branded_ctr = 0
-                if pd.isna(branded_pos): branded_pos = 0
-                if pd.isna(generic_ctr): generic_ctr = 0
-                if pd.isna(generic_pos): generic_pos = 0
-
-                daily_metrics.append({
-                    "date": date,
-                    "branded_clicks": branded_clicks,
-                    "branded_impressions": branded_impressions,
-                    "branded_ctr": round(float(branded_ctr * 100), 2),
-                    "branded_avg_position": round(float(branded_pos), 2),
-                    "generic_clicks": generic_clicks,
-                    "generic_impressions": generic_impressions,
-                    "generic_ctr": round(float(generic_ctr * 100), 2),
-                    "generic_avg_position": round(float(generic_pos), 2)
-                })
-
-        return SearchConsoleResponse(
-            click_percentage=click_percentage,
-            impression_percentage=impression_percentage,
-            pie_chart_data=pie_chart_data,
-            branded_keywords=branded_metrics,
-            non_branded_keywords=non_branded_metrics,
-            branded_keyword_list=branded_keyword_lists,
-            generic_keyword_list=generic_keyword_lists,
-            daily_metrics=daily_metrics
+        search_console = SearchConsoleService(
+            access_token=user_auth.access_token,
+            refresh_token=user_auth.refresh_token,
+            client_id=GOOGLE_CLIENT_ID,
+            client_secret=GOOGLE_CLIENT_SECRET
+        )
+
+        fetch_start, fetch_end = SearchConsoleDashboard.fetch_window(data.start_date, data.end_date)
+        print(f"Dashboard fetch range: {fetch_start} to {fetch_end}")
+
+        rollup = await asyncio.to_thread(
+            search_console.get_site_rollup,
+            site_url=data.site_url,
+            device=data.device_type or "all",
+            country=data.country,
+            search_type=data.search_type,
+            start_date=fetch_start,
+            end_date=fetch_end
         )
+        if rollup.empty:
+            raise HTTPException(status_code=404, detail="No data found for the specified site")
+
+        dashboard = SearchConsoleDashboard(rollup.detail, data.start_date, data.end_date, rollup=rollup)
+        return await asyncio.to_thread(dashboard.build, data.branded_words)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {str(e)}")
     except Exception as e:
+        print(f"Error in dashboard analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get("/report_filter")
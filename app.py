@@ -10,6 +10,8 @@ from S3_bucket.bucket_routes import router as bucket_router
 from settings.sourcefile_upload.fileupload_route import router as file_upload_router
 from settings.app_intergations.app_intergations_routes import router as app_intergations_router
 from screaming_frog.screming_frog_route import router as screaming_frog_router
+from screaming_frog.crawl_jobs import crawl_job_queue
+from clustering_pipeline.embedding_fetcher import close_embedding_client
 from auth.users import router as auth_router
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
@@ -34,6 +36,15 @@ app.add_middleware(
     secret_key="!secret"
 )
 
+@app.on_event("startup")
+def start_crawl_dispatcher():
+    # Picks up crawls queued before a restart as well as new ones
+    crawl_job_queue.start()
+
+@app.on_event("shutdown")
+async def close_shared_clients():
+    await close_embedding_client()
+
 @app.get("/")
 def read_root():
     return {"message": "welcome to Ai marketing"}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum, JSON, Float
 from sqlalchemy.dialects.postgresql import JSONB 
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -40,6 +40,9 @@ class User(Base):
     integrations_auth = relationship("Integration", back_populates="user", cascade="all, delete-orphan")
     spreadsheet_data_record = relationship("SpreadSheet", back_populates="user")
     sf_crawl_data_record = relationship("Sf_crawl_data", back_populates="user")
+    sf_crawl_job_records = relationship("Sf_crawl_job", back_populates="user")
+    cluster_model_records = relationship("ClusterModel", back_populates="user")
+    keyword_bulk_job_records = relationship("KeywordBulkJob", back_populates="user")
     
 
 
@@ -356,5 +359,60 @@ class Sf_crawl_data(Base):
     is_seleted = Column(String,nullable=False)
     
     user = relationship("User", back_populates="sf_crawl_data_record")
-    
-        
\ No newline at end of file
+
+
+class Sf_crawl_job(Base):
+    __tablename__ = "sf_crawl_job"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    crawl_url = Column(String)
+    export_tabs = Column(String)  # comma separated, as passed to --export-tabs
+    status = Column(String, index=True, nullable=False)  # queued / crawling / processing / completed / failed
+    progress = Column(JSONB)
+    last_output = Column(Text, nullable=True)
+    uuid = Column(String, nullable=True)  # Sf_crawl_data.uuid once completed
+    rows_processed = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    worker = Column(String, nullable=True)  # host:pid running the job
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    user = relationship("User", back_populates="sf_crawl_job_records")
+
+
+class KeywordBulkJob(Base):
+    __tablename__ = "keyword_bulk_job"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    kind = Column(String)  # "seo" or "ppc"
+    mode = Column(String)  # "ideas" or "historical"
+    seed_count = Column(Integer)
+    calls_charged = Column(Integer, default=0)  # API calls refunded if the job fails
+    status = Column(String, index=True, nullable=False)  # queued/running/completed/failed
+    result = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    user = relationship("User", back_populates="keyword_bulk_job_records")
+
+
+class ClusterModel(Base):
+    __tablename__ = "cluster_model_data"
+
+    id = Column(Integer, primary_key=True, index=True)
+    uuid = Column(String, index=True)  # uuid of the SEOFile / PPCFile the model was fitted for
+    user_id = Column(Integer, ForeignKey("users.id"))
+    file_type = Column(String)  # "seo" or "ppc"
+    # The fitted model itself lives in S3 next to the file (S3_bucket.utile.cluster_model_key)
+    n_samples = Column(Integer)
+    baseline_distance = Column(Float)
+    upload_time = Column(DateTime, default=datetime.utcnow)
+
+    user = relationship("User", back_populates="cluster_model_records")
@@ -0,0 +1,109 @@
+import re
+import numpy as np
+from functools import lru_cache
+from typing import Iterable, Optional, Sequence
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Keywords are joined with this separator and scanned as one string, so no
+# brand term may contain it.
+_SEPARATOR = "\n"
+
+
+def normalize_brand_terms(branded_words: Optional[Iterable[str]]) -> tuple:
+    """Lowercase and de-duplicate brand terms into a stable cache key"""
+    if not branded_words:
+        return ()
+    terms = {
+        str(word).replace(_SEPARATOR, " ").lower()
+        for word in branded_words
+        if word is not None
+    }
+    terms.discard("")
+    return tuple(sorted(terms))
+
+
+class BrandedMatcher:
+    """
+    Multi-pattern substring matcher for a fixed list of brand terms.
+
+    Uses a pyahocorasick automaton when the package is installed and falls
+    back to a single combined regex otherwise. Matching is case-insensitive
+    and follows the existing "brand term appears anywhere in the keyword"
+    rule.
+    """
+
+    def __init__(self, terms: Sequence[str]):
+        self.terms = tuple(terms)
+        self._automaton = None
+        self._pattern = None
+
+        if not self.terms:
+            return
+
+        if AHOCORASICK_AVAILABLE:
+            automaton = ahocorasick.Automaton()
+            for term in self.terms:
+                automaton.add_word(term, len(term))
+            automaton.make_automaton()
+            self._automaton = automaton
+        else:
+            # Longest first so overlapping terms do not shadow each other
+            ordered = sorted(self.terms, key=len, reverse=True)
+            self._pattern = re.compile("|".join(re.escape(term) for term in ordered))
+
+    def _match_ends(self, text: str):
+        """Yield the end offset of every brand term hit in text"""
+        if self._automaton is not None:
+            for end_index, _ in self._automaton.iter(text):
+                yield end_index
+        else:
+            for match in self._pattern.finditer(text):
+                yield match.end() - 1
+
+    def contains(self, keyword: str) -> bool:
+        if not self.terms or not keyword:
+            return False
+        return next(self._match_ends(str(keyword).lower()), None) is not None
+
+    def mask(self, keywords: Iterable[str]) -> np.ndarray:
+        """
+        Return a boolean array, True where the keyword contains a brand term.
+
+        All keywords are lowercased and joined into one string which is scanned
+        once, then every hit is mapped back to its keyword by offset, so the
+        cost is linear in the total keyword length regardless of how many
+        brand terms there are.
+        """
+        texts = ["" if keyword is None else str(keyword).replace(_SEPARATOR, " ").lower() for keyword in keywords]
+        result = np.zeros(len(texts), dtype=bool)
+        if not self.terms or not texts:
+            return result
+
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+        blob = _SEPARATOR.join(texts)
+
+        ends = np.fromiter(self._match_ends(blob), dtype=np.int64)
+        if ends.size:
+            result[np.searchsorted(starts, ends, side="right") - 1] = True
+        return result
+
+
+@lru_cache(maxsize=128)
+def _cached_matcher(terms: tuple) -> BrandedMatcher:
+    return BrandedMatcher(terms)
+
+
+def get_branded_matcher(branded_words: Optional[Iterable[str]]) -> BrandedMatcher:
+    """Return the compiled matcher for a brand list, built once per distinct list"""
+    return _cached_matcher(normalize_brand_terms(branded_words))
+
+
+def branded_mask(keywords: Iterable[str], branded_words: Optional[Iterable[str]]) -> np.ndarray:
+    """Boolean mask of which keywords contain any of branded_words (case-insensitive)"""
+    return get_branded_matcher(branded_words).mask(keywords)
@@ -0,0 +1,150 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from typing import List, Dict, Optional
+from dotenv import load_dotenv
+load_dotenv()
+
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", 500000))
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a keyword so trivially different spellings share one cache entry"""
+    return " ".join(str(text).lower().split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding store keyed by (model name, normalized text hash).
+
+    Vectors are stored as float32 blobs in a local SQLite file. Every hit
+    refreshes the entry's last_used timestamp and the least recently used
+    entries are evicted once the store grows past max_entries.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = int(max_entries)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Return {text_hash: vector} for every text already in the cache"""
+        hashes = list({text_hash(t) for t in texts})
+        found = {}
+        if not hashes:
+            return found
+
+        with self._lock:
+            # SQLite caps the number of bound parameters per statement
+            for i in range(0, len(hashes), 900):
+                chunk = hashes[i:i+900]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, dim, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk]
+                ).fetchall()
+                for h, dim, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32, count=dim)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found]
+                )
+                self._conn.commit()
+
+        return found
+
+    def put_many(self, model: str, texts: List[str], vectors: np.ndarray) -> None:
+        """Store vectors for texts and evict the least recently used entries over the cap"""
+        if len(texts) == 0:
+            return
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        rows = [
+            (model, text_hash(t), int(v.shape[0]), v.tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.max_entries <= 0:
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            print(f"Evicted {overflow} embeddings from cache")
+
+    def set_max_entries(self, max_entries: int) -> None:
+        """Change the size limit, evicting right away if the cache is now over it"""
+        with self._lock:
+            self.max_entries = int(max_entries)
+            self._evict()
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(path: Optional[str] = None, max_entries: Optional[int] = None) -> EmbeddingCache:
+    """
+    Return the process-wide cache for a given path so connections are shared
+    between requests. A max_entries that differs from the open cache's limit
+    is applied to it.
+    """
+    path = path or EMBEDDING_CACHE_PATH
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = EmbeddingCache(path, max_entries if max_entries is not None else EMBEDDING_CACHE_MAX_ENTRIES)
+            _caches[path] = cache
+        elif max_entries is not None and int(max_entries) != cache.max_entries:
+            cache.set_max_entries(max_entries)
+        return cache
@@ -0,0 +1,191 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+import numpy as np
+import openai
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+load_dotenv()
+
+EMBEDDING_MAX_CONCURRENCY = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", 4))
+EMBEDDING_TPM_LIMIT = int(os.environ.get("EMBEDDING_TPM_LIMIT", 1000000))
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) used for batch sizing"""
+    return max(1, len(text) // 4 + 1)
+
+
+class TokenRateLimiter:
+    """
+    Token bucket that refills at tokens_per_minute / 60 per second.
+
+    Callers reserve their tokens up front (the balance may go negative) and
+    then sleep until the reservation is covered, so requests are served in
+    order. The state is guarded by a thread lock rather than an asyncio one,
+    so a single limiter can be shared by every event loop in the process.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.tokens = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, tokens_per_minute: int):
+        with self._lock:
+            self.capacity = float(tokens_per_minute)
+            self.tokens = min(self.tokens, self.capacity)
+            self.rate = tokens_per_minute / 60.0
+
+    async def acquire(self, tokens: int) -> None:
+        with self._lock:
+            tokens = min(float(tokens), self.capacity)
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            await asyncio.sleep(wait)
+
+
+_limiters: Dict[str, TokenRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: str, tpm_limit: int = EMBEDDING_TPM_LIMIT) -> TokenRateLimiter:
+    """
+    Process-wide limiter for model. OpenAI enforces TPM per model and
+    organisation, so every request and every chunk embedding with the same
+    model draws from one budget.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = _limiters[model] = TokenRateLimiter(tpm_limit)
+        elif limiter.capacity != float(tpm_limit):
+            limiter.set_rate(tpm_limit)
+        return limiter
+
+
+# httpx connection pools are tied to the event loop that opened them, so
+# there is one client per running loop (in practice one per worker)
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def get_embedding_client() -> openai.AsyncOpenAI:
+    """Shared AsyncOpenAI client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = _clients[loop] = openai.AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        return client
+
+
+async def close_embedding_client():
+    """Close the running loop's shared client and its connection pool (app shutdown)"""
+    with _clients_lock:
+        client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+class AsyncEmbeddingFetcher:
+    """
+    Fetch OpenAI embeddings with bounded concurrency.
+
+    Texts are packed into batches capped by item count and estimated tokens,
+    every request waits on a tokens-per-minute bucket, and rate-limit or
+    transient errors are retried with exponential backoff. Results are
+    returned in the same order as the input texts.
+
+    The client and the rate limiter default to the process-wide ones
+    (get_embedding_client / get_rate_limiter), so fetchers are cheap to
+    create per call and never open their own connection pool.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        client: Optional[openai.AsyncOpenAI] = None,
+        limiter: Optional[TokenRateLimiter] = None,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        tpm_limit: int = EMBEDDING_TPM_LIMIT,
+        max_batch_size: int = 100,
+        max_batch_tokens: int = 100000,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+    ):
+        self.model = model
+        self.client = client or get_embedding_client()
+        self.limiter = limiter or get_rate_limiter(model, tpm_limit)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_batch_size = max(1, int(max_batch_size))
+        # Keep a single batch small enough that all concurrent requests fit in one minute's budget
+        self.max_batch_tokens = max(1, min(int(max_batch_tokens), int(self.limiter.capacity) // self.max_concurrency))
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+    def _make_batches(self, texts: List[str]) -> List[List[int]]:
+        batches = []
+        current = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= self.max_batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _embed_batch(self, batch_texts: List[str], semaphore: asyncio.Semaphore) -> List[List[float]]:
+        tokens = sum(estimate_tokens(t) for t in batch_texts)
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire(tokens)
+                try:
+                    response = await self.client.embeddings.create(model=self.model, input=batch_texts)
+                    # The API tags each vector with its input index, so sort rather than trust response order
+                    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.backoff_base * (2 ** attempt) + random.uniform(0, self.backoff_base)
+                    print(f"Embedding batch failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        texts = [str(t) for t in texts]
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        batches = self._make_batches(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        print(f"Embedding {len(texts)} texts in {len(batches)} batches with concurrency {self.max_concurrency}")
+
+        results = await asyncio.gather(*[
+            self._embed_batch([texts[i] for i in batch], semaphore) for batch in batches
+        ])
+
+        embeddings = np.empty((len(texts), len(results[0][0])), dtype=np.float32)
+        for batch, vectors in zip(batches, results):
+            embeddings[batch] = vectors
+        return embeddings
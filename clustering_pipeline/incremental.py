@@ -0,0 +1,77 @@
+from typing import List, Dict
+from clustering_pipeline.k_mean import ClusteringConfig, Cluster
+from clustering_pipeline.model_store import (
+    DRIFT_THRESHOLD,
+    FittedClusterModel,
+    page_for_cluster,
+    append_keyword_to_page,
+    existing_keywords
+)
+
+
+async def assign_keywords_to_file(json_data: list, model: FittedClusterModel, new_items: List[Dict],
+                                  drift_threshold: float = DRIFT_THRESHOLD):
+    """
+    Add keywords to an existing SEO/PPC file without re-clustering it.
+
+    New keywords are embedded (cache misses only), projected with the stored
+    UMAP reducer and placed on the page that holds most of their nearest
+    cluster's keywords. If the new keywords drift too far from the fitted
+    centroids, UMAP+KMeans is refitted on the whole file first; existing
+    pages keep their layout and the summary carries a message saying so.
+
+    Returns (json_data, model, summary) where model may be a refitted one.
+    """
+    known = {k.lower() for k in existing_keywords(json_data)}
+    items = []
+    for item in new_items:
+        keyword = str(item["Keyword"]).strip()
+        if keyword and keyword.lower() not in known:
+            known.add(keyword.lower())
+            items.append({**item, "Keyword": keyword})
+
+    if not items:
+        return json_data, model, {"assigned": [], "unassigned": [], "drift": 0.0, "refitted": False}
+
+    texts = [item["Keyword"] for item in items]
+    clusterer = Cluster(ClusteringConfig(openai_model=model.openai_model))
+    labels, distances = await clusterer.aassign_keywords(model, texts)
+    drift = model.drift(distances)
+    print(f"Assigned {len(texts)} keywords with drift {drift:.2f} (threshold {drift_threshold})")
+
+    refitted = False
+    if drift > drift_threshold:
+        print("Drift threshold exceeded, refitting clusters on the whole file")
+        records = [{"Keyword": k} for k in existing_keywords(json_data) + texts]
+        await clusterer.aprocess_clustering(records, "Keyword")
+        model = clusterer.fitted_model
+        labels, distances = await clusterer.aassign_keywords(model, texts)
+        refitted = True
+
+    assigned = []
+    unassigned = []
+    for item, label in zip(items, labels):
+        cluster_keywords = model.cluster_keywords.setdefault(int(label), [])
+        page = page_for_cluster(json_data, cluster_keywords)
+        if page is None:
+            unassigned.append(item["Keyword"])
+            continue
+
+        keyword_entry = append_keyword_to_page(page, item["Keyword"], item.get("Avg_Monthly_Searches", 0))
+        if not refitted:
+            cluster_keywords.append(item["Keyword"])
+        assigned.append({**keyword_entry, "Page_title_id": page.get("Page_title_id"), "cluster": int(label)})
+
+    if not refitted:
+        model.n_samples += len(assigned)
+
+    summary = {"assigned": assigned, "unassigned": unassigned, "drift": drift, "refitted": refitted}
+    if refitted:
+        # Only the model was refitted; the file's pages still group keywords
+        # by the old clusters, so new keywords go to the page holding most of
+        # their new cluster's keywords
+        summary["message"] = (
+            "The new keywords drifted from the existing clusters, so the cluster model was refitted. "
+            "Existing pages were not regrouped; re-run clustering on the file to rebuild its pages."
+        )
+    return json_data, model, summary
@@ -3,15 +3,30 @@ import sys
 import numpy as np
 import pandas as pd
 import json
+import asyncio
+import tempfile
 import umap
-from typing import Tuple, List
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
+from typing import Tuple, List, Optional
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from dataclasses import dataclass
 import matplotlib.pyplot as plt
 import openai
 from dotenv import load_dotenv
 load_dotenv()
+from clustering_pipeline.embedding_cache import get_embedding_cache, text_hash
+from clustering_pipeline.k_sweep import sweep_k
+from clustering_pipeline.knn_graph import compute_knn_graph
+from clustering_pipeline.model_store import FittedClusterModel, build_fitted_model
+from clustering_pipeline.embedding_fetcher import (
+    AsyncEmbeddingFetcher, EMBEDDING_MAX_CONCURRENCY, EMBEDDING_TPM_LIMIT, get_embedding_client, get_rate_limiter
+)
+
+# Output width of the OpenAI embedding models, used to shape empty results
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
 
 @dataclass
 class ClusteringConfig:
@@ -21,7 +36,25 @@ class ClusteringConfig:
     umap_n_components: int = 2
     umap_n_neighbors: int = 50
     umap_min_dist: float = 0.02
+    umap_metric: str = "euclidean"
+    knn_backend: Optional[str] = "pynndescent"  # cached ANN graph; None lets UMAP build its own
+    knn_min_samples: int = 4096  # below this UMAP's exact small-data path is cheaper
     openai_model: str = "text-embedding-3-small"  # OpenAI embedding model
+    use_embedding_cache: bool = True
+    embedding_cache_path: Optional[str] = None  # defaults to EMBEDDING_CACHE_PATH
+    embedding_cache_max_entries: Optional[int] = None  # defaults to EMBEDDING_CACHE_MAX_ENTRIES
+    embedding_max_concurrency: int = EMBEDDING_MAX_CONCURRENCY
+    embedding_tpm_limit: int = EMBEDDING_TPM_LIMIT
+    sweep_criterion: str = "silhouette"  # "silhouette" or "calinski_harabasz"
+    sweep_sample_size: Optional[int] = 2000  # silhouette sample size, None scores every point
+    sweep_n_init: int = 3  # the final fit still uses n_init=10
+    sweep_n_jobs: Optional[int] = None  # defaults to the CPU count
+    sweep_patience: Optional[int] = 5  # stop after this many k values without improvement
+    large_dataset_mode: Optional[bool] = None  # None switches on automatically above large_dataset_threshold
+    large_dataset_threshold: int = int(os.environ.get("LARGE_DATASET_THRESHOLD", 20000))
+    large_chunk_size: int = 10000  # rows embedded / transformed / partial-fitted at a time
+    large_fit_sample_size: int = 20000  # rows used to fit UMAP and pick k in large mode
+    minibatch_size: int = 4096
 
 class Cluster:
     def __init__(self, config: ClusteringConfig = ClusteringConfig(), api_key: str = None):
@@ -35,6 +68,8 @@ class Cluster:
             raise ValueError("OpenAI API key must be provided or set as OPENAI_API_KEY environment variable")
         
         self.client = openai.Client()
+        self.reducer = None
+        self.fitted_model: Optional[FittedClusterModel] = None
 
     def kmeans_clustering(self, n_clusters: int, embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         model = KMeans(
@@ -46,42 +81,192 @@ class Cluster:
         model.fit(embeddings)
         return model.labels_, model.cluster_centers_
 
+    def is_large_dataset(self, n_samples: int) -> bool:
+        if self.config.large_dataset_mode is not None:
+            return bool(self.config.large_dataset_mode)
+        return n_samples > int(self.config.large_dataset_threshold)
+
+    def minibatch_kmeans_clustering(self, n_clusters: int, embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Fit MiniBatchKMeans chunk by chunk, then label every row"""
+        model = MiniBatchKMeans(
+            n_clusters=n_clusters,
+            init='k-means++',
+            random_state=self.config.random_state,
+            batch_size=self.config.minibatch_size,
+            n_init=3
+        )
+        chunk = int(self.config.large_chunk_size)
+        # the first partial_fit call needs at least n_clusters rows
+        chunk = max(chunk, n_clusters)
+        for i in range(0, embeddings.shape[0], chunk):
+            model.partial_fit(embeddings[i:i+chunk])
+
+        labels = np.concatenate([
+            model.predict(embeddings[i:i+chunk]) for i in range(0, embeddings.shape[0], chunk)
+        ])
+        return labels, model.cluster_centers_
+
+    def _sample_indices(self, n_samples: int) -> np.ndarray:
+        size = min(int(self.config.large_fit_sample_size), n_samples)
+        rng = np.random.default_rng(self.config.random_state)
+        return np.sort(rng.choice(n_samples, size=size, replace=False))
+
+    def _new_embedding_store(self, n_samples: int, dim: int) -> np.ndarray:
+        """Disk-backed float32 matrix so large embedding sets are not held in RAM"""
+        tmp = tempfile.NamedTemporaryFile(prefix="embeddings_", suffix=".f32", delete=False)
+        tmp.close()
+        store = np.memmap(tmp.name, dtype=np.float32, mode="w+", shape=(n_samples, dim))
+        # unlink now, the mapping stays valid until the array is released
+        os.unlink(tmp.name)
+        return store
+
+    def embed_texts_chunked(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in chunks into a disk-backed matrix"""
+        store = None
+        chunk = int(self.config.large_chunk_size)
+        for i in range(0, len(texts), chunk):
+            vectors = self.embed_texts(texts[i:i+chunk])
+            if store is None:
+                store = self._new_embedding_store(len(texts), vectors.shape[1])
+            store[i:i+len(vectors)] = vectors
+        return store
+
+    async def aembed_texts_chunked(self, texts: List[str]) -> np.ndarray:
+        """Async variant of embed_texts_chunked"""
+        store = None
+        chunk = int(self.config.large_chunk_size)
+        for i in range(0, len(texts), chunk):
+            vectors = await self.aembed_texts(texts[i:i+chunk])
+            if store is None:
+                store = self._new_embedding_store(len(texts), vectors.shape[1])
+            store[i:i+len(vectors)] = vectors
+        return store
+
+    def _fetch_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Call OpenAI's API to get embeddings for the provided texts"""
+        # Process in batches if there are many texts (OpenAI has rate limits)
+        batch_size = 100  # Adjust based on your needs and rate limits
+        all_embeddings = []
+
+        for i in range(0, len(texts), batch_size):
+            batch_texts = texts[i:i+batch_size]
+
+            # Call OpenAI API to get embeddings
+            response = self.client.embeddings.create(
+                model=self.config.openai_model,
+                input=batch_texts
+            )
+
+            # Extract embedding vectors from the response
+            batch_embeddings = [item.embedding for item in response.data]
+            all_embeddings.extend(batch_embeddings)
+
+        return np.array(all_embeddings, dtype=np.float32)
+
+    def _split_cached(self, texts: List[str]):
+        """Return (cache, hashes, cached vectors, {hash: text} still to embed)"""
+        cache = get_embedding_cache(self.config.embedding_cache_path, self.config.embedding_cache_max_entries)
+        hashes = [text_hash(t) for t in texts]
+        cached = cache.get_many(self.config.openai_model, texts)
+
+        # Embed each missing normalized text once, even if it repeats in the input
+        missing = {}
+        for t, h in zip(texts, hashes):
+            if h not in cached and h not in missing:
+                missing[h] = t
+        print(f"Embedding cache: {len(texts) - sum(h in missing for h in hashes)} hits, {len(missing)} misses")
+        return cache, hashes, cached, missing
+
+    def _empty_embeddings(self) -> np.ndarray:
+        dim = EMBEDDING_DIMENSIONS.get(self.config.openai_model, 1536)
+        return np.empty((0, dim), dtype=np.float32)
+
     def embed_texts(self, texts: List[str]) -> np.ndarray:
-        """Use OpenAI's API to get embeddings for the provided texts"""
+        """Get embeddings for the provided texts, only sending cache misses to OpenAI"""
+        if not texts:
+            return self._empty_embeddings()
         try:
-            # Process in batches if there are many texts (OpenAI has rate limits)
-            batch_size = 100  # Adjust based on your needs and rate limits
-            all_embeddings = []
-            
-            for i in range(0, len(texts), batch_size):
-                batch_texts = texts[i:i+batch_size]
-                
-                # Call OpenAI API to get embeddings
-                response = self.client.embeddings.create(
-                    model=self.config.openai_model,
-                    input=batch_texts
-                )
-                
-                # Extract embedding vectors from the response
-                batch_embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(batch_embeddings)
-            
-            # Convert to numpy array
-            return np.array(all_embeddings)
-            
+            texts = [str(t) for t in texts]
+
+            if not self.config.use_embedding_cache:
+                return self._fetch_embeddings(texts)
+
+            cache, hashes, cached, missing = self._split_cached(texts)
+            if missing:
+                missing_texts = list(missing.values())
+                fetched = self._fetch_embeddings(missing_texts)
+                cache.put_many(self.config.openai_model, missing_texts, fetched)
+                cached.update(zip(missing.keys(), fetched))
+
+            return np.vstack([cached[h] for h in hashes])
+
         except Exception as e:
             raise Exception(f"Error getting embeddings from OpenAI: {str(e)}")
 
-    def reduce_dimensions(self, embeddings: np.ndarray) -> np.ndarray:
-        n_samples = embeddings.shape[0]
+    async def aembed_texts(self, texts: List[str]) -> np.ndarray:
+        """Async variant of embed_texts that fetches cache misses concurrently"""
+        if not texts:
+            return self._empty_embeddings()
+        try:
+            texts = [str(t) for t in texts]
+            fetcher = AsyncEmbeddingFetcher(
+                model=self.config.openai_model,
+                client=get_embedding_client(),
+                limiter=get_rate_limiter(self.config.openai_model, self.config.embedding_tpm_limit),
+                max_concurrency=self.config.embedding_max_concurrency
+            )
+
+            if not self.config.use_embedding_cache:
+                return await fetcher.embed(texts)
+
+            cache, hashes, cached, missing = await asyncio.to_thread(self._split_cached, texts)
+            if missing:
+                missing_texts = list(missing.values())
+                fetched = await fetcher.embed(missing_texts)
+                await asyncio.to_thread(cache.put_many, self.config.openai_model, missing_texts, fetched)
+                cached.update(zip(missing.keys(), fetched))
+
+            return np.vstack([cached[h] for h in hashes])
+
+        except Exception as e:
+            raise Exception(f"Error getting embeddings from OpenAI: {str(e)}")
+
+    def _build_reducer(self, data: np.ndarray) -> umap.UMAP:
+        n_samples = data.shape[0]
         safe_n_neighbors = min(self.config.umap_n_neighbors, n_samples - 1)
-        reducer = umap.UMAP(
+        precomputed_knn = (None, None, None)
+        if self.config.knn_backend == "pynndescent" and n_samples >= self.config.knn_min_samples:
+            precomputed_knn = compute_knn_graph(
+                data, safe_n_neighbors, self.config.umap_metric, self.config.random_state
+            )
+        return umap.UMAP(
             n_components=self.config.umap_n_components,
             n_neighbors=safe_n_neighbors,
             min_dist=self.config.umap_min_dist,
-            random_state=self.config.random_state
+            metric=self.config.umap_metric,
+            random_state=self.config.random_state,
+            precomputed_knn=precomputed_knn
         )
-        return reducer.fit_transform(embeddings)
+
+    def reduce_dimensions(self, embeddings: np.ndarray) -> np.ndarray:
+        reducer = self._build_reducer(embeddings)
+        reduced = reducer.fit_transform(embeddings)
+        self.reducer = reducer
+        return reduced
+
+    def reduce_dimensions_chunked(self, embeddings: np.ndarray) -> np.ndarray:
+        """Fit UMAP on a sample, then project the full matrix chunk by chunk"""
+        sample = np.asarray(embeddings[self._sample_indices(embeddings.shape[0])])
+        reducer = self._build_reducer(sample)
+        reducer.fit(sample)
+        self.reducer = reducer
+        del sample
+
+        chunk = int(self.config.large_chunk_size)
+        reduced = np.empty((embeddings.shape[0], self.config.umap_n_components), dtype=np.float32)
+        for i in range(0, embeddings.shape[0], chunk):
+            reduced[i:i+chunk] = reducer.transform(np.asarray(embeddings[i:i+chunk]))
+        return reduced
 
     def find_optimal_clusters(self, embeddings: np.ndarray) -> int:
         n_samples = embeddings.shape[0]
@@ -134,42 +319,24 @@ class Cluster:
                 print(f"Sample size too small, using {min_clusters} clusters")
                 return min_clusters
 
-            best_n_clusters = min_clusters
-            best_silhouette = -1.0
-            silhouette_scores = []
-
-            for n_clusters in range(min_clusters, max_clusters + 1):
-                try:
-                    kmeans = KMeans(
-                        n_clusters=n_clusters,
-                        init="k-means++",
-                        random_state=self.config.random_state,
-                        n_init=10
-                    )
-                    labels = kmeans.fit_predict(embeddings)
-
-                    # need at least 2 clusters for silhouette_score
-                    if len(np.unique(labels)) < 2:
-                        print(f"Only one cluster formed with n_clusters={n_clusters}, skipping")
-                        continue
-
-                    score = silhouette_score(embeddings, labels)
-                    silhouette_scores.append(score)
-
-                    if score > best_silhouette:
-                        best_silhouette = score
-                        best_n_clusters = n_clusters
-
-                except Exception as e:
-                    print(f"Error during clustering with {n_clusters} clusters: {e}")
-                    continue
-
-            if not silhouette_scores:
+            scores = sweep_k(
+                embeddings,
+                list(range(min_clusters, max_clusters + 1)),
+                random_state=self.config.random_state,
+                n_init=self.config.sweep_n_init,
+                criterion=self.config.sweep_criterion,
+                sample_size=self.config.sweep_sample_size,
+                n_jobs=self.config.sweep_n_jobs,
+                patience=self.config.sweep_patience
+            )
+
+            if not scores:
                 print("Could not calculate silhouette scores, using minimum clusters")
                 return min_clusters
 
-            print(f"Silhouette scores: {silhouette_scores}")
-            print(f"Best number of clusters: {best_n_clusters} with silhouette score: {best_silhouette}")
+            best_n_clusters, best_score = max(scores, key=lambda item: item[1])
+            print(f"{self.config.sweep_criterion} scores: {scores}")
+            print(f"Best number of clusters: {best_n_clusters} with {self.config.sweep_criterion} score: {best_score}")
             return best_n_clusters
 
         except Exception as e:
@@ -177,66 +344,111 @@ class Cluster:
             # Fallback: at least 2 clusters or 1 if even that fails
             return max(2, int(self.config.min_clusters))
 
-    def process_clustering(self, data_path: str, metadata_column: str) -> dict:
-        try:               
-            if not isinstance(data_path, list):
-                raise ValueError("Input data must be a list of records")
+    def _prepare_dataframe(self, data_path: str, metadata_column: str) -> pd.DataFrame:
+        if not isinstance(data_path, list):
+            raise ValueError("Input data must be a list of records")
 
-            df = pd.DataFrame(data_path)
-            print(df)
-            
-            if metadata_column not in df.columns:
-                raise ValueError(f"Column '{metadata_column}' not found in data")
-            
-            # Dynamically adjust clustering configuration based on data size
-            n_samples = len(df)
-            print(f"Dataset contains {n_samples} samples")
+        df = pd.DataFrame(data_path)
+        print(df)
         
-            # Adjust cluster settings based on data size
-            if n_samples <= 200:
-                self.config.min_clusters = 2
-                self.config.max_clusters = 7
-                print(f"Small dataset detected: min_clusters={self.config.min_clusters}, max_clusters={self.config.max_clusters}")
-            elif n_samples >= 800:
-                self.config.min_clusters = 5
-                self.config.max_clusters = 30
-                print(f"Large dataset detected: min_clusters={self.config.min_clusters}, max_clusters={self.config.max_clusters}")
-            
-            # Validate sample size
-            if n_samples < 10:
-                raise ValueError("Need at least 10 samples for clustering")
-            # Process clustering with OpenAI embeddings
-            embeddings = self.embed_texts(df[metadata_column].values)
-            print(f"Generated embeddings with shape: {embeddings.shape}")
-            
+        if metadata_column not in df.columns:
+            raise ValueError(f"Column '{metadata_column}' not found in data")
+        
+        # Dynamically adjust clustering configuration based on data size
+        n_samples = len(df)
+        print(f"Dataset contains {n_samples} samples")
+    
+        # Adjust cluster settings based on data size
+        if n_samples <= 200:
+            self.config.min_clusters = 2
+            self.config.max_clusters = 7
+            print(f"Small dataset detected: min_clusters={self.config.min_clusters}, max_clusters={self.config.max_clusters}")
+        elif n_samples >= 800:
+            self.config.min_clusters = 5
+            self.config.max_clusters = 30
+            print(f"Large dataset detected: min_clusters={self.config.min_clusters}, max_clusters={self.config.max_clusters}")
+        
+        # Validate sample size
+        if n_samples < 10:
+            raise ValueError("Need at least 10 samples for clustering")
+        return df
+
+    def _cluster_embeddings(self, df: pd.DataFrame, embeddings: np.ndarray, metadata_column: str):
+        print(f"Generated embeddings with shape: {embeddings.shape}")
+        large = self.is_large_dataset(embeddings.shape[0])
+        
+        if large:
+            print(f"Large dataset mode: fitting on {self.config.large_fit_sample_size} sampled rows")
+            reduced_embeddings = self.reduce_dimensions_chunked(embeddings)
+        else:
             reduced_embeddings = self.reduce_dimensions(embeddings)
-            print(f"Reduced embeddings with shape: {reduced_embeddings.shape}")
-            
+        print(f"Reduced embeddings with shape: {reduced_embeddings.shape}")
 
+        if large:
+            sample = reduced_embeddings[self._sample_indices(reduced_embeddings.shape[0])]
+            optimal_clusters = self.find_optimal_clusters_silhouette(sample)
+        else:
             optimal_clusters = self.find_optimal_clusters_silhouette(reduced_embeddings)
-            print(f"Optimal cluster count: {optimal_clusters}")
-            
+        print(f"Optimal cluster count: {optimal_clusters}")
+        
+        if large:
+            labels, centers = self.minibatch_kmeans_clustering(optimal_clusters, reduced_embeddings)
+        else:
             labels, centers = self.kmeans_clustering(optimal_clusters, reduced_embeddings)
-            
-            # Add cluster labels to DataFrame
-            df['cluster'] = labels
-
-            # Prepare results
-            results = {
-                'optimal_clusters': optimal_clusters,
-                'cluster_labels': labels.tolist(),
-                'cluster_centers': centers.tolist(),
-                'reduced_embeddings': reduced_embeddings.tolist()
-            }
-
-            print(f"Clustering complete with {optimal_clusters} clusters")
-            
-            json_string = df.to_json(orient='records', lines=False)
-            return json_string, optimal_clusters
+        
+        # Keep the fitted reducer and centroids so new keywords can be assigned later
+        self.fitted_model = build_fitted_model(
+            self.reducer, centers, reduced_embeddings, labels,
+            df[metadata_column].tolist(), self.config.openai_model
+        )
+
+        # Add cluster labels to DataFrame
+        df['cluster'] = labels
+
+        print(f"Clustering complete with {optimal_clusters} clusters")
+        
+        json_string = df.to_json(orient='records', lines=False)
+        return json_string, optimal_clusters
+
+    def process_clustering(self, data_path: str, metadata_column: str) -> dict:
+        try:               
+            df = self._prepare_dataframe(data_path, metadata_column)
+            # Process clustering with OpenAI embeddings
+            texts = df[metadata_column].tolist()
+            if self.is_large_dataset(len(texts)):
+                embeddings = self.embed_texts_chunked(texts)
+            else:
+                embeddings = self.embed_texts(texts)
+            del texts
+            return self._cluster_embeddings(df, embeddings, metadata_column)
+
+        except Exception as e:
+            raise Exception(f"Clustering pipeline failed: {str(e)}") from e
+
+    async def aprocess_clustering(self, data_path: str, metadata_column: str) -> dict:
+        """Async variant of process_clustering that keeps the event loop free while embedding and clustering"""
+        try:
+            df = self._prepare_dataframe(data_path, metadata_column)
+            texts = df[metadata_column].tolist()
+            if self.is_large_dataset(len(texts)):
+                embeddings = await self.aembed_texts_chunked(texts)
+            else:
+                embeddings = await self.aembed_texts(texts)
+            del texts
+            # UMAP and KMeans are CPU bound, so run them off the event loop
+            return await asyncio.to_thread(self._cluster_embeddings, df, embeddings, metadata_column)
 
         except Exception as e:
             raise Exception(f"Clustering pipeline failed: {str(e)}") from e
 
+    async def aassign_keywords(self, model: FittedClusterModel, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Embed only the new texts and place them on the nearest centroid of a
+        fitted model. The Cluster must be configured with model.openai_model.
+        """
+        embeddings = await self.aembed_texts(texts)
+        return await asyncio.to_thread(model.assign, embeddings)
+
 # Example usage:
 # if __name__ == "__main__":
 #     # Create configuration
@@ -0,0 +1,166 @@
+import os
+import threading
+import multiprocessing
+import numpy as np
+from typing import Optional, Tuple, List
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_score, calinski_harabasz_score
+from dotenv import load_dotenv
+load_dotenv()
+
+SCORERS = ("silhouette", "calinski_harabasz")
+
+# One pool per process, shared by every sweep. "process" uses a forkserver
+# (spawn where unavailable) context: sweeps run on request threads, and
+# forking a threaded worker can copy held locks into the child. "thread"
+# skips worker processes entirely (KMeans and the scorers release the GIL
+# in their numeric kernels).
+K_SWEEP_EXECUTOR = os.environ.get("K_SWEEP_EXECUTOR", "process").lower()
+K_SWEEP_MAX_WORKERS = int(os.environ.get("K_SWEEP_MAX_WORKERS", os.cpu_count() or 1))
+
+_pool: Optional[Executor] = None
+_pool_lock = threading.Lock()
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _thread_pool() -> Executor:
+    return ThreadPoolExecutor(max_workers=K_SWEEP_MAX_WORKERS, thread_name_prefix="k-sweep")
+
+
+def get_sweep_pool() -> Executor:
+    """Process-wide k-sweep pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if K_SWEEP_EXECUTOR == "thread":
+                _pool = _thread_pool()
+            else:
+                try:
+                    _pool = ProcessPoolExecutor(max_workers=K_SWEEP_MAX_WORKERS, mp_context=_mp_context())
+                except (OSError, NotImplementedError, ValueError) as e:
+                    print(f"K sweep process pool unavailable ({e}), using threads")
+                    _pool = _thread_pool()
+        return _pool
+
+
+def _discard_pool(pool: Executor):
+    """Drop a broken pool so the next sweep starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def score_k(
+    embeddings: np.ndarray,
+    n_clusters: int,
+    random_state: int,
+    n_init: int = 3,
+    criterion: str = "silhouette",
+    sample_size: Optional[int] = None,
+) -> Tuple[int, Optional[float]]:
+    """Fit KMeans for one k and score it. Module-level so it can be sent to a process pool."""
+    try:
+        kmeans = KMeans(
+            n_clusters=n_clusters,
+            init="k-means++",
+            random_state=random_state,
+            n_init=n_init
+        )
+        labels = kmeans.fit_predict(embeddings)
+
+        # need at least 2 clusters for either criterion
+        if len(np.unique(labels)) < 2:
+            print(f"Only one cluster formed with n_clusters={n_clusters}, skipping")
+            return n_clusters, None
+
+        if criterion == "calinski_harabasz":
+            return n_clusters, float(calinski_harabasz_score(embeddings, labels))
+
+        if sample_size and sample_size < embeddings.shape[0]:
+            score = silhouette_score(embeddings, labels, sample_size=sample_size, random_state=random_state)
+        else:
+            score = silhouette_score(embeddings, labels)
+        return n_clusters, float(score)
+
+    except Exception as e:
+        print(f"Error during clustering with {n_clusters} clusters: {e}")
+        return n_clusters, None
+
+
+def sweep_k(
+    embeddings: np.ndarray,
+    k_values: List[int],
+    random_state: int,
+    n_init: int = 3,
+    criterion: str = "silhouette",
+    sample_size: Optional[int] = None,
+    n_jobs: Optional[int] = None,
+    patience: Optional[int] = None,
+) -> List[Tuple[int, float]]:
+    """
+    Score candidate k values, spread across the shared sweep pool.
+
+    k values are evaluated in waves of n_jobs (at most K_SWEEP_MAX_WORKERS)
+    in increasing order. When
+    patience is set, the sweep stops once that many consecutive k values
+    have failed to beat the best score so far.
+
+    Returns [(k, score)] for every k that produced a valid score.
+    """
+    if criterion not in SCORERS:
+        raise ValueError(f"Unknown k-sweep criterion '{criterion}', expected one of {SCORERS}")
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    n_jobs = max(1, min(int(n_jobs), len(k_values), K_SWEEP_MAX_WORKERS))
+    args = (random_state, n_init, criterion, sample_size)
+
+    scores = []
+    best = -np.inf
+    since_best = 0
+
+    def consume(results) -> bool:
+        nonlocal best, since_best
+        for k, score in results:
+            if score is None:
+                continue
+            scores.append((k, score))
+            if score > best:
+                best = score
+                since_best = 0
+            else:
+                since_best += 1
+            if patience and since_best >= patience:
+                print(f"Stopping k sweep at k={k}, no improvement for {patience} values")
+                return True
+        return False
+
+    if n_jobs == 1:
+        for k in k_values:
+            if consume([score_k(embeddings, k, *args)]):
+                break
+        return scores
+
+    pool = get_sweep_pool()
+    for i in range(0, len(k_values), n_jobs):
+        wave = k_values[i:i+n_jobs]
+        try:
+            results = list(pool.map(score_k, [embeddings] * len(wave), wave, *[[a] * len(wave) for a in args]))
+        except BrokenProcessPool as e:
+            # A worker died (e.g. killed for memory); finish this sweep in-process
+            print(f"K sweep pool broke ({e}), scoring the remaining k values in-process")
+            _discard_pool(pool)
+            for k in k_values[i:]:
+                if consume([score_k(embeddings, k, *args)]):
+                    break
+            return scores
+        if consume(results):
+            break
+    return scores
@@ -0,0 +1,63 @@
+import os
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Tuple
+from umap.umap_ import nearest_neighbors
+
+KNN_CACHE_MAX_ENTRIES = int(os.environ.get("KNN_CACHE_MAX_ENTRIES", 4))
+
+_cache: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def embeddings_fingerprint(embeddings: np.ndarray) -> str:
+    data = np.ascontiguousarray(embeddings, dtype=np.float32)
+    digest = hashlib.sha1(str(data.shape).encode("utf-8"))
+    digest.update(data.tobytes())
+    return digest.hexdigest()
+
+
+def compute_knn_graph(embeddings: np.ndarray, n_neighbors: int, metric: str = "euclidean", random_state: int = 42):
+    """
+    Build (or reuse) the approximate kNN graph UMAP needs, using pynndescent.
+
+    Graphs are cached in-process per (embedding set, metric) and a cached
+    graph built with more neighbours is sliced down rather than rebuilt, so
+    repeated reductions with different min_dist / n_components / seeds skip
+    the neighbour search entirely.
+
+    Returns (knn_indices, knn_dists, knn_search_index), the shape expected by
+    umap.UMAP(precomputed_knn=...).
+    """
+    key = (embeddings_fingerprint(embeddings), metric)
+
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0].shape[1] >= n_neighbors:
+            _cache.move_to_end(key)
+            knn_indices, knn_dists, search_index = cached
+            print(f"Reusing cached kNN graph ({knn_indices.shape[1]} neighbours)")
+            return knn_indices[:, :n_neighbors], knn_dists[:, :n_neighbors], search_index
+
+    knn_indices, knn_dists, search_index = nearest_neighbors(
+        embeddings,
+        n_neighbors=n_neighbors,
+        metric=metric,
+        metric_kwds={},
+        angular=False,
+        random_state=np.random.RandomState(random_state),
+        low_memory=True,
+        use_pynndescent=True,
+        n_jobs=-1,
+        verbose=False
+    )
+
+    with _cache_lock:
+        _cache[key] = (knn_indices, knn_dists, search_index)
+        _cache.move_to_end(key)
+        while len(_cache) > KNN_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+    return knn_indices, knn_dists, search_index
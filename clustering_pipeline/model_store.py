@@ -0,0 +1,101 @@
+import io
+import joblib
+import numpy as np
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+DRIFT_THRESHOLD = 1.5  # refit once new keywords sit this many times further from their centroid than the fitted ones
+
+
+@dataclass
+class FittedClusterModel:
+    """Everything needed to place new keywords into an existing clustering without refitting"""
+    reducer: object  # fitted umap.UMAP
+    centers: np.ndarray
+    openai_model: str
+    baseline_distance: float  # mean distance of the fitted points to their centroid
+    n_samples: int
+    cluster_keywords: Dict[int, List[str]] = field(default_factory=dict)
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        joblib.dump(self, buffer, compress=3)
+        return buffer.getvalue()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "FittedClusterModel":
+        # joblib.load also reads the plain pickles stored before joblib was used
+        return joblib.load(io.BytesIO(data))
+
+    def assign(self, embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Project embeddings with the fitted reducer and return (labels, distance to nearest centroid)"""
+        reduced = self.reducer.transform(embeddings)
+        distances = np.linalg.norm(reduced[:, None, :] - self.centers[None, :, :], axis=2)
+        labels = distances.argmin(axis=1)
+        return labels, distances[np.arange(len(labels)), labels]
+
+    def drift(self, distances: np.ndarray) -> float:
+        """Ratio of the new points' mean centroid distance to the one seen at fit time"""
+        if len(distances) == 0 or self.baseline_distance <= 0:
+            return 0.0
+        return float(np.mean(distances) / self.baseline_distance)
+
+
+def build_fitted_model(reducer, centers: np.ndarray, reduced: np.ndarray, labels: np.ndarray,
+                       texts: List[str], openai_model: str) -> FittedClusterModel:
+    distances = np.linalg.norm(reduced - centers[labels], axis=1)
+    cluster_keywords: Dict[int, List[str]] = {}
+    for text, label in zip(texts, labels):
+        cluster_keywords.setdefault(int(label), []).append(str(text))
+
+    return FittedClusterModel(
+        reducer=reducer,
+        centers=np.asarray(centers, dtype=np.float32),
+        openai_model=openai_model,
+        baseline_distance=float(distances.mean()) if len(distances) else 0.0,
+        n_samples=len(texts),
+        cluster_keywords=cluster_keywords
+    )
+
+
+def page_for_cluster(json_data: list, keywords: List[str]) -> Optional[dict]:
+    """Pick the page holding most of a cluster's keywords"""
+    wanted = {k.lower() for k in keywords}
+    votes = Counter()
+    for index, page in enumerate(json_data):
+        for kw in page.get("Keywords", []):
+            if isinstance(kw, dict) and str(kw.get("Keyword", "")).lower() in wanted:
+                votes[index] += 1
+    if not votes:
+        return None
+    return json_data[votes.most_common(1)[0][0]]
+
+
+def append_keyword_to_page(page: dict, keyword: str, avg_monthly_searches: int) -> dict:
+    """Append a keyword to a page, continuing its Keyword_id numbering"""
+    page_id = page.get("Page_title_id", "")
+    keywords = page.setdefault("Keywords", [])
+    next_index = 1
+    for kw in keywords:
+        try:
+            next_index = max(next_index, int(str(kw.get("Keyword_id", "")).split(".")[1]) + 1)
+        except (IndexError, ValueError):
+            continue
+
+    item = {
+        "Keyword_id": f"{page_id}.{next_index}",
+        "Keyword": keyword,
+        "Avg_Monthly_Searches": avg_monthly_searches
+    }
+    keywords.append(item)
+    return item
+
+
+def existing_keywords(json_data: list) -> List[str]:
+    return [
+        str(kw["Keyword"])
+        for page in json_data
+        for kw in page.get("Keywords", [])
+        if isinstance(kw, dict) and "Keyword" in kw
+    ]
@@ -1,4 +1,3 @@
-import spacy
 import os
 import numpy as np
 from openai import OpenAI
@@ -19,10 +18,10 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 # from Prompt.prompt_content_generation import keyword_matching
 from content_generation.Prompt.prompt_content_generation import keyword_matching
 from content_generation.utils import clean_string
+from nlp_service import extract_nouns_and_chunks
 load_dotenv()
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-nlp = spacy.load("en_core_web_sm")
 model_name = os.environ.get("OPENAI_MODEL")
 
 
@@ -67,11 +66,11 @@ def keywords_blog(keywords, text):
     threshold = 0.75  
     results = []
 
-    for sentence in sentences:
-        sentence_doc = nlp(sentence)
-     
-        nouns = [token.text for token in sentence_doc if token.pos_ == "NOUN"]
-        noun_phrases = [chunk.text for chunk in sentence_doc.noun_chunks]
+    parsed_sentences = extract_nouns_and_chunks(sentences)
+
+    for sentence, (nouns, noun_phrases) in zip(sentences, parsed_sentences):
+        nouns = list(nouns)
+        noun_phrases = list(noun_phrases)
         
         noun_matches = []
         noun_phrase_matches = []
@@ -0,0 +1,297 @@
+import os
+import sys
+import math
+import time
+import uuid
+import random
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from sqlalchemy.orm import Session
+from google.ads.googleads.errors import GoogleAdsException
+from google.auth.exceptions import RefreshError
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from google_ads.clinet import get_client, reset_client_on_auth_error
+from google_ads.keyword_cache import keyword_idea_cache, seed_key
+from google_ads import seo_planner, ppc_process
+from auth.database import SessionLocal
+from auth.models import KeywordBulkJob
+from utils import refund_api_calls
+from dotenv import load_dotenv
+load_dotenv()
+
+# KeywordSeed takes at most 20 keywords; historical metrics up to 10k per request
+IDEA_SEED_CHUNK_SIZE = 20
+HISTORICAL_CHUNK_SIZE = 10000
+# Keyword Planning requests are rate limited per customer, so keep this low
+ADS_BULK_MAX_CONCURRENCY = int(os.environ.get("ADS_BULK_MAX_CONCURRENCY", 2))
+ADS_BULK_MAX_RETRIES = int(os.environ.get("ADS_BULK_MAX_RETRIES", 5))
+ADS_BULK_MAX_SEEDS = int(os.environ.get("ADS_BULK_MAX_SEEDS", 5000))
+# Bulk requests are charged one API call per this many seeds
+ADS_BULK_SEEDS_PER_CALL = int(os.environ.get("ADS_BULK_SEEDS_PER_CALL", 100))
+# Larger seed lists run as a background job instead of inside the request
+ADS_BULK_SYNC_MAX_SEEDS = int(os.environ.get("ADS_BULK_SYNC_MAX_SEEDS", 100))
+
+# Row formatter per keyword flavour (see seo_planner / ppc_process)
+IDEA_FORMATTERS = {
+    "seo": seo_planner.format_keyword_idea,
+    "ppc": ppc_process.format_keyword_idea,
+}
+NUMERIC_FIELDS = ["Avg_Monthly_Searches", "LowTopOfPageBid", "HighTopOfPageBid"]
+
+
+def normalize_keyword(keyword: str) -> str:
+    return " ".join(str(keyword).lower().split())
+
+
+def dedupe_keywords(keywords: List[str]) -> List[str]:
+    """Drop empty and duplicate (after normalization) keywords, keeping first spelling and order"""
+    seen = set()
+    unique = []
+    for keyword in keywords or []:
+        normalized = normalize_keyword(keyword)
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            unique.append(str(keyword).strip())
+    return unique
+
+
+def chunk_keywords(keywords: List[str], size: int) -> List[List[str]]:
+    return [keywords[i:i + size] for i in range(0, len(keywords), size)]
+
+
+def _is_quota_error(ex: GoogleAdsException) -> bool:
+    code = ex.error.code() if hasattr(ex.error, "code") else None
+    if getattr(code, "name", "") == "RESOURCE_EXHAUSTED":
+        return True
+    return any("quota_error" in str(error.error_code) for error in ex.failure.errors)
+
+
+def _with_backoff(call: Callable, max_retries: int = ADS_BULK_MAX_RETRIES, backoff_base: float = 2.0):
+    """Run call(), retrying Ads quota errors with exponential backoff and jitter"""
+    attempt = 0
+    while True:
+        try:
+            return call()
+        except RefreshError as ex:
+            reset_client_on_auth_error(ex)
+            raise
+        except GoogleAdsException as ex:
+            if not _is_quota_error(ex) or attempt >= max_retries:
+                reset_client_on_auth_error(ex)
+                raise
+            delay = backoff_base * (2 ** attempt) + random.uniform(0, backoff_base)
+            print(f"Google Ads quota exhausted; retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+
+def _idea_request(client, customer_id, location_ids, language_id, keywords):
+    request = client.get_type("GenerateKeywordIdeasRequest")
+    request.customer_id = customer_id
+    request.language = f"languageConstants/{language_id}"
+    request.geo_target_constants.extend([f"geoTargetConstants/{loc}" for loc in location_ids])
+    request.keyword_seed.keywords.extend(keywords)
+    return request
+
+
+def _fetch_idea_chunk(kind, customer_id, location_ids, language_id, keywords) -> List[Dict]:
+    def fetch():
+        client = get_client()
+        service = client.get_service("KeywordPlanIdeaService")
+        request = _idea_request(client, customer_id, location_ids, language_id, keywords)
+        response = _with_backoff(lambda: list(service.generate_keyword_ideas(request=request)))
+        return [IDEA_FORMATTERS[kind](idea, keyword_id) for keyword_id, idea in enumerate(response)]
+
+    # Chunks share the single-request cache, so repeated bulk jobs are cheap too
+    return keyword_idea_cache.get_or_fetch(seed_key(kind, customer_id, keywords, location_ids, language_id), fetch)
+
+
+def merge_keyword_rows(rows: List[Dict], aggregate: str = "max") -> List[Dict]:
+    """
+    Merge rows from several chunks into one row per normalized keyword.
+
+    Numeric fields take the max (or the mean with aggregate="avg"); the other
+    fields come from the highest-volume occurrence. Rows are ordered by
+    volume and Keyword_ID is renumbered.
+    """
+    if not rows:
+        return []
+    if aggregate not in ("max", "avg"):
+        raise ValueError("aggregate must be 'max' or 'avg'")
+
+    df = pd.DataFrame(rows)
+    df["_key"] = df["Keyword"].map(normalize_keyword)
+    df = df.sort_values("Avg_Monthly_Searches", ascending=False, kind="stable")
+
+    grouped = df.groupby("_key", sort=False)
+    merged = grouped.first()
+    numeric = [field for field in NUMERIC_FIELDS if field in df.columns]
+    merged[numeric] = grouped[numeric].max() if aggregate == "max" else grouped[numeric].mean()
+    merged["Avg_Monthly_Searches"] = merged["Avg_Monthly_Searches"].round().astype(int)
+
+    merged = merged.sort_values("Avg_Monthly_Searches", ascending=False, kind="stable").reset_index(drop=True)
+    merged["Keyword_ID"] = merged.index.astype(str)
+    return merged[[column for column in rows[0] if column in merged.columns]].to_dict("records")
+
+
+def bulk_keyword_ideas(keywords: List[str], location_ids, language_id, kind: str = "seo",
+                       aggregate: str = "max", max_workers: int = ADS_BULK_MAX_CONCURRENCY) -> List[Dict]:
+    """
+    Keyword ideas for any number of seeds: the seeds are deduplicated, split
+    into KeywordSeed-sized chunks, fetched concurrently (bounded, with
+    quota backoff) and merged by normalized keyword.
+    """
+    if kind not in IDEA_FORMATTERS:
+        raise ValueError(f"Unknown keyword kind: {kind}")
+    seeds = dedupe_keywords(keywords)
+    if len(seeds) > ADS_BULK_MAX_SEEDS:
+        raise ValueError(f"Please enter at most {ADS_BULK_MAX_SEEDS} keywords.")
+    if not seeds:
+        return []
+
+    customer_id = os.environ.get("GOOGLE_ADS_CUSTOMER_ID")
+    chunks = chunk_keywords(seeds, IDEA_SEED_CHUNK_SIZE)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        results = list(executor.map(
+            lambda chunk: _fetch_idea_chunk(kind, customer_id, location_ids, language_id, chunk), chunks
+        ))
+
+    print(f"Fetched keyword ideas for {len(seeds)} seeds in {len(chunks)} chunks")
+    return merge_keyword_rows([row for rows in results for row in rows], aggregate)
+
+
+def _fetch_historical_chunk(customer_id, location_ids, language_id, keywords) -> List[Dict]:
+    client = get_client()
+    service = client.get_service("KeywordPlanIdeaService")
+    request = client.get_type("GenerateKeywordHistoricalMetricsRequest")
+    request.customer_id = customer_id
+    request.language = f"languageConstants/{language_id}"
+    request.geo_target_constants.extend([f"geoTargetConstants/{loc}" for loc in location_ids])
+    request.keywords.extend(keywords)
+    request.keyword_plan_network = client.enums.KeywordPlanNetworkEnum.GOOGLE_SEARCH
+    response = _with_backoff(lambda: service.generate_keyword_historical_metrics(request=request))
+
+    rows = []
+    for result in response.results:
+        metrics = result.keyword_metrics
+        rows.append({
+            "Keyword": result.text,
+            "Close_Variants": list(result.close_variants),
+            "Avg_Monthly_Searches": metrics.avg_monthly_searches if metrics else 0,
+            "Competition": metrics.competition.name if metrics and metrics.competition else "UNKNOWN",
+            "LowTopOfPageBid": metrics.low_top_of_page_bid_micros / 1_000_000 if metrics and metrics.low_top_of_page_bid_micros else 0.0,
+            "HighTopOfPageBid": metrics.high_top_of_page_bid_micros / 1_000_000 if metrics and metrics.high_top_of_page_bid_micros else 0.0,
+        })
+    return rows
+
+
+def keyword_historical_metrics(keywords: List[str], location_ids, language_id,
+                               max_workers: int = ADS_BULK_MAX_CONCURRENCY) -> List[Dict]:
+    """
+    Exact search volumes for a keyword list via GenerateKeywordHistoricalMetrics,
+    one row per deduplicated input keyword (close variants share a row).
+    """
+    seeds = dedupe_keywords(keywords)
+    if len(seeds) > ADS_BULK_MAX_SEEDS:
+        raise ValueError(f"Please enter at most {ADS_BULK_MAX_SEEDS} keywords.")
+    if not seeds:
+        return []
+
+    customer_id = os.environ.get("GOOGLE_ADS_CUSTOMER_ID")
+    chunks = chunk_keywords(seeds, HISTORICAL_CHUNK_SIZE)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        results = list(executor.map(
+            lambda chunk: _fetch_historical_chunk(customer_id, location_ids, language_id, chunk), chunks
+        ))
+
+    rows = [row for chunk_rows in results for row in chunk_rows]
+    for keyword_id, row in enumerate(rows):
+        row["Keyword_ID"] = str(keyword_id)
+    return rows
+
+
+def bulk_seeds(keywords: List[str]) -> List[str]:
+    """Deduplicated seeds of a bulk request; raises ValueError above ADS_BULK_MAX_SEEDS"""
+    seeds = dedupe_keywords(keywords)
+    if len(seeds) > ADS_BULK_MAX_SEEDS:
+        raise ValueError(f"Please enter at most {ADS_BULK_MAX_SEEDS} keywords.")
+    return seeds
+
+
+def bulk_call_count(seeds: List[str]) -> int:
+    """API calls a bulk request costs: one per ADS_BULK_SEEDS_PER_CALL seeds"""
+    return max(1, math.ceil(len(seeds) / max(1, ADS_BULK_SEEDS_PER_CALL)))
+
+
+def run_bulk_keywords(kind: str, mode: str, keywords: List[str], location_ids, language_id,
+                      aggregate: str = "max") -> List[Dict]:
+    if mode == "historical":
+        return keyword_historical_metrics(keywords, location_ids, language_id)
+    return bulk_keyword_ideas(keywords, location_ids, language_id, kind=kind, aggregate=aggregate)
+
+
+def bulk_job_to_dict(job: KeywordBulkJob) -> Dict:
+    return {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "mode": job.mode,
+        "seed_count": job.seed_count,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def create_bulk_job(db: Session, user_id: int, kind: str, mode: str, seed_count: int,
+                    calls_charged: int = 0) -> KeywordBulkJob:
+    job = KeywordBulkJob(
+        job_id=uuid.uuid4().hex,
+        user_id=user_id,
+        kind=kind,
+        mode=mode,
+        seed_count=seed_count,
+        calls_charged=calls_charged,
+        status="queued",
+        created_at=datetime.utcnow(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_bulk_job(db: Session, job_id: str, user_id: int, kind: str) -> Optional[KeywordBulkJob]:
+    return db.query(KeywordBulkJob).filter_by(job_id=job_id, user_id=user_id, kind=kind).first()
+
+
+def run_bulk_job(job_id: str, kind: str, mode: str, keywords: List[str], location_ids, language_id,
+                 aggregate: str = "max"):
+    """
+    Background task: fetch a bulk request and store its rows on the job.
+    A failed job refunds the API calls charged for it.
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(KeywordBulkJob).filter_by(job_id=job_id).first()
+        if job is None:
+            return
+        job.status = "running"
+        db.commit()
+
+        try:
+            job.result = run_bulk_keywords(kind, mode, keywords, location_ids, language_id, aggregate)
+            job.status = "completed"
+        except Exception as e:
+            print(f"❌ Error in bulk keyword job {job_id}: {str(e)}")
+            job.status = "failed"
+            job.error = str(e) if isinstance(e, ValueError) else "Failed to fetch keyword data from Google Ads API."
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        if job.status == "failed":
+            refund_api_calls(db, job.user_id, f"{kind}_keywords", job.calls_charged or 0)
+    finally:
+        db.close()
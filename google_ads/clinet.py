@@ -1,7 +1,9 @@
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 from google.oauth2 import service_account
+from google.auth.exceptions import RefreshError
 import os
+import threading
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -34,17 +36,25 @@ YAML_FILE_PATH = os.environ.get("YAML_FILE_PATH")
 
 
 # get_client()
-def get_client():
-    """Create and return a Google Ads API client using service account credentials."""
-    # Get the path to the service account JSON key file
-    SERVICE_ACCOUNT_FILE = os.environ.get("SERVICE_ACCOUNT_FILE")
+_client = None
+_client_signature = None
+_client_lock = threading.Lock()
 
-    if not os.path.exists(SERVICE_ACCOUNT_FILE):
-        raise ValueError(f"Service account file not found at: {SERVICE_ACCOUNT_FILE}")
-    
+
+def _credentials_signature(service_account_file):
+    """Changes whenever the service-account file or Ads settings change"""
+    return (
+        service_account_file,
+        os.path.getmtime(service_account_file),
+        os.environ.get("DEVELOPER_TOKEN"),
+        os.environ.get("GOOGLE_ADS_CUSTOMER_ID"),
+    )
+
+
+def _build_client(service_account_file):
     # Load credentials from the service account file
     credentials = service_account.Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_FILE,
+        service_account_file,
         scopes=['https://www.googleapis.com/auth/adwords']
     )
     
@@ -62,4 +72,60 @@ def get_client():
         developer_token=DEVELOPER_TOKEN,
         use_proto_plus=True,
         login_customer_id=CUSTOMER_ID
-    )
\ No newline at end of file
+    )
+
+
+def get_client():
+    """
+    Return the process-wide Google Ads API client (service account credentials).
+
+    The client is built once and reused; google-auth refreshes its access
+    token on its own. It is rebuilt when the service-account file or the
+    Ads settings change, or after reset_client().
+    """
+    global _client, _client_signature
+    # Get the path to the service account JSON key file
+    SERVICE_ACCOUNT_FILE = os.environ.get("SERVICE_ACCOUNT_FILE")
+
+    if not SERVICE_ACCOUNT_FILE or not os.path.exists(SERVICE_ACCOUNT_FILE):
+        raise ValueError(f"Service account file not found at: {SERVICE_ACCOUNT_FILE}")
+
+    signature = _credentials_signature(SERVICE_ACCOUNT_FILE)
+    with _client_lock:
+        if _client is None or _client_signature != signature:
+            _client = _build_client(SERVICE_ACCOUNT_FILE)
+            _client_signature = signature
+        return _client
+
+
+def reset_client():
+    """Drop the cached client so the next get_client() reloads the credentials"""
+    global _client, _client_signature
+    with _client_lock:
+        _client = None
+        _client_signature = None
+
+
+def is_auth_error(ex: Exception) -> bool:
+    """True when the Ads API (or the token endpoint) rejected the client's credentials"""
+    if isinstance(ex, RefreshError):
+        return True
+    if isinstance(ex, GoogleAdsException):
+        code = ex.error.code() if hasattr(ex.error, "code") else None
+        if getattr(code, "name", "") == "UNAUTHENTICATED":
+            return True
+        return any("authentication_error" in str(error.error_code) for error in ex.failure.errors)
+    return False
+
+
+def reset_client_on_auth_error(ex: Exception) -> bool:
+    """
+    Call from Ads error handlers: drops the cached client when ex is an
+    authentication failure, so a revoked or rotated key is picked up on the
+    next request instead of failing until the key file changes.
+    """
+    if not is_auth_error(ex):
+        return False
+    print("Google Ads credentials were rejected; the client will be rebuilt on the next request")
+    reset_client()
+    return True
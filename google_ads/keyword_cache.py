@@ -0,0 +1,74 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+load_dotenv()
+
+# Keyword Planner volumes are monthly figures, so a day-old answer is still current
+KEYWORD_IDEAS_CACHE_TTL = int(os.environ.get("KEYWORD_IDEAS_CACHE_TTL", 86400))
+KEYWORD_IDEAS_CACHE_SIZE = int(os.environ.get("KEYWORD_IDEAS_CACHE_SIZE", 1024))
+
+
+def seed_key(kind: str, customer_id, keywords: Iterable[str], location_ids, language_id) -> Tuple:
+    """Cache key for a seed query; keyword case, spacing, order and duplicates do not matter"""
+    normalized = tuple(sorted({" ".join(str(keyword).lower().split()) for keyword in keywords or []}))
+    locations = tuple(sorted(str(location_id) for location_id in location_ids or []))
+    return (kind, str(customer_id), normalized, locations, str(language_id))
+
+
+class KeywordIdeaCache:
+    """
+    Thread-safe LRU cache of keyword-idea results with a TTL.
+
+    Only successful (non-None) results are stored, and callers always get
+    their own copy of the rows so they can filter or annotate them freely.
+    """
+
+    def __init__(self, ttl_seconds: int = KEYWORD_IDEAS_CACHE_TTL, max_entries: int = KEYWORD_IDEAS_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _copy(rows: List[Dict]) -> List[Dict]:
+        return [dict(row) for row in rows]
+
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, rows = entry
+            if time.monotonic() - stored_at >= self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return self._copy(rows)
+
+    def put(self, key: Tuple, rows: Optional[List[Dict]]):
+        if rows is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), self._copy(rows))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_fetch(self, key: Tuple, fetch: Callable[[], Optional[List[Dict]]]) -> Optional[List[Dict]]:
+        rows = self.get(key)
+        if rows is not None:
+            print(f"Keyword ideas cache hit for {len(key[2])} seed keywords")
+            return rows
+        rows = fetch()
+        self.put(key, rows)
+        return self._copy(rows) if rows is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+keyword_idea_cache = KeywordIdeaCache()
@@ -3,7 +3,9 @@ from google.ads.googleads.errors import GoogleAdsException
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from google_ads.clinet import get_client
+from google.auth.exceptions import RefreshError
+from google_ads.clinet import get_client, reset_client_on_auth_error
+from google_ads.keyword_cache import keyword_idea_cache, seed_key
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -31,6 +33,20 @@ def get_currency_for_location(client, customer_id, location_id):
         return None # Fallback to USD
     
 
+def format_keyword_idea(idea, keyword_id):
+    """One GenerateKeywordIdeas result as a PPC keyword row (volume, competition, bids)."""
+    metrics = idea.keyword_idea_metrics
+    return {
+        "Keyword_ID": str(keyword_id),
+        "Keyword": idea.text,
+        "Avg_Monthly_Searches": metrics.avg_monthly_searches if metrics else 0,
+        "Competition": metrics.competition.name if metrics and metrics.competition else "UNKNOWN",
+        "LowTopOfPageBid": metrics.low_top_of_page_bid_micros / 1_000_000 if metrics and metrics.low_top_of_page_bid_micros else 0.0,
+        "HighTopOfPageBid": metrics.high_top_of_page_bid_micros / 1_000_000 if metrics and metrics.high_top_of_page_bid_micros else 0.0
+        # "Currency": currency
+    }
+
+
 def generate_keyword_ideas(client, customer_id, location_ids, language_id, keywords):
     """Fetch keyword ideas from Google Ads API."""
     try:
@@ -54,21 +70,7 @@ def generate_keyword_ideas(client, customer_id, location_ids, language_id, keywo
         response = keyword_plan_idea_service.generate_keyword_ideas(request=request)
 
         # Process and store the results
-        keyword_suggestions = []
-        Keyword_id = 0
-        for idea in response:
-            metrics = idea.keyword_idea_metrics
-            keyword_data = {
-                "Keyword_ID": str(Keyword_id),
-                "Keyword": idea.text,
-                "Avg_Monthly_Searches": metrics.avg_monthly_searches if metrics else 0,
-                "Competition": metrics.competition.name if metrics and metrics.competition else "UNKNOWN",
-                "LowTopOfPageBid": metrics.low_top_of_page_bid_micros / 1_000_000 if metrics and metrics.low_top_of_page_bid_micros else 0.0,
-                "HighTopOfPageBid": metrics.high_top_of_page_bid_micros / 1_000_000 if metrics and metrics.high_top_of_page_bid_micros else 0.0
-                # "Currency": currency
-            }
-            keyword_suggestions.append(keyword_data)
-            Keyword_id += 1
+        keyword_suggestions = [format_keyword_idea(idea, keyword_id) for keyword_id, idea in enumerate(response)]
         return keyword_suggestions    
             
     except GoogleAdsException as ex:
@@ -76,33 +78,38 @@ def generate_keyword_ideas(client, customer_id, location_ids, language_id, keywo
         for error in ex.failure.errors:
             print(f"\tError code: {error.error_code}")
             print(f"\tError message: {error.message}")
+        reset_client_on_auth_error(ex)
+        return None
+    except RefreshError as ex:
+        print(f"❌ Google Ads token refresh failed: {ex}")
+        reset_client_on_auth_error(ex)
         return None
 
 def ppc_keywords_main(keywords, location_ids=None, language_id=None):
     """Main function to retrieve keyword ideas using Google Ads API."""
-    try:
-        # Load client from YAML config file
-        client = get_client()
-    except Exception as e:
-        print(f"❌ Error loading client configuration: {e}")
-        return
-    
     if location_ids is None:
         location_ids = [2840]  # Default: United States
     if language_id is None:     
         language_id = "1000"  # Default: English
     customer_id = os.environ.get("GOOGLE_ADS_CUSTOMER_ID") 
-    
-    # Generate keyword ideas
-    result = generate_keyword_ideas(
-        client=client,
-        customer_id=customer_id,
-        location_ids=location_ids,
-        language_id=language_id,
-        keywords=keywords
-    )
-
-    return result
+
+    def fetch():
+        try:
+            # Shared, process-wide client
+            client = get_client()
+        except Exception as e:
+            print(f"❌ Error loading client configuration: {e}")
+            return None
+        return generate_keyword_ideas(
+            client=client,
+            customer_id=customer_id,
+            location_ids=location_ids,
+            language_id=language_id,
+            keywords=keywords
+        )
+
+    # Generate keyword ideas (repeat seeds are answered from the cache)
+    return keyword_idea_cache.get_or_fetch(seed_key("ppc", customer_id, keywords, location_ids, language_id), fetch)
 
 if __name__ == "__main__":
    
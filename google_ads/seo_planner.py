@@ -3,7 +3,9 @@ from google.ads.googleads.errors import GoogleAdsException
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from google_ads.clinet import get_client
+from google.auth.exceptions import RefreshError
+from google_ads.clinet import get_client, reset_client_on_auth_error
+from google_ads.keyword_cache import keyword_idea_cache, seed_key
 from dotenv import load_dotenv
 load_dotenv()
 import os
@@ -33,6 +35,16 @@ def get_language_resource_name(client, customer_id, language_id):
         return None
     
 
+def format_keyword_idea(idea, keyword_id):
+    """One GenerateKeywordIdeas result as an SEO keyword row."""
+    metrics = idea.keyword_idea_metrics
+    return {
+        "Keyword_ID": str(keyword_id),
+        "Keyword": idea.text,
+        "Avg_Monthly_Searches": metrics.avg_monthly_searches if metrics else 0,
+    }
+
+
 def generate_keyword_ideas(client, customer_id, location_ids, language_id, keywords):
     """Fetch keyword ideas from Google Ads API."""
     try:
@@ -63,17 +75,7 @@ def generate_keyword_ideas(client, customer_id, location_ids, language_id, keywo
         keyword_ideas = keyword_plan_idea_service.generate_keyword_ideas(request=request)
         
         # Process results into a list of dictionaries
-        data = []
-        keyword_id = 0
-        for idea in keyword_ideas:
-            metrics = idea.keyword_idea_metrics
-            data.append({
-                "Keyword_ID": str(keyword_id),
-                "Keyword": idea.text,
-                "Avg_Monthly_Searches": metrics.avg_monthly_searches if metrics else 0,
-            })
-
-            keyword_id += 1
+        data = [format_keyword_idea(idea, keyword_id) for keyword_id, idea in enumerate(keyword_ideas)]
 
         # print(data)
         return data    
@@ -83,12 +85,14 @@ def generate_keyword_ideas(client, customer_id, location_ids, language_id, keywo
         for error in ex.failure.errors:
             print(f"\tError code: {error.error_code}")
             print(f"\tError message: {error.message}")
+        reset_client_on_auth_error(ex)
+        return None
+    except RefreshError as ex:
+        print(f"❌ Google Ads token refresh failed: {ex}")
+        reset_client_on_auth_error(ex)
         return None
 
 def seo_keywords_main(keywords, location_ids, language_id):
-    # Load client from YAML config file
-    client = get_client()
-    
     if location_ids is None:
         location_ids = [2826] 
     if language_id is None:     
@@ -96,17 +100,18 @@ def seo_keywords_main(keywords, location_ids, language_id):
     customer_id = os.environ.get("GOOGLE_ADS_CUSTOMER_ID") 
     # keywords = ["AI agent", "Database"]
     
-    # Generate keyword ideas
-    result = generate_keyword_ideas(
-        client=client,
-        customer_id=customer_id,
-        location_ids=location_ids,
-        language_id=language_id,
-        keywords=keywords
+    # Generate keyword ideas (repeat seeds are answered from the cache)
+    return keyword_idea_cache.get_or_fetch(
+        seed_key("seo", customer_id, keywords, location_ids, language_id),
+        lambda: generate_keyword_ideas(
+            client=get_client(),
+            customer_id=customer_id,
+            location_ids=location_ids,
+            language_id=language_id,
+            keywords=keywords
+        )
     )
 
-    return result
-
 if __name__ == "__main__":
     key = ["eis investment"]
     seo = seo_keywords_main(keywords=key, location_ids=None, language_id=None)
@@ -0,0 +1,176 @@
+import os
+import time
+import hashlib
+import threading
+import weakref
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import httplib2
+import google_auth_httplib2
+from googleapiclient.discovery import build, build_from_document
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    from googleapiclient.discovery_cache import get_static_doc
+except ImportError:  # google-api-python-client < 2.0 has no bundled documents
+    get_static_doc = None
+
+# Idle services older than this are dropped; a fresh one is built on demand
+GOOGLE_CLIENT_TTL_SECONDS = int(os.environ.get("GOOGLE_CLIENT_TTL_SECONDS", 1800))
+# Idle services kept per (API, version, credentials)
+GOOGLE_CLIENT_POOL_SIZE = int(os.environ.get("GOOGLE_CLIENT_POOL_SIZE", 8))
+GOOGLE_HTTP_TIMEOUT = int(os.environ.get("GOOGLE_HTTP_TIMEOUT", 120))
+
+
+@lru_cache(maxsize=None)
+def _discovery_document(api: str, version: str) -> Optional[str]:
+    """Discovery document bundled with the client library, read once per process"""
+    if get_static_doc is None:
+        return None
+    return get_static_doc(api, version)
+
+
+def credential_fingerprint(credentials) -> str:
+    """Stable hash of what identifies an OAuth credential (never the raw secrets)"""
+    scopes = getattr(credentials, "scopes", None) or []
+    raw = "|".join([
+        str(getattr(credentials, "token", "") or ""),
+        str(getattr(credentials, "refresh_token", "") or ""),
+        str(getattr(credentials, "client_id", "") or ""),
+        ",".join(sorted(scopes)),
+    ])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _unwrap(value):
+    return value._target if isinstance(value, _Held) else value
+
+
+def _hold(value, owner: "PooledService"):
+    """Wrap anything that can still reach the pooled service so it keeps owner alive"""
+    if callable(value) or type(value).__module__.startswith("googleapiclient"):
+        return _Held(value, owner)
+    return value
+
+
+class _Held:
+    """
+    A sub-resource, method or request reached through a PooledService.
+    It holds a reference to the proxy, so the service is not returned to
+    the pool while something derived from it (e.g. a pending request) is
+    still alive.
+    """
+
+    __slots__ = ("_target", "_owner")
+
+    def __init__(self, target, owner: "PooledService"):
+        self._target = target
+        self._owner = owner
+
+    def __getattr__(self, name):
+        return _hold(getattr(self._target, name), self._owner)
+
+    def __call__(self, *args, **kwargs):
+        args = [_unwrap(arg) for arg in args]
+        kwargs = {name: _unwrap(value) for name, value in kwargs.items()}
+        return _hold(self._target(*args, **kwargs), self._owner)
+
+
+class PooledService:
+    """
+    Thin proxy around a googleapiclient Resource checked out of a
+    GoogleClientFactory. It behaves like the service itself and hands the
+    service back to the pool once the proxy and everything reached through
+    it (sub-resources, requests) have been garbage collected.
+    """
+
+    __slots__ = ("_service", "__weakref__")
+
+    def __init__(self, service):
+        self._service = service
+
+    def __getattr__(self, name):
+        return _hold(getattr(self._service, name), self)
+
+
+class GoogleClientFactory:
+    """
+    Pool of built Google API services keyed by (API, version, credential
+    fingerprint).
+
+    googleapiclient services (and their httplib2 connections) are not
+    thread-safe, so each caller gets a service nobody else is using; when
+    the caller drops it and every request built from it, it goes back to
+    the pool with its open HTTP
+    connection and is reused by the next request for the same key. Services
+    are built from the library's static discovery documents, so no
+    discovery request is ever made.
+    """
+
+    def __init__(self, ttl_seconds: int = GOOGLE_CLIENT_TTL_SECONDS, pool_size: int = GOOGLE_CLIENT_POOL_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.pool_size = pool_size
+        self._idle: Dict[Tuple[str, str, str], List[Tuple[float, Any]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build(api: str, version: str, credentials):
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+        document = _discovery_document(api, version)
+        if document is None:
+            return build(api, version, http=http, cache_discovery=False)
+        return build_from_document(document, http=http)
+
+    def _evict_expired(self, now: float):
+        for key in list(self._idle):
+            fresh = [(created, service) for created, service in self._idle[key] if now - created < self.ttl_seconds]
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+
+    def _release(self, key: Tuple[str, str, str], created: float, service):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_size and time.monotonic() - created < self.ttl_seconds:
+                idle.append((created, service))
+
+    def get(self, api: str, version: str, credentials) -> PooledService:
+        """A service for credentials that is exclusively the caller's until dropped"""
+        key = (api, version, credential_fingerprint(credentials))
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            idle = self._idle.get(key)
+            entry = idle.pop() if idle else None
+
+        if entry is None:
+            entry = (now, self._build(api, version, credentials))
+        created, service = entry
+
+        proxy = PooledService(service)
+        weakref.finalize(proxy, self._release, key, created, service)
+        return proxy
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+
+
+_factory: Optional[GoogleClientFactory] = None
+_factory_lock = threading.Lock()
+
+
+def get_client_factory() -> GoogleClientFactory:
+    """Process-wide client factory"""
+    global _factory
+    with _factory_lock:
+        if _factory is None:
+            _factory = GoogleClientFactory()
+        return _factory
+
+
+def get_google_service(api: str, version: str, credentials) -> PooledService:
+    """Drop-in replacement for googleapiclient.discovery.build(api, version, credentials=...)"""
+    return get_client_factory().get(api, version, credentials)
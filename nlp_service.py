@@ -0,0 +1,139 @@
+import os
+import threading
+import spacy
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Iterable, List, Optional, Sequence
+
+SPACY_MODEL = os.environ.get("SPACY_MODEL", "en_core_web_sm")
+NLP_BATCH_SIZE = int(os.environ.get("NLP_BATCH_SIZE", 256))
+NLP_N_PROCESS = int(os.environ.get("NLP_N_PROCESS", 1))
+NLP_CACHE_MAX_ENTRIES = int(os.environ.get("NLP_CACHE_MAX_ENTRIES", 100000))
+
+# Only multiprocess when there is enough work to pay for the worker start-up
+MIN_TEXTS_FOR_MULTIPROCESS = 2000
+
+BRAND_ENTITY_LABELS = ("ORG", "PRODUCT")
+
+
+@lru_cache(maxsize=None)
+def get_nlp(model: str = SPACY_MODEL):
+    """Load a spaCy model once per process"""
+    print(f"Loading spaCy model {model}")
+    return spacy.load(model)
+
+
+class NLPService:
+    """
+    Runs a spaCy model over many texts with nlp.pipe, with only the
+    components the caller needs enabled, and memoizes the extracted result
+    per text.
+
+    `extract` turns a Doc into a plain, picklable value (labels, token
+    strings, ...). Docs themselves are never cached.
+    """
+
+    def __init__(
+        self,
+        extract: Callable,
+        disable: Sequence[str] = (),
+        model: str = SPACY_MODEL,
+        batch_size: int = NLP_BATCH_SIZE,
+        n_process: int = NLP_N_PROCESS,
+        max_entries: int = NLP_CACHE_MAX_ENTRIES,
+    ):
+        self.extract = extract
+        self.disable = tuple(disable)
+        self.model = model
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _run_pipeline(self, texts: List[str]) -> List:
+        nlp = get_nlp(self.model)
+        disable = [name for name in self.disable if name in nlp.pipe_names]
+        n_process = self.n_process if len(texts) >= MIN_TEXTS_FOR_MULTIPROCESS else 1
+        return [
+            self.extract(doc)
+            for doc in nlp.pipe(texts, batch_size=self.batch_size, n_process=n_process, disable=disable)
+        ]
+
+    def process(self, texts: Iterable[str]) -> List:
+        """Return extract(doc) for every text, in input order"""
+        texts = ["" if text is None else str(text) for text in texts]
+        results = [None] * len(texts)
+        pending = {}
+
+        with self._lock:
+            for i, text in enumerate(texts):
+                if text in self._cache:
+                    self._cache.move_to_end(text)
+                    results[i] = self._cache[text]
+                else:
+                    pending.setdefault(text, []).append(i)
+
+        if not pending:
+            return results
+
+        unique_texts = list(pending)
+        extracted = self._run_pipeline(unique_texts)
+
+        with self._lock:
+            for text, value in zip(unique_texts, extracted):
+                for i in pending[text]:
+                    results[i] = value
+                self._cache[text] = value
+                self._cache.move_to_end(text)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+        print(f"NLP: {len(unique_texts)} texts processed, {len(texts) - sum(map(len, pending.values()))} served from cache")
+        return results
+
+
+def _entity_labels(doc) -> tuple:
+    return tuple(ent.label_ for ent in doc.ents)
+
+
+def _nouns_and_chunks(doc) -> tuple:
+    nouns = tuple(token.text for token in doc if token.pos_ == "NOUN")
+    noun_phrases = tuple(chunk.text for chunk in doc.noun_chunks)
+    return nouns, noun_phrases
+
+
+# NER only needs the entity recognizer; POS tags and noun chunks need the
+# tagger and parser but not NER.
+_entity_service: Optional[NLPService] = None
+_noun_service: Optional[NLPService] = None
+_service_lock = threading.Lock()
+
+
+def get_entity_service() -> NLPService:
+    global _entity_service
+    with _service_lock:
+        if _entity_service is None:
+            _entity_service = NLPService(
+                _entity_labels, disable=("tagger", "parser", "attribute_ruler", "lemmatizer")
+            )
+        return _entity_service
+
+
+def get_noun_service() -> NLPService:
+    global _noun_service
+    with _service_lock:
+        if _noun_service is None:
+            _noun_service = NLPService(_nouns_and_chunks, disable=("ner", "lemmatizer"))
+        return _noun_service
+
+
+def has_brand_entity(texts: Iterable[str], labels: Sequence[str] = BRAND_ENTITY_LABELS) -> List[bool]:
+    """True for every text in which spaCy finds an entity with one of labels"""
+    wanted = set(labels)
+    return [any(label in wanted for label in entity_labels) for entity_labels in get_entity_service().process(texts)]
+
+
+def extract_nouns_and_chunks(texts: Iterable[str]) -> List[tuple]:
+    """(nouns, noun_phrases) for every text, in input order"""
+    return get_noun_service().process(texts)
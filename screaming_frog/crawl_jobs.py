@@ -0,0 +1,436 @@
+import os
+import re
+import json
+import uuid
+import socket
+import shutil
+import signal
+import asyncio
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from auth.database import SessionLocal
+from auth.models import Sf_crawl_job
+from screaming_frog.sf_crawl import ScreamingFrogCrawlService, SF_CRAWL_TIMEOUT, build_crawl_command
+from dotenv import load_dotenv
+load_dotenv()
+
+# Screaming Frog is memory hungry; this many crawls run at once across all
+# API processes (enforced in the database), the rest wait as "queued"
+SF_MAX_CONCURRENT_CRAWLS = int(os.environ.get("SF_MAX_CONCURRENT_CRAWLS", 2))
+# KPI post-processing runs in its own pool so a finished crawl frees its slot
+SF_POSTPROCESS_WORKERS = int(os.environ.get("SF_POSTPROCESS_WORKERS", 1))
+# Queued + running jobs one user may have at a time
+SF_MAX_ACTIVE_JOBS_PER_USER = int(os.environ.get("SF_MAX_ACTIVE_JOBS_PER_USER", 3))
+# Set to "false" on API processes that should not run crawls, leaving them
+# to a dedicated worker (python -m screaming_frog.crawl_jobs)
+SF_CRAWL_DISPATCHER = os.environ.get("SF_CRAWL_DISPATCHER", "true").lower() == "true"
+SF_DISPATCH_POLL_SECONDS = float(os.environ.get("SF_DISPATCH_POLL_SECONDS", 5.0))
+SF_PROGRESS_POLL_SECONDS = float(os.environ.get("SF_PROGRESS_POLL_SECONDS", 1.0))
+# Progress is written to the job row at most this often
+SF_PROGRESS_WRITE_SECONDS = float(os.environ.get("SF_PROGRESS_WRITE_SECONDS", 2.0))
+SF_JOB_HEARTBEAT_SECONDS = int(os.environ.get("SF_JOB_HEARTBEAT_SECONDS", 30))
+# Running jobs whose worker stopped heartbeating this long ago are failed
+SF_JOB_STALE_SECONDS = int(os.environ.get("SF_JOB_STALE_SECONDS", 300))
+# After a timeout kill, how long to wait for the crawler's output to close
+SF_KILL_GRACE_SECONDS = int(os.environ.get("SF_KILL_GRACE_SECONDS", 10))
+
+# Key of the Postgres advisory lock that serializes claiming crawl slots
+SF_CRAWL_LOCK_KEY = 51_807_001
+
+QUEUED = "queued"
+CRAWLING = "crawling"
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, CRAWLING, PROCESSING)
+FINISHED_STATUSES = (COMPLETED, FAILED)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Headless crawls log lines such as
+# "SpiderProgress [mActive=3, mCompleted=120, mWaiting=45, mCompleted=72.7%]"
+_COUNT_PATTERN = re.compile(r"\b(mActive|mCompleted|mWaiting)=(\d+)(?![\d.%])")
+_PERCENT_PATTERN = re.compile(r"(\d+(?:\.\d+)?)%")
+
+
+def parse_progress_line(line: str) -> Optional[Dict]:
+    """Crawl progress from one line of Screaming Frog output, or None if it has none"""
+    counts = {name: int(value) for name, value in _COUNT_PATTERN.findall(line)}
+    if "mCompleted" not in counts:
+        return None
+
+    crawled = counts["mCompleted"]
+    pending = counts.get("mWaiting", 0) + counts.get("mActive", 0)
+    percent = _PERCENT_PATTERN.search(line)
+    if percent:
+        percentage = min(100.0, float(percent.group(1)))
+    else:
+        percentage = round(crawled / (crawled + pending) * 100, 1) if crawled + pending else 0.0
+    return {"urls_crawled": crawled, "urls_pending": pending, "percent": percentage}
+
+
+def _empty_progress() -> Dict:
+    return {"urls_crawled": 0, "urls_pending": 0, "percent": 0.0}
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def job_to_dict(job: Sf_crawl_job) -> Dict:
+    return {
+        "job_id": job.job_id,
+        "crawl_url": job.crawl_url,
+        "status": job.status,
+        "progress": job.progress or _empty_progress(),
+        "last_output": job.last_output,
+        "uuid": job.uuid,
+        "rows_processed": job.rows_processed,
+        "error": job.error,
+        "created_at": _isoformat(job.created_at),
+        "started_at": _isoformat(job.started_at),
+        "finished_at": _isoformat(job.finished_at),
+    }
+
+
+def _update_job(job_id: str, **fields):
+    db = SessionLocal()
+    try:
+        db.query(Sf_crawl_job).filter_by(job_id=job_id).update(fields)
+        db.commit()
+    finally:
+        db.close()
+
+
+class CrawlJobQueue:
+    """
+    Database-backed crawl queue.
+
+    /sheets/crawl only inserts a "queued" Sf_crawl_job row. A dispatcher
+    thread in each process claims queued rows while fewer than
+    SF_MAX_CONCURRENT_CRAWLS jobs are crawling anywhere (checked under a
+    Postgres advisory lock), runs Screaming Frog and parses its output into
+    the row's progress. KPI calculation and the database write then run in
+    a separate post-processing pool. Workers heartbeat their jobs; jobs of a
+    worker that died are marked failed so their slots free up.
+    """
+
+    def __init__(self, max_crawls: int = SF_MAX_CONCURRENT_CRAWLS,
+                 postprocess_workers: int = SF_POSTPROCESS_WORKERS):
+        self.max_crawls = max(1, max_crawls)
+        self._crawl_pool = ThreadPoolExecutor(max_workers=self.max_crawls, thread_name_prefix="sf-crawl")
+        self._process_pool = ThreadPoolExecutor(max_workers=max(1, postprocess_workers), thread_name_prefix="sf-kpi")
+        self._local_crawls = 0
+        self._lock = threading.Lock()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+
+    # API side
+
+    def submit(self, db: Session, user_id: int, domain: str, export_tabs: List[str] = None) -> Sf_crawl_job:
+        export_tabs = export_tabs or ["Internal:All"]
+        # Per-user lock so two concurrent submits cannot both pass the cap
+        db.execute(text("SELECT pg_advisory_xact_lock(:key, :user_id)"),
+                   {"key": SF_CRAWL_LOCK_KEY, "user_id": user_id})
+        active = (
+            db.query(Sf_crawl_job)
+            .filter(Sf_crawl_job.user_id == user_id, Sf_crawl_job.status.in_(ACTIVE_STATUSES))
+            .count()
+        )
+        if active >= SF_MAX_ACTIVE_JOBS_PER_USER:
+            db.rollback()
+            raise HTTPException(429, f"You already have {active} crawls queued or running. Please wait for one to finish.")
+
+        job = Sf_crawl_job(
+            job_id=uuid.uuid4().hex,
+            user_id=user_id,
+            crawl_url=domain,
+            export_tabs=",".join(export_tabs),
+            status=QUEUED,
+            progress=_empty_progress(),
+            created_at=datetime.utcnow(),
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        print(f"Queued Screaming Frog crawl {job.job_id} for {domain}")
+        self.start()
+        self._wake.set()
+        return job
+
+    def get(self, db: Session, job_id: str, user_id: int) -> Sf_crawl_job:
+        job = db.query(Sf_crawl_job).filter_by(job_id=job_id, user_id=user_id).first()
+        if job is None:
+            raise HTTPException(404, f"No crawl job found for ID {job_id}")
+        return job
+
+    def jobs_for_user(self, db: Session, user_id: int, limit: int = 50) -> List[Sf_crawl_job]:
+        return (
+            db.query(Sf_crawl_job)
+            .filter_by(user_id=user_id)
+            .order_by(Sf_crawl_job.created_at.desc())
+            .limit(limit)
+            .all()
+        )
+
+    def _job_state(self, job_id: str, user_id: int) -> Dict:
+        db = SessionLocal()
+        try:
+            return job_to_dict(self.get(db, job_id, user_id))
+        finally:
+            db.close()
+
+    async def progress_events(self, job_id: str, user_id: int) -> AsyncIterator[str]:
+        """Server-sent events with the job state, sent on every change until it finishes"""
+        last_payload = None
+        while True:
+            state = await run_in_threadpool(self._job_state, job_id, user_id)
+            payload = json.dumps(state)
+            if payload != last_payload:
+                last_payload = payload
+                yield f"data: {payload}\n\n"
+            if state["status"] in FINISHED_STATUSES:
+                return
+            await asyncio.sleep(SF_PROGRESS_POLL_SECONDS)
+
+    # Worker side
+
+    def start(self):
+        """Start this process's dispatcher thread (no-op if disabled or running)"""
+        if not SF_CRAWL_DISPATCHER:
+            return
+        with self._lock:
+            if self._dispatcher is not None and self._dispatcher.is_alive():
+                return
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="sf-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch_loop(self):
+        while True:
+            try:
+                self._fail_stale_jobs()
+                while self._has_local_capacity():
+                    job = self._claim_next()
+                    if job is None:
+                        break
+                    with self._lock:
+                        self._local_crawls += 1
+                    self._crawl_pool.submit(self._crawl, job)
+            except Exception as e:
+                print(f"Crawl dispatcher error: {e}")
+            self._wake.wait(SF_DISPATCH_POLL_SECONDS)
+            self._wake.clear()
+
+    def _has_local_capacity(self) -> bool:
+        with self._lock:
+            return self._local_crawls < self.max_crawls
+
+    def _claim_next(self) -> Optional[Dict]:
+        """Move the oldest queued job to "crawling" if a global crawl slot is free"""
+        db = SessionLocal()
+        try:
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SF_CRAWL_LOCK_KEY})
+            running = db.query(Sf_crawl_job).filter(Sf_crawl_job.status == CRAWLING).count()
+            if running >= self.max_crawls:
+                db.rollback()
+                return None
+            job = (
+                db.query(Sf_crawl_job)
+                .filter(Sf_crawl_job.status == QUEUED)
+                .order_by(Sf_crawl_job.created_at)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+            if job is None:
+                db.rollback()
+                return None
+            now = datetime.utcnow()
+            job.status = CRAWLING
+            job.started_at = now
+            job.heartbeat_at = now
+            job.worker = WORKER_ID
+            claimed = {
+                "job_id": job.job_id,
+                "user_id": job.user_id,
+                "domain": job.crawl_url,
+                "export_tabs": job.export_tabs,
+            }
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    def _fail_stale_jobs(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=SF_JOB_STALE_SECONDS)
+        db = SessionLocal()
+        try:
+            stale = (
+                db.query(Sf_crawl_job)
+                .filter(
+                    Sf_crawl_job.status.in_((CRAWLING, PROCESSING)),
+                    Sf_crawl_job.heartbeat_at < cutoff,
+                )
+                .update(
+                    {
+                        "status": FAILED,
+                        "error": "The crawl worker stopped before the job finished. Please start the crawl again.",
+                        "finished_at": datetime.utcnow(),
+                    },
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            if stale:
+                print(f"Marked {stale} stale crawl jobs as failed")
+        finally:
+            db.close()
+
+    def _heartbeat(self, job_id: str, done: threading.Event):
+        while not done.wait(SF_JOB_HEARTBEAT_SECONDS):
+            try:
+                _update_job(job_id, heartbeat_at=datetime.utcnow())
+            except Exception as e:
+                print(f"Crawl job {job_id} heartbeat failed: {e}")
+
+    def _fail(self, job_id: str, error: str):
+        print(f"Crawl job {job_id} failed: {error}")
+        _update_job(job_id, status=FAILED, error=error, finished_at=datetime.utcnow())
+
+    def _crawl(self, job: Dict):
+        job_id = job["job_id"]
+        output_dir = tempfile.mkdtemp(prefix="sf_crawl_")
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, done), daemon=True).start()
+        handed_off = False
+        try:
+            self._run_crawl_process(job, output_dir, done)
+            _update_job(job_id, status=PROCESSING, heartbeat_at=datetime.utcnow())
+            self._process_pool.submit(self._post_process, job, output_dir, done)
+            handed_off = True
+        except HTTPException as e:
+            self._fail(job_id, e.detail)
+        except Exception as e:
+            self._fail(job_id, f"Screaming Frog crawl failed: {e}")
+        finally:
+            with self._lock:
+                self._local_crawls -= 1
+            if not handed_off:
+                done.set()
+                shutil.rmtree(output_dir, ignore_errors=True)
+            # A crawl slot just freed up
+            self._wake.set()
+
+    def _run_crawl_process(self, job: Dict, output_dir: str, done: threading.Event):
+        command = build_crawl_command(job["domain"], output_dir, job["export_tabs"])
+        print(f"Starting Screaming Frog crawl for: {job['domain']}")
+
+        # Own process group: SF_PATH may be the launcher script, and the
+        # JVM it starts has to be killed along with it on timeout
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            start_new_session=True,
+        )
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            # Stop heartbeating so the slot is reclaimed even if this thread never returns
+            done.set()
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        state = {"progress": _empty_progress(), "last_output": None}
+
+        def read_output():
+            last_write = 0.0
+            for line in process.stdout:
+                if timed_out.is_set():
+                    break
+                line = line.rstrip()
+                if not line:
+                    continue
+                state["last_output"] = line
+                state["progress"] = parse_progress_line(line) or state["progress"]
+                now = datetime.utcnow().timestamp()
+                if now - last_write >= SF_PROGRESS_WRITE_SECONDS:
+                    last_write = now
+                    try:
+                        _update_job(job["job_id"], progress=state["progress"], last_output=line[:1000])
+                    except Exception as e:
+                        # Keep draining stdout or the crawler blocks on a full pipe
+                        print(f"Crawl job {job['job_id']} progress update failed: {e}")
+
+        timer = threading.Timer(SF_CRAWL_TIMEOUT, kill)
+        timer.start()
+        reader = threading.Thread(target=read_output, daemon=True)
+        reader.start()
+        try:
+            while reader.is_alive() and not timed_out.is_set():
+                reader.join(1.0)
+            if timed_out.is_set():
+                # Something outside the process group may still hold the
+                # pipe open; give up on its output rather than hang
+                reader.join(SF_KILL_GRACE_SECONDS)
+            returncode = process.wait()
+        finally:
+            timer.cancel()
+            if not reader.is_alive():
+                process.stdout.close()
+        progress = state["progress"]
+        last_output = state["last_output"]
+
+        if timed_out.is_set():
+            raise TimeoutError(f"crawl exceeded {SF_CRAWL_TIMEOUT} seconds")
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command)
+        _update_job(
+            job["job_id"],
+            progress={**progress, "percent": 100.0},
+            last_output=last_output[:1000] if last_output else None,
+        )
+
+    def _post_process(self, job: Dict, output_dir: str, done: threading.Event):
+        job_id = job["job_id"]
+        db = SessionLocal()
+        try:
+            result = ScreamingFrogCrawlService(db).process_crawl_output(output_dir, job["domain"], job["user_id"])
+            _update_job(
+                job_id,
+                status=COMPLETED,
+                uuid=result["uuid"],
+                rows_processed=result["rows_processed"],
+                finished_at=datetime.utcnow(),
+            )
+            print(f"Crawl job {job_id} saved as {result['uuid']}")
+        except HTTPException as e:
+            self._fail(job_id, e.detail)
+        except Exception as e:
+            self._fail(job_id, f"Error during crawling and data processing: {e}")
+        finally:
+            done.set()
+            db.close()
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+
+crawl_job_queue = CrawlJobQueue()
+
+
+if __name__ == "__main__":
+    # Dedicated crawl worker: run with SF_CRAWL_DISPATCHER=false on the API
+    # processes so only this one starts Screaming Frog
+    print(f"Screaming Frog crawl worker {WORKER_ID} started")
+    crawl_job_queue._dispatch_loop()
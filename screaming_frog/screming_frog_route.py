@@ -2,23 +2,26 @@
 from utils import verify_jwt_token
 from auth.auth import get_db
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from auth.models import Integration, ProviderEnum, SpreadSheet, Sf_crawl_data
 from screaming_frog.utile import GoogleSheetsService
-from googleapiclient.discovery import build
+from google_clients import get_google_service
 import uuid
 from screaming_frog.model import SheetDataOut
 from typing import List
-from screaming_frog.seo_audit_dashboard.indexablity import indexability_kpis_and_table
-from screaming_frog.seo_audit_dashboard.status_code import status_code_kpis_and_table
-from screaming_frog.seo_audit_dashboard.page_title import page_title_kpis_and_table
-from screaming_frog.seo_audit_dashboard.meta_description import meta_description_kpis_and_tables
-from screaming_frog.seo_audit_dashboard.h_tags import h_tags_kpis_and_table
 from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from screaming_frog.sf_crawl import ScreamingFrogCrawlService
+from screaming_frog.crawl_jobs import crawl_job_queue, job_to_dict
+from screaming_frog.seo_audit_dashboard.audit_store import (
+    AUDIT_TABLE_PAGE_SIZE,
+    audit_summary,
+    full_report,
+    load_audit_table,
+    table_slice,
+)
 router = APIRouter()
 
 class CrawlRequest(BaseModel):
@@ -31,7 +34,8 @@ def crawl_domain_to_sheets(
     db: Session = Depends(get_db)
 ):
     """
-    Crawl a domain and save results directly to database
+    Queue a crawl of a domain; poll /sheets/crawl/jobs/{job_id} (or stream
+    its /progress) for the resulting crawl uuid
     """
     user_id = int(user_id[1])
     
@@ -40,29 +44,83 @@ def crawl_domain_to_sheets(
     if not domain.startswith(('http://', 'https://')):
         domain = f"https://{domain}"
     
-    # Create crawl service and run crawl
-    crawl_service = ScreamingFrogCrawlService(db)
-    
     try:
-        result = crawl_service.crawl_and_save_to_db(
-            domain=domain,
+        job = crawl_job_queue.submit(
+            db,
             user_id=user_id,
+            domain=domain,
             export_tabs=["Internal:All"]
         )
         
         return JSONResponse(
-            status_code=200,
+            status_code=202,
             content={
-                # "success": True,
-                # "message": result["message"],
-                "crawl_url":domain,
-                "uuid": result["uuid"]
+                "crawl_url": domain,
+                "job_id": job.job_id,
+                "status": job.status
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Crawl failed: {str(e)}")    
 
+
+@router.get("/sheets/crawl/jobs")
+def list_crawl_jobs(
+    user_id: int = Depends(verify_jwt_token),
+    db: Session = Depends(get_db)
+):
+    """
+    The user's queued, running and recently finished crawl jobs
+    """
+    user_id = int(user_id[1])
+    
+    return JSONResponse(
+        status_code=200,
+        content=[job_to_dict(job) for job in crawl_job_queue.jobs_for_user(db, user_id)]
+    )
+
+
+@router.get("/sheets/crawl/jobs/{job_id}")
+def crawl_job_status(
+    job_id: str,
+    user_id: int = Depends(verify_jwt_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Status, progress and (once completed) the crawl uuid of one job
+    """
+    user_id = int(user_id[1])
+    job = crawl_job_queue.get(db, job_id, user_id)
+    
+    return JSONResponse(
+        status_code=200,
+        content=job_to_dict(job)
+    )
+
+
+@router.get("/sheets/crawl/jobs/{job_id}/progress")
+def crawl_job_progress(
+    job_id: str,
+    user_id: int = Depends(verify_jwt_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-sent event stream of the job state, parsed from Screaming Frog's
+    output; ends when the job completes or fails
+    """
+    user_id = int(user_id[1])
+    # 404 before the stream starts for unknown jobs
+    crawl_job_queue.get(db, job_id, user_id)
+    
+    return StreamingResponse(
+        crawl_job_queue.progress_events(job_id, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 @router.get("/crawl_data_info")
 def crawled_id_fetch(
     user_id: int = Depends(verify_jwt_token),
@@ -102,24 +160,106 @@ def fetch_crawl_data(
     db: Session = Depends(get_db)
 ):
     """
-    Fetch crawl data from database by UUID
+    Fetch the full crawl report (every KPI and table row) by UUID.
+    Kept for existing clients; /kpis and /tables page through large crawls.
     """
     user_id = int(user_id[1])
+    crawl_data = ScreamingFrogCrawlService(db).get_crawl_data_by_uuid(uuid, user_id)
     
-    # Get crawl data from database
-    record = (
-        db.query(Sf_crawl_data)
-        .filter_by(uuid=uuid, user_id=user_id)
-        .first()
+    try:
+        report = full_report(user_id, uuid, crawl_data)
+    except FileNotFoundError as e:
+        raise HTTPException(404, e.args[0])
+    
+    return JSONResponse(
+        status_code=200,
+        content=report
     )
+
+
+@router.delete("/crawl_data/{uuid}")
+def delete_crawl_data(
+    uuid: str,
+    user_id: int = Depends(verify_jwt_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Delete a crawl and its stored audit tables
+    """
+    user_id = int(user_id[1])
+    ScreamingFrogCrawlService(db).delete_crawl(uuid, user_id)
     
-    if not record:
-        raise HTTPException(404, f"No crawl data found for UUID {uuid}")
+    return JSONResponse(
+        status_code=200,
+        content={"message": f"Crawl {uuid} deleted"}
+    )
+
+
+@router.get("/crawl_data/{uuid}/kpis")
+def fetch_crawl_kpis(
+    uuid: str,
+    user_id: int = Depends(verify_jwt_token),
+    db: Session = Depends(get_db)
+):
+    """
+    KPI summaries and table sizes for every audit section, without table rows
+    """
+    user_id = int(user_id[1])
+    crawl_data = ScreamingFrogCrawlService(db).get_crawl_data_by_uuid(uuid, user_id)
+    
+    return JSONResponse(
+        status_code=200,
+        content=audit_summary(crawl_data)
+    )
+
+
+@router.get("/crawl_data/{uuid}/tables/{section}/{table}")
+def fetch_crawl_table(
+    uuid: str,
+    section: str,
+    table: str,
+    page: int = 1,
+    page_size: int = AUDIT_TABLE_PAGE_SIZE,
+    sort_by: Optional[str] = None,
+    order: str = "asc",
+    search: Optional[str] = None,
+    filter_column: Optional[str] = None,
+    filter_value: Optional[str] = None,
+    user_id: int = Depends(verify_jwt_token),
+    db: Session = Depends(get_db)
+):
+    """
+    One page of an audit table (e.g. indexability/missing_canonical),
+    optionally searched, filtered on a column and sorted
+    """
+    user_id = int(user_id[1])
+    if order not in ("asc", "desc"):
+        raise HTTPException(400, "order must be 'asc' or 'desc'")
+    
+    crawl_data = ScreamingFrogCrawlService(db).get_crawl_data_by_uuid(uuid, user_id)
+    
+    try:
+        df = load_audit_table(user_id, uuid, crawl_data, section, table)
+    except (KeyError, FileNotFoundError) as e:
+        raise HTTPException(404, e.args[0])
+    
+    try:
+        result = table_slice(
+            df,
+            page=page,
+            page_size=page_size,
+            sort_by=sort_by,
+            descending=order == "desc",
+            search=search,
+            filter_column=filter_column,
+            filter_value=filter_value,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     
-    # Return the stored dashboard data
     return JSONResponse(
         status_code=200,
-        content=record.crawl_json_data
+        content=result
     )
 
 
@@ -144,7 +284,7 @@ def test_sheets_connection(
         sheets_service = GoogleSheetsService(integration)
         
         # Try to list spreadsheets to test connection
-        drive_service = build('drive', 'v3', credentials=sheets_service.credentials)
+        drive_service = get_google_service('drive', 'v3', sheets_service.credentials)
         results = drive_service.files().list(
             q="mimeType='application/vnd.google-apps.spreadsheet'",
             pageSize=1
@@ -0,0 +1,248 @@
+import io
+import os
+import math
+import threading
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+from botocore.exceptions import ClientError
+from S3_bucket.S3_client import s3
+from dotenv import load_dotenv
+load_dotenv()
+
+S3_BUCKET_NAME = os.environ.get("BUCKET_NAME")
+# One Parquet object per audit table, under the user's S3 folder like the
+# clustering files: User_<id>/sf_crawl_data/<crawl uuid>/<section>/<table>.parquet
+SF_AUDIT_CATEGORY = "sf_crawl_data"
+AUDIT_TABLE_PAGE_SIZE = int(os.environ.get("AUDIT_TABLE_PAGE_SIZE", 50))
+AUDIT_TABLE_MAX_PAGE_SIZE = int(os.environ.get("AUDIT_TABLE_MAX_PAGE_SIZE", 500))
+# Memory budget (per process) for loaded tables kept so paging through one
+# does not re-download it; tables bigger than the budget are never cached
+AUDIT_TABLE_CACHE_BYTES = int(os.environ.get("AUDIT_TABLE_CACHE_MB", 256)) * 1024 * 1024
+
+# cache key -> (frame, deep memory size in bytes)
+_table_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_table_cache_bytes = 0
+_table_cache_lock = threading.Lock()
+
+
+def _audit_prefix(user_id: int, crawl_uuid: str) -> str:
+    return f"User_{user_id}/{SF_AUDIT_CATEGORY}/{crawl_uuid}/"
+
+
+def _table_key(user_id: int, crawl_uuid: str, section: str, table: str) -> str:
+    return f"{_audit_prefix(user_id, crawl_uuid)}{section}/{table}.parquet"
+
+
+def _put_parquet(key: str, frame: pd.DataFrame):
+    buffer = io.BytesIO()
+    frame.to_parquet(buffer, index=False)
+    s3.put_object(Bucket=S3_BUCKET_NAME, Key=key, Body=buffer.getvalue())
+
+
+def save_audit(user_id: int, crawl_uuid: str, sections: Dict[str, Optional[Dict]]) -> Dict[str, Optional[Dict]]:
+    """
+    Upload every audit table of a crawl to S3 as Parquet and return the
+    summary that goes into Sf_crawl_data.crawl_json_data:
+
+        {section: {"kpis": {...}, "tables": {table: {"rows": n, "columns": [...]}}}}
+
+    sections is the output of kpi_registry.build_all_sections. Failed
+    sections stay None, as they did in the full report. If an upload fails,
+    the tables already written are deleted again.
+    """
+    summary = {}
+    try:
+        for section, result in sections.items():
+            if result is None:
+                summary[section] = None
+                continue
+            tables = {}
+            for table, frame in result["tables"].items():
+                _put_parquet(_table_key(user_id, crawl_uuid, section, table), frame.reset_index(drop=True))
+                tables[table] = {"rows": int(len(frame)), "columns": [str(column) for column in frame.columns]}
+            summary[section] = {"kpis": result["kpis"], "tables": tables}
+    except Exception:
+        delete_audit(user_id, crawl_uuid)
+        raise
+    return summary
+
+
+def delete_audit(user_id: int, crawl_uuid: str) -> int:
+    """Delete every stored table of a crawl; returns the number of objects removed"""
+    prefix = _audit_prefix(user_id, crawl_uuid)
+    deleted = 0
+    try:
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix):
+            keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if keys:
+                # list_objects_v2 pages hold at most 1000 keys, the delete_objects limit
+                s3.delete_objects(Bucket=S3_BUCKET_NAME, Delete={"Objects": keys})
+                deleted += len(keys)
+    except ClientError as e:
+        print(f"Failed to delete audit tables under {prefix}: {e}")
+        raise
+
+    global _table_cache_bytes
+    with _table_cache_lock:
+        for cache_key in [k for k in _table_cache if k[:2] == (user_id, crawl_uuid)]:
+            _table_cache_bytes -= _table_cache.pop(cache_key)[1]
+    return deleted
+
+
+def _table_entry(crawl_data: Dict, section: str, table: str) -> Union[Dict, List[Dict]]:
+    section_data = (crawl_data or {}).get(section)
+    if not section_data or table not in section_data.get("tables", {}):
+        raise KeyError(f"No table {section}/{table} in this crawl")
+    return section_data["tables"][table]
+
+
+def audit_summary(crawl_data: Dict) -> Dict[str, Optional[Dict]]:
+    """
+    KPIs plus table sizes for every section. Crawls saved before the
+    Parquet store keep their rows inline; those are summarized the same way.
+    """
+    summary = {}
+    for section, section_data in (crawl_data or {}).items():
+        if not section_data:
+            summary[section] = None
+            continue
+        tables = {}
+        for table, entry in section_data.get("tables", {}).items():
+            if isinstance(entry, list):
+                entry = {"rows": len(entry), "columns": list(entry[0].keys()) if entry else []}
+            tables[table] = entry
+        summary[section] = {"kpis": section_data.get("kpis"), "tables": tables}
+    return summary
+
+
+def _cache_table(cache_key: tuple, df: pd.DataFrame):
+    global _table_cache_bytes
+    size = int(df.memory_usage(index=True, deep=True).sum())
+    if size > AUDIT_TABLE_CACHE_BYTES:
+        return
+    with _table_cache_lock:
+        if cache_key in _table_cache:
+            _table_cache_bytes -= _table_cache.pop(cache_key)[1]
+        _table_cache[cache_key] = (df, size)
+        _table_cache_bytes += size
+        while _table_cache_bytes > AUDIT_TABLE_CACHE_BYTES:
+            _table_cache_bytes -= _table_cache.popitem(last=False)[1][1]
+
+
+def _read_table(user_id: int, crawl_uuid: str, section: str, table: str, cache: bool = True) -> pd.DataFrame:
+    """A stored table; with cache=False it is neither added to nor evicts from the cache"""
+    cache_key = (user_id, crawl_uuid, section, table)
+    with _table_cache_lock:
+        if cache_key in _table_cache:
+            _table_cache.move_to_end(cache_key)
+            return _table_cache[cache_key][0]
+
+    try:
+        response = s3.get_object(Bucket=S3_BUCKET_NAME, Key=_table_key(user_id, crawl_uuid, section, table))
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            raise FileNotFoundError(f"Audit table file missing for {section}/{table}")
+        raise
+    df = pd.read_parquet(io.BytesIO(response["Body"].read()))
+    if cache:
+        _cache_table(cache_key, df)
+    return df
+
+
+def load_audit_table(user_id: int, crawl_uuid: str, crawl_data: Dict, section: str, table: str) -> pd.DataFrame:
+    """
+    One audit table as a DataFrame, read from S3 (or the legacy inline rows).
+    The frame is shared through the cache; callers must not modify it in place.
+    """
+    entry = _table_entry(crawl_data, section, table)
+    if isinstance(entry, list):
+        return pd.DataFrame(entry)
+    return _read_table(user_id, crawl_uuid, section, table)
+
+
+def _records(df: pd.DataFrame) -> List[Dict]:
+    rows = df.astype(object)
+    return rows.where(rows.notna(), None).to_dict("records")
+
+
+def full_report(user_id: int, crawl_uuid: str, crawl_data: Dict) -> Dict[str, Optional[Dict]]:
+    """
+    The pre-Parquet crawl_json_data shape, {section: {"kpis", "tables":
+    {table: [rows]}}}, for clients of /crawl_data/{uuid}. Loads every table
+    (one at a time, bypassing the cache), so new clients should use
+    audit_summary and table_slice instead.
+    """
+    report = {}
+    for section, section_data in (crawl_data or {}).items():
+        if not section_data:
+            report[section] = None
+            continue
+        tables = {}
+        for table, entry in section_data.get("tables", {}).items():
+            if isinstance(entry, list):
+                tables[table] = entry
+            else:
+                tables[table] = _records(_read_table(user_id, crawl_uuid, section, table, cache=False))
+        report[section] = {"kpis": section_data.get("kpis"), "tables": tables}
+    return report
+
+
+def _sort_key(column: pd.Series) -> Optional[pd.Series]:
+    """Sort lengths and status codes numerically when every non-blank value is a number"""
+    values = column.astype(str).str.strip()
+    numeric = pd.to_numeric(values, errors="coerce")
+    if numeric[values != ""].notna().all():
+        return numeric
+    return None
+
+
+def table_slice(
+    df: pd.DataFrame,
+    page: int = 1,
+    page_size: int = AUDIT_TABLE_PAGE_SIZE,
+    sort_by: Optional[str] = None,
+    descending: bool = False,
+    search: Optional[str] = None,
+    filter_column: Optional[str] = None,
+    filter_value: Optional[str] = None,
+) -> Dict:
+    """
+    One page of an audit table after filtering and sorting.
+
+    search matches any column (case-insensitive substring); filter_column /
+    filter_value restrict a single column the same way. Raises ValueError
+    for unknown columns.
+    """
+    for column in (sort_by, filter_column):
+        if column and column not in df.columns:
+            raise ValueError(f"Unknown column: {column}")
+
+    if filter_column and filter_value:
+        df = df[df[filter_column].astype(str).str.contains(filter_value, case=False, na=False, regex=False)]
+    if search:
+        matches = pd.Series(False, index=df.index)
+        for column in df.columns:
+            matches |= df[column].astype(str).str.contains(search, case=False, na=False, regex=False)
+        df = df[matches]
+    if sort_by:
+        key = _sort_key(df[sort_by])
+        if key is not None:
+            df = df.loc[key.sort_values(ascending=not descending, kind="stable", na_position="last").index]
+        else:
+            df = df.sort_values(sort_by, ascending=not descending, kind="stable", key=lambda column: column.astype(str))
+
+    page_size = max(1, min(int(page_size), AUDIT_TABLE_MAX_PAGE_SIZE))
+    total_rows = int(len(df))
+    total_pages = max(1, math.ceil(total_rows / page_size))
+    page = max(1, int(page))
+
+    return {
+        "columns": [str(column) for column in df.columns],
+        "rows": _records(df.iloc[(page - 1) * page_size:page * page_size]),
+        "page": page,
+        "page_size": page_size,
+        "total_rows": total_rows,
+        "total_pages": total_pages,
+    }
@@ -0,0 +1,128 @@
+import pandas as pd
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Hashable, Optional
+from screaming_frog.seo_audit_dashboard.crawl_frame import normalize_column_name
+
+HTML_CONTENT_TYPE = 'text/html; charset=UTF-8'
+
+
+class CrawlFeatures:
+    """
+    Per-crawl cache of the masks and derived columns the SEO audit
+    calculators share: the HTML filter, stripped strings, has-value tests,
+    duplicate flags, numeric lengths and pattern matches are computed once
+    and reused by every KPI count and get_*_table call.
+
+    Columns are looked up with spaces and dashes normalized, so 'H1-1'
+    (page title) and 'H1_1' (h_tags) share the same entries. All masks are
+    aligned to the crawl frame's index.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._columns = {normalize_column_name(column, replace_dashes=True): column for column in df.columns}
+        self._cache: Dict[Hashable, pd.Series] = {}
+
+    def cached(self, key: Hashable, build: Callable[[], pd.Series]) -> pd.Series:
+        """Memoize build() under key; calculators use it for their combined KPI masks"""
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def has_column(self, name: str) -> bool:
+        return normalize_column_name(name, replace_dashes=True) in self._columns
+
+    def column(self, name: str) -> pd.Series:
+        return self.df[self._columns[normalize_column_name(name, replace_dashes=True)]]
+
+    def _false(self) -> pd.Series:
+        return pd.Series(False, index=self.df.index)
+
+    def html_mask(self) -> pd.Series:
+        return self.cached('html', lambda: self.column('Content_Type') == HTML_CONTENT_TYPE)
+
+    def html_count(self) -> int:
+        return int(self.html_mask().sum())
+
+    def stripped(self, name: str) -> pd.Series:
+        return self.cached(('stripped', name), lambda: self.column(name).astype(str).str.strip())
+
+    def not_blank(self, name: str) -> pd.Series:
+        """Not null and not '' (no stripping); all False if the column is absent"""
+        def build():
+            if not self.has_column(name):
+                return self._false()
+            column = self.column(name)
+            return column.notna() & (column != '')
+        return self.cached(('not_blank', name), build)
+
+    def has_value(self, name: str) -> pd.Series:
+        """Not null, not '' and not just whitespace"""
+        return self.cached(('has_value', name), lambda: self.not_blank(name) & (self.stripped(name) != ''))
+
+    def is_missing(self, name: str) -> pd.Series:
+        return self.cached(('is_missing', name), lambda: ~self.has_value(name))
+
+    def duplicated(self, name: str) -> pd.Series:
+        """Every occurrence of a repeated value across the whole crawl"""
+        return self.cached(('duplicated', name), lambda: self.column(name).duplicated(keep=False))
+
+    def html_duplicated(self, name: str) -> pd.Series:
+        """Repeated values counted only among HTML pages that have a value"""
+        def build():
+            candidates = self.html_mask() & self.has_value(name)
+            flags = self.column(name)[candidates].duplicated(keep=False)
+            return flags.reindex(self.df.index, fill_value=False)
+        return self.cached(('html_duplicated', name), build)
+
+    def numeric(self, name: str) -> pd.Series:
+        return self.cached(('numeric', name), lambda: pd.to_numeric(self.column(name), errors='coerce'))
+
+    def equals(self, name: str, value) -> pd.Series:
+        return self.cached(('equals', name, value), lambda: self.column(name) == value)
+
+    def equals_column(self, name: str, other: str) -> pd.Series:
+        return self.cached(('equals_column', name, other), lambda: self.column(name) == self.column(other))
+
+    def contains(self, name: str, pattern: str) -> pd.Series:
+        """Case-insensitive substring match, False for nulls"""
+        return self.cached(
+            ('contains', name, pattern),
+            lambda: self.column(name).str.contains(pattern, case=False, na=False),
+        )
+
+    def starts_with(self, name: str, prefix: str) -> pd.Series:
+        def build():
+            column = self.column(name)
+            if not isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype(str)
+            # On categoricals .str works on the categories, not every row
+            return column.str.startswith(prefix, na=False)
+        return self.cached(('starts_with', name, prefix), build)
+
+
+class BaseKPICalculator(ABC):
+    """
+    Base class for all KPI calculators.
+
+    Subclasses list their masks once in MASKS (name -> builder taking the
+    CrawlFeatures); calculate_kpis and the get_*_table methods both read
+    them through _mask, so a KPI count and its table can never disagree.
+    """
+
+    MASKS: Dict[str, Callable[[CrawlFeatures], pd.Series]] = {}
+
+    def __init__(self, df: pd.DataFrame, features: Optional[CrawlFeatures] = None):
+        self.df = df
+        self.features = features if features is not None else CrawlFeatures(df)
+        self.kpis = {}
+
+    def _mask(self, name: str) -> pd.Series:
+        """MASKS[name] computed once per crawl and shared with the other paths"""
+        build = self.MASKS[name]
+        return self.features.cached((type(self).__name__, name), lambda: build(self.features))
+
+    @abstractmethod
+    def calculate_kpis(self) -> Dict:
+        """Calculate KPIs specific to this category."""
+        pass
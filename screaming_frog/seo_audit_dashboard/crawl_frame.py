@@ -0,0 +1,172 @@
+import os
+import pandas as pd
+from typing import Dict, Iterator, List, Union
+from dotenv import load_dotenv
+load_dotenv()
+
+# Rows per read_csv chunk; 0 reads the export in one go
+SF_CSV_CHUNK_SIZE = int(os.environ.get("SF_CSV_CHUNK_SIZE", 100000))
+# "c" streams in chunks; "pyarrow" reads multi-threaded but in a single pass
+SF_CSV_ENGINE = os.environ.get("SF_CSV_ENGINE", "c")
+
+# Screaming Frog Internal:All columns read by the KPI calculators; the other
+# 60+ export columns are never loaded.
+KPI_COLUMNS = [
+    'Address',
+    'Content Type',
+    'Status Code',
+    'Status',
+    'Indexability',
+    'Indexability Status',
+    'Title 1',
+    'Title 1 Length',
+    'Title 1 Pixel Width',
+    'Meta Robots 1',
+    'X-Robots-Tag 1',
+    'Canonical Link Element 1',
+    'Meta Description 1',
+    'Meta Description 1 Length',
+    'Meta Description 1 Pixel Width',
+    'Meta Description 2',
+    'Meta Description 3',
+    'H1-1',
+    'H1-1 Length',
+    'H1-2',
+    'H1-2 Length',
+    'H2-1',
+    'H2-1 Length',
+]
+
+# Low-cardinality columns stored as categoricals of their string values, so
+# the calculators' string comparisons ("200", 'Indexable', .str.contains)
+# and the exported tables are unchanged. Lengths and pixel widths repeat a
+# few hundred values at most; pd.to_numeric still reads them.
+CATEGORICAL_COLUMNS = [
+    'Content Type',
+    'Status Code',
+    'Status',
+    'Indexability',
+    'Indexability Status',
+    'Meta Robots 1',
+    'X-Robots-Tag 1',
+    'Title 1 Length',
+    'Title 1 Pixel Width',
+    'Meta Description 1 Length',
+    'Meta Description 1 Pixel Width',
+    'H1-1 Length',
+    'H1-2 Length',
+    'H2-1 Length',
+]
+
+
+def normalize_column_name(column: str, replace_dashes: bool = False) -> str:
+    """Crawl column name as the calculators use it ('Title 1' -> 'Title_1')"""
+    column = column.replace(" ", "_")
+    return column.replace("-", "_") if replace_dashes else column
+
+
+def _prune_and_rename(df: pd.DataFrame) -> pd.DataFrame:
+    df = df[[column for column in KPI_COLUMNS if column in df.columns]]
+    df.columns = [normalize_column_name(column) for column in df.columns]
+    return df
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("category")
+    return df
+
+
+def _csv_dtypes(columns: List[str]) -> Dict[str, str]:
+    return {column: "category" if column in CATEGORICAL_COLUMNS else str for column in columns}
+
+
+def iter_crawl_chunks(path: str, chunksize: int = SF_CSV_CHUNK_SIZE, engine: str = SF_CSV_ENGINE) -> Iterator[pd.DataFrame]:
+    """
+    Stream an Internal:All export as pruned, typed chunks.
+
+    Only the KPI_COLUMNS present in the header are parsed, so each raw chunk
+    is a fraction of the export. The pyarrow engine does not support
+    chunksize and yields the whole (already pruned) file at once.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [column for column in header if column in KPI_COLUMNS]
+    options = dict(usecols=columns, dtype=_csv_dtypes(columns), keep_default_na=False)
+
+    if engine == "pyarrow" or not chunksize:
+        yield _typed(pd.read_csv(path, engine=engine, **options))
+        return
+    for chunk in pd.read_csv(path, engine=engine, chunksize=chunksize, **options):
+        yield _typed(chunk)
+
+
+def _concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate chunks, aligning categories first so pd.concat keeps them categorical"""
+    if len(chunks) == 1:
+        return chunks[0]
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            categories = pd.Index(sorted(set().union(*(chunk[column].cat.categories for chunk in chunks))))
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_crawl_csv(path: str, chunksize: int = SF_CSV_CHUNK_SIZE, engine: str = SF_CSV_ENGINE) -> pd.DataFrame:
+    """
+    Internal:All export as one compact frame. Peak memory is the typed
+    frame plus a single raw chunk instead of every column as object strings.
+    """
+    chunks = []
+    rows = 0
+    for chunk in iter_crawl_chunks(path, chunksize, engine):
+        chunks.append(chunk)
+        rows += len(chunk)
+        if len(chunks) > 1:
+            print(f"Read {rows} crawl rows")
+    if not chunks:
+        return pd.DataFrame()
+    return _concat_chunks(chunks)
+
+
+def _frame_from_values(tabs: Union[Dict, List[Dict]]) -> pd.DataFrame:
+    """Legacy {"values": [headers] + rows} payload(s) as one DataFrame"""
+    tabs = [tabs] if isinstance(tabs, dict) else tabs
+    frames = [
+        pd.DataFrame(tab['values'][1:], columns=tab['values'][0])
+        for tab in tabs
+        if isinstance(tab, dict) and len(tab.get('values') or []) > 1
+    ]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True).fillna("").astype(str)
+
+
+def build_crawl_frame(source) -> pd.DataFrame:
+    """
+    The single DataFrame every SEO audit calculator runs on.
+
+    source is an Internal:All CSV path (read in chunks, see read_crawl_csv),
+    an already loaded DataFrame or the legacy {"values": ...} payload. Only
+    KPI_COLUMNS are kept, values are strings with blanks as "" (what the
+    calculators compare against), CATEGORICAL_COLUMNS are categoricals and
+    spaces in column names become underscores.
+    """
+    if isinstance(source, pd.DataFrame):
+        df = source[[column for column in KPI_COLUMNS if column in source.columns]].fillna("").astype(str)
+        df = _typed(df)
+    elif isinstance(source, (dict, list)):
+        df = _typed(_frame_from_values(source))
+    else:
+        df = read_crawl_csv(source)
+    if df.empty:
+        return pd.DataFrame()
+    return _prune_and_rename(df)
+
+
+def h_tags_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Same frame with dashes replaced too ('H1-1' -> 'H1_1'), as HTagsCalculator expects"""
+    view = df.copy(deep=False)
+    view.columns = [normalize_column_name(column, replace_dashes=True) for column in df.columns]
+    return view
@@ -0,0 +1,46 @@
+import pandas as pd
+from typing import Callable, Dict, Optional
+from screaming_frog.seo_audit_dashboard.crawl_frame import h_tags_frame
+from screaming_frog.seo_audit_dashboard.crawl_features import CrawlFeatures
+from screaming_frog.seo_audit_dashboard.indexablity import IndexabilityCalculator
+from screaming_frog.seo_audit_dashboard.status_code import StatusCodeCalculator
+from screaming_frog.seo_audit_dashboard.page_title import PageTitleCalculator
+from screaming_frog.seo_audit_dashboard.meta_description import MetaDescriptionCalculator
+from screaming_frog.seo_audit_dashboard.h_tags import HTagsCalculator
+
+# Dashboard section -> calculator factory. Every calculator gets the same
+# shared crawl frame from build_crawl_frame and its CrawlFeatures cache; add
+# new audit sections here.
+KPI_REGISTRY: Dict[str, Callable[[pd.DataFrame, CrawlFeatures], object]] = {
+    "indexability": lambda df, features: IndexabilityCalculator(df, features),
+    "status_code": lambda df, features: StatusCodeCalculator(df, features),
+    "page_title": lambda df, features: PageTitleCalculator(df, features),
+    "meta_description": lambda df, features: MetaDescriptionCalculator(df, features),
+    "h_tags": lambda df, features: HTagsCalculator(h_tags_frame(df), features),
+}
+
+
+def build_section(name: str, df: pd.DataFrame, features: Optional[CrawlFeatures] = None) -> Optional[Dict]:
+    """
+    {"kpis": ..., "tables": {table: DataFrame}} for one registered section;
+    None if it fails, so one broken section does not lose the others.
+    """
+    try:
+        calculator = KPI_REGISTRY[name](df, features if features is not None else CrawlFeatures(df))
+        return {"kpis": calculator.calculate_kpis(), "tables": calculator.get_tables()}
+    except Exception as e:
+        print(f"Error processing {name} KPIs: {e}")
+        return None
+
+
+def build_all_sections(df: pd.DataFrame) -> Dict[str, Optional[Dict]]:
+    """Run every registered calculator against one frame from build_crawl_frame"""
+    if df.empty:
+        print("Error: No data to process")
+        return {name: None for name in KPI_REGISTRY}
+
+    print(f"Running {len(KPI_REGISTRY)} SEO audit calculators on {len(df)} URLs")
+    # One feature cache per crawl: HTML filter, has-value and duplicate masks
+    # are shared between sections (e.g. H1 for page titles and h_tags)
+    features = CrawlFeatures(df)
+    return {name: build_section(name, df, features) for name in KPI_REGISTRY}
@@ -1,93 +1,54 @@
 
 import pandas as pd
 import json
-from typing import Dict, List, Tuple, Union
-import numpy as np
-from abc import ABC, abstractmethod
-
-class BaseKPICalculator(ABC):
-    """Base class for all KPI calculators."""
-    
-    def __init__(self, df: pd.DataFrame):
-        self.df = df
-        self.kpis = {}
-    
-    @abstractmethod
-    def calculate_kpis(self) -> Dict:
-        """Calculate KPIs specific to this category."""
-        pass
+from typing import Dict
+from screaming_frog.seo_audit_dashboard.crawl_features import BaseKPICalculator
 
 class MetaDescriptionCalculator(BaseKPICalculator):
     """Calculate meta description-related KPIs and generate detailed analysis."""
     
+    MASKS = {
+        'all_meta_descriptions': lambda f: f.html_mask() & f.has_value('Meta_Description_1'),
+        'missing_meta_descriptions': lambda f: f.html_mask() & f.is_missing('Meta_Description_1'),
+        'duplicate_meta_descriptions': lambda f: f.html_mask() & f.has_value('Meta_Description_1') & f.duplicated('Meta_Description_1'),
+        'over_160_characters': lambda f: f.html_mask() & (f.numeric('Meta_Description_1_Length') > 160),
+        'below_70_characters': lambda f: f.html_mask() & (f.numeric('Meta_Description_1_Length') > 70) & (f.numeric('Meta_Description_1_Length') > 0),
+        'multiple_meta_descriptions': lambda f: f.html_mask() & (f.not_blank('Meta_Description_2') | f.not_blank('Meta_Description_3')),
+    }
+    
     def calculate_kpis(self) -> Dict:
         """Calculate all meta description KPIs with specific filtering logic."""
         # Base filter: Content Type = 'text/html; charset=UTF-8'
-        html_mask = self.df['Content_Type'] == 'text/html; charset=UTF-8'
-        html_pages = self.df[html_mask]
-        total_html_pages = len(html_pages)
+        total_html_pages = self.features.html_count()
         
         # 1. All Meta Descriptions: Count all pages with any meta description content
-        all_meta_desc_mask = html_mask & (
-            self.df['Meta_Description_1'].notna() & 
-            (self.df['Meta_Description_1'] != '') &
-            (self.df['Meta_Description_1'].astype(str).str.strip() != '')
-        )
+        all_meta_desc_mask = self._mask('all_meta_descriptions')
         all_meta_desc_count = int(all_meta_desc_mask.sum())
         all_meta_desc_percentage = (all_meta_desc_count / total_html_pages * 100) if total_html_pages > 0 else 0
         
         # 2. Missing Meta Descriptions: Null/empty values in Meta Description 1
-        missing_meta_desc_mask = html_mask & (
-            self.df['Meta_Description_1'].isna() | 
-            (self.df['Meta_Description_1'] == '') |
-            (self.df['Meta_Description_1'].astype(str).str.strip() == '')
-        )
+        missing_meta_desc_mask = self._mask('missing_meta_descriptions')
         missing_meta_desc_count = int(missing_meta_desc_mask.sum())
         missing_meta_desc_percentage = (missing_meta_desc_count / total_html_pages * 100) if total_html_pages > 0 else 0
         
         # 3. Duplicate Meta Descriptions: Same meta description text appears multiple times
-        # First get non-empty meta descriptions
-        non_empty_meta_desc = html_pages[
-            html_pages['Meta_Description_1'].notna() & 
-            (html_pages['Meta_Description_1'] != '') &
-            (html_pages['Meta_Description_1'].astype(str).str.strip() != '')
-        ]
-        
-        # Find duplicates
-        duplicate_meta_desc_mask = html_mask & (
-            self.df['Meta_Description_1'].notna() & 
-            (self.df['Meta_Description_1'] != '') &
-            (self.df['Meta_Description_1'].astype(str).str.strip() != '') &
-            self.df['Meta_Description_1'].duplicated(keep=False)
-        )
+        duplicate_meta_desc_mask = self._mask('duplicate_meta_descriptions')
         duplicate_meta_desc_count = int(duplicate_meta_desc_mask.sum())
         duplicate_meta_desc_percentage = (duplicate_meta_desc_count / total_html_pages * 100) if total_html_pages > 0 else 0
         
         # 4. Over 160 Characters: Use Meta Description 1 Length > 160
-        over_160_mask = html_mask & (
-            self.df['Meta_Description_1_Length'].notna() & 
-            (pd.to_numeric(self.df['Meta_Description_1_Length'], errors='coerce') > 160)
-        )
+        over_160_mask = self._mask('over_160_characters')
         over_160_count = int(over_160_mask.sum())
         over_160_percentage = (over_160_count / total_html_pages * 100) if total_html_pages > 0 else 0
         
         # 5. Below 70 Characters: Use Meta Description 1 Length < 70
-        below_70_mask = html_mask & (
-            self.df['Meta_Description_1_Length'].notna() & 
-            (pd.to_numeric(self.df['Meta_Description_1_Length'], errors='coerce') > 70) &
-            (pd.to_numeric(self.df['Meta_Description_1_Length'], errors='coerce') > 0) # Exclude empty descriptions
-        )
+        below_70_mask = self._mask('below_70_characters')
         below_70_count = int(below_70_mask.sum())
         below_70_percentage = (below_70_count / total_html_pages * 100) if total_html_pages > 0 else 0
         
         # 6. Multiple Meta Descriptions: Check if there are multiple meta description tags
         # This would require checking if Meta Description 2, 3, etc. exist and have values
-        multiple_meta_desc_mask = html_mask & (
-            (self.df.get('Meta_Description_2', pd.Series()).notna() & 
-             (self.df.get('Meta_Description_2', pd.Series()) != '')) |
-            (self.df.get('Meta_Description_3', pd.Series()).notna() & 
-             (self.df.get('Meta_Description_3', pd.Series()) != ''))
-        )
+        multiple_meta_desc_mask = self._mask('multiple_meta_descriptions')
         multiple_meta_desc_count = int(multiple_meta_desc_mask.sum())
         multiple_meta_desc_percentage = (multiple_meta_desc_count / total_html_pages * 100) if total_html_pages > 0 else 0
         
@@ -124,12 +85,7 @@ class MetaDescriptionCalculator(BaseKPICalculator):
     
     def get_missing_meta_descriptions_table(self) -> pd.DataFrame:
         """Get table for URLs missing meta descriptions."""
-        html_mask = self.df['Content_Type'] == 'text/html; charset=UTF-8'
-        missing_meta_desc_mask = html_mask & (
-            self.df['Meta_Description_1'].isna() | 
-            (self.df['Meta_Description_1'] == '') |
-            (self.df['Meta_Description_1'].astype(str).str.strip() == '')
-        )
+        missing_meta_desc_mask = self._mask('missing_meta_descriptions')
         
         filtered_df = self.df[missing_meta_desc_mask]
         
@@ -137,13 +93,7 @@ class MetaDescriptionCalculator(BaseKPICalculator):
     
     def get_duplicate_meta_descriptions_table(self) -> pd.DataFrame:
         """Get table for URLs with duplicate meta descriptions."""
-        html_mask = self.df['Content_Type'] == 'text/html; charset=UTF-8'
-        duplicate_meta_desc_mask = html_mask & (
-            self.df['Meta_Description_1'].notna() & 
-            (self.df['Meta_Description_1'] != '') &
-            (self.df['Meta_Description_1'].astype(str).str.strip() != '') &
-            self.df['Meta_Description_1'].duplicated(keep=False)
-        )
+        duplicate_meta_desc_mask = self._mask('duplicate_meta_descriptions')
         
         filtered_df = self.df[duplicate_meta_desc_mask]
         
@@ -151,11 +101,7 @@ class MetaDescriptionCalculator(BaseKPICalculator):
     
     def get_over_160_characters_table(self) -> pd.DataFrame:
         """Get table for URLs with meta descriptions over 160 characters."""
-        html_mask = self.df['Content_Type'] == 'text/html; charset=UTF-8'
-        over_160_mask = html_mask & (
-            self.df['Meta_Description_1_Length'].notna() & 
-            (pd.to_numeric(self.df['Meta_Description_1_Length'], errors='coerce') > 160)
-        )
+        over_160_mask = self._mask('over_160_characters')
         
         filtered_df = self.df[over_160_mask]
         
@@ -163,12 +109,7 @@ class MetaDescriptionCalculator(BaseKPICalculator):
     
     def get_below_70_characters_table(self) -> pd.DataFrame:
         """Get table for URLs with meta descriptions below 70 characters."""
-        html_mask = self.df['Content_Type'] == 'text/html; charset=UTF-8'
-        below_70_mask = html_mask & (
-            self.df['Meta_Description_1_Length'].notna() & 
-            (pd.to_numeric(self.df['Meta_Description_1_Length'], errors='coerce') > 70) &
-            (pd.to_numeric(self.df['Meta_Description_1_Length'], errors='coerce') > 0) # Exclude empty descriptions
-        )
+        below_70_mask = self._mask('below_70_characters')
         
         filtered_df = self.df[below_70_mask]
         
@@ -176,13 +117,7 @@ class MetaDescriptionCalculator(BaseKPICalculator):
     
     def get_multiple_meta_descriptions_table(self) -> pd.DataFrame:
         """Get table for URLs with multiple meta descriptions."""
-        html_mask = self.df['Content_Type'] == 'text/html; charset=UTF-8'
-        multiple_meta_desc_mask = html_mask & (
-            (self.df.get('Meta_Description_2', pd.Series()).notna() & 
-             (self.df.get('Meta_Description_2', pd.Series()) != '')) |
-            (self.df.get('Meta_Description_3', pd.Series()).notna() & 
-             (self.df.get('Meta_Description_3', pd.Series()) != ''))
-        )
+        multiple_meta_desc_mask = self._mask('multiple_meta_descriptions')
         
         filtered_df = self.df[multiple_meta_desc_mask]
         
@@ -195,6 +130,16 @@ class MetaDescriptionCalculator(BaseKPICalculator):
         
         return filtered_df[columns].copy()
     
+    def get_tables(self) -> Dict[str, pd.DataFrame]:
+        """All report tables by name, as DataFrames indexed by crawl row."""
+        return {
+            'missing_meta_descriptions': self.get_missing_meta_descriptions_table(),
+            'duplicate_meta_descriptions': self.get_duplicate_meta_descriptions_table(),
+            'over_160_characters': self.get_over_160_characters_table(),
+            'below_70_characters': self.get_below_70_characters_table(),
+            'multiple_meta_descriptions': self.get_multiple_meta_descriptions_table()
+        }
+    
     def export_meta_description_report(self, filename: str = 'meta_description_report.json') -> Dict:
         """Export detailed meta description report."""
         if not self.kpis:
@@ -203,11 +148,7 @@ class MetaDescriptionCalculator(BaseKPICalculator):
         report = {
             'kpis': self.kpis,
             'tables': {
-                'missing_meta_descriptions': self.get_missing_meta_descriptions_table().to_dict('records'),
-                'duplicate_meta_descriptions': self.get_duplicate_meta_descriptions_table().to_dict('records'),
-                'over_160_characters': self.get_over_160_characters_table().to_dict('records'),
-                'below_70_characters': self.get_below_70_characters_table().to_dict('records'),
-                'multiple_meta_descriptions': self.get_multiple_meta_descriptions_table().to_dict('records')
+                name: table.to_dict('records') for name, table in self.get_tables().items()
             }
         }
         
@@ -220,138 +161,3 @@ class MetaDescriptionCalculator(BaseKPICalculator):
         #     print(f"Could not save file: {e}")
         
         return report
-
-
-class DataProcessor:
-    """Process crawl data and initialize it for KPI calculations."""
-    
-    def __init__(self, data: Union[str, dict, List[dict]], transform_column_names: bool = True):
-        self.raw_data = data
-        self.transform_column_names = transform_column_names
-        self.df = self._process_data()
-    
-    def _process_data(self) -> pd.DataFrame:
-        """Process input data into a pandas DataFrame."""
-        if isinstance(self.raw_data, str):
-            # JSON string
-            try:
-                parsed_data = json.loads(self.raw_data)
-                return self._json_to_dataframe(parsed_data)
-            except json.JSONDecodeError as e:
-                raise ValueError(f"Invalid JSON string: {e}")
-        elif isinstance(self.raw_data, (dict, list)):
-            return self._json_to_dataframe(self.raw_data)
-        else:
-            raise ValueError("Data must be JSON string, dictionary, or list of dictionaries")
-    
-    def _json_to_dataframe(self, json_data: Union[dict, List[dict]]) -> pd.DataFrame:
-        """Convert JSON crawl data to DataFrame."""
-        all_data = []
-        
-        # Handle different data structures
-        if isinstance(json_data, list):
-            # List of tabs
-            for tab_data in json_data:
-                if isinstance(tab_data, dict) and 'values' in tab_data:
-                    df_temp = self._process_tab_data(tab_data)
-                    if not df_temp.empty:
-                        all_data.append(df_temp)
-        elif isinstance(json_data, dict):
-            # Single tab
-            if 'values' in json_data:
-                df_temp = self._process_tab_data(json_data)
-                if not df_temp.empty:
-                    all_data.append(df_temp)
-        
-        if not all_data:
-            print("Warning: No valid data found to process")
-            return pd.DataFrame()
-        
-        # return pd.concat(all_data, ignore_index=True)
-        final_df = pd.concat(all_data, ignore_index=True)
-        
-        # Transform column names if requested
-        if self.transform_column_names:
-            final_df.columns = [col.replace(" ", "_") for col in final_df.columns]
-        
-        return final_df
-    
-    def _process_tab_data(self, tab_data: dict) -> pd.DataFrame:
-        """Process individual tab data."""
-        if 'values' in tab_data and len(tab_data['values']) > 0:
-            headers = tab_data['values'][0]
-            data_rows = tab_data['values'][1:] if len(tab_data['values']) > 1 else []
-            
-            if data_rows:
-                return pd.DataFrame(data_rows, columns=headers)
-        
-        return pd.DataFrame()
-    
-    def get_dataframe(self) -> pd.DataFrame:
-        """Get the processed DataFrame."""
-        return self.df
-    
-    def get_data_info(self) -> Dict:
-        """Get information about the processed data."""
-        return {
-            'total_rows': int(len(self.df)),
-            'columns': list(self.df.columns),
-            'memory_usage': int(self.df.memory_usage(deep=True).sum()),
-            'tabs_processed': 1 if isinstance(self.raw_data, dict) else len(self.raw_data) if isinstance(self.raw_data, list) else 0
-        }
-
-
-def meta_description_kpis_and_tables(data):
-    """Main function to process data and generate meta description KPIs and tables."""
-    
-    try:
-        # Wrap single data object in list if needed
-        if isinstance(data, dict):
-            data_process = [data]
-        else:
-            data_process = data
-        
-        # Process the data
-        processor = DataProcessor(data_process)
-        df = processor.get_dataframe()
-        
-        if df.empty:
-            print("Error: No data to process")
-            return None
-        
-        print("Data Info:")
-        print(json.dumps(processor.get_data_info(), indent=2))
-        print("\n" + "="*50 + "\n")
-        
-        # Calculate Meta Description KPIs
-        meta_desc_calc = MetaDescriptionCalculator(df)
-        meta_desc_kpis = meta_desc_calc.calculate_kpis()
-        
-        # Export full report
-        full_result = meta_desc_calc.export_meta_description_report('meta_description_analysis.json')
-        
-        return full_result
-        
-    except Exception as e:
-        print(f"Error processing data: {e}")
-        return None
-
-
-# Example usage
-# if __name__ == "__main__":
-#     # Test with sample data
-#     sample_data = {
-#         'values': [
-#             ['Address', 'Content Type', 'Meta Description 1', 'Meta Description 1 Length', 'Meta Description 1 Pixel Width', 'Title 1'],
-#             ['https://example.com', 'text/html; charset=UTF-8', 'This is a sample meta description for the home page', 52, 320, 'Home Page'],
-#             ['https://example.com/page1', 'text/html; charset=UTF-8', '', 0, 0, 'Page 1'],
-#             ['https://example.com/page2', 'text/html; charset=UTF-8', 'This is a sample meta description for the home page', 52, 320, 'Page 2'],
-#             ['https://example.com/page3', 'text/html; charset=UTF-8', 'This is a very long meta description that exceeds the recommended 160 character limit and should be flagged as too long for optimal search engine display', 170, 1100, 'Page 3'],
-#             ['https://example.com/page4', 'text/html; charset=UTF-8', 'Short', 5, 30, 'Page 4']
-#         ]
-#     }
-    
-#     result = meta_description_kpis_and_tables(sample_data)
-#     if result:
-#         print("Meta Description KPIs calculated successfully!")
-#         print(json.dumps(result['kpis'], indent=2))
\ No newline at end of file
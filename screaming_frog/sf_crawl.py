@@ -1,19 +1,36 @@
 # sheets_service.py - Modified for direct database storage
 import os
-import subprocess
 import pandas as pd
-import tempfile
 import uuid
 from datetime import datetime
 from typing import List, Dict
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from screaming_frog.seo_audit_dashboard.indexablity import indexability_kpis_and_table
-from screaming_frog.seo_audit_dashboard.status_code import status_code_kpis_and_table
-from screaming_frog.seo_audit_dashboard.page_title import page_title_kpis_and_table
-from screaming_frog.seo_audit_dashboard.meta_description import meta_description_kpis_and_tables
-from screaming_frog.seo_audit_dashboard.h_tags import h_tags_kpis_and_table
+from screaming_frog.seo_audit_dashboard.crawl_frame import build_crawl_frame
+from screaming_frog.seo_audit_dashboard.kpi_registry import build_all_sections
+from screaming_frog.seo_audit_dashboard.audit_store import save_audit, delete_audit
 from auth.models import Sf_crawl_data 
+from dotenv import load_dotenv
+load_dotenv()
+
+# Seconds a single Screaming Frog crawl may run before it is killed
+SF_CRAWL_TIMEOUT = int(os.environ.get("SF_CRAWL_TIMEOUT", 600))
+
+
+def build_crawl_command(domain: str, output_dir: str, tabs_arg: str) -> List[str]:
+    """Headless Screaming Frog command line exporting tabs_arg into output_dir"""
+    sf_path = os.environ.get("SF_PATH")
+    if not sf_path or not os.path.exists(sf_path):
+        raise HTTPException(500, "Screaming Frog SEO Spider not found. Please install it and set SF_PATH.")
+    
+    return [
+        sf_path,
+        "--crawl", domain,
+        "--headless",
+        "--export-tabs", tabs_arg,
+        "--output-folder", output_dir,
+        "--overwrite"
+    ]
 
 
 class ScreamingFrogCrawlService:
@@ -22,114 +39,61 @@ class ScreamingFrogCrawlService:
     def __init__(self, db: Session):
         self.db = db
     
-    def crawl_and_save_to_db(
+    def process_crawl_output(
         self,
+        output_dir: str,
         domain: str,
         user_id: int,
-        export_tabs: List[str] = None
+        batch_uuid: str = None
     ) -> Dict:
         """
-        Crawl domain with Screaming Frog and save results directly to database.
+        Post-processing stage of a crawl: read the exported Internal:All CSV,
+        calculate the audit KPIs and save them to the database.
         
-        :param domain: Domain to crawl
-        :param user_id: User ID for database record
-        :param export_tabs: List of Screaming Frog tab names
-        :return: Dictionary with crawl results and database record info
+        :param output_dir: Folder Screaming Frog exported into
+        :param batch_uuid: UUID for the crawl record (generated if omitted)
         """
-        if export_tabs is None:
-            export_tabs = ["Internal:All"]
+        batch_uuid = batch_uuid or uuid.uuid4().hex
         
-        if not export_tabs:
-            raise HTTPException(400, "At least one export tab must be specified.")
-
-        # Generate unique UUID for this crawl batch
-        batch_uuid = uuid.uuid4().hex
-        
-        # Prepare comma-separated tabs for Screaming Frog
-        tabs_arg = ",".join(export_tabs)
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            print(f"Using temporary directory: {temp_dir}")
-            try:
-                # Single crawl for all tabs
-                self._run_screaming_frog_crawl(domain, temp_dir, tabs_arg)
-                
-                # Process the main "Internal:All" CSV for KPI calculation
-                internal_all_csv = os.path.join(temp_dir, "Internal_All.csv")
-                
-                if not os.path.exists(internal_all_csv):
-                    raise HTTPException(400, "Internal:All data not found in crawl results.")
-                
-                # Read and process the CSV data
-                df = pd.read_csv(internal_all_csv).fillna("").astype(str)
-                
-                if df.empty:
-                    raise HTTPException(400, "No data found in crawl results.")
-                
-                # Convert DataFrame to the format expected by KPI functions
-                crawl_data = self._convert_df_to_kpi_format(df)
-                
-                # Calculate all KPIs
-                dashboard_data = {
-                    "indexability": indexability_kpis_and_table(crawl_data),
-                    "status_code": status_code_kpis_and_table(crawl_data),
-                    "page_title": page_title_kpis_and_table(crawl_data),
-                    "meta_description": meta_description_kpis_and_tables(crawl_data),
-                    "h_tags": h_tags_kpis_and_table(crawl_data)
-                }
-                
-                # Save to database
-                db_record = self._save_to_database(
-                    uuid=batch_uuid,
-                    user_id=user_id,
-                    crawl_url=domain,
-                    crawl_data=dashboard_data,
-                    row_count=len(df),
-                    is_seleted ="True"
-                )
-                
-                return {
-                    "success": True,
-                    "message": f"Successfully crawled {domain} and saved to database",
-                    "uuid": batch_uuid,
-                    "rows_processed": len(df),
-                    "database_id": db_record.id,
-                    "dashboard_data": dashboard_data
-                }
-                
-            except subprocess.CalledProcessError as e:
-                raise HTTPException(500, f"Screaming Frog crawl failed: {e}")
-            except Exception as e:
-                raise HTTPException(500, f"Error during crawling and data processing: {e}")
-    
-    def _run_screaming_frog_crawl(self, domain: str, output_dir: str, tabs_arg: str):
-        """Run a single Screaming Frog crawl exporting all specified tabs"""
-        sf_path = os.environ.get("SF_PATH")
-        if not sf_path or not os.path.exists(sf_path):
-            raise HTTPException(500, "Screaming Frog SEO Spider not found. Please install it and set SF_PATH.")
-        
-        print(f"Starting Screaming Frog crawl for: {domain}")
-        
-        subprocess.run([
-            sf_path,
-            "--crawl", domain,
-            "--headless",
-            "--export-tabs", tabs_arg,
-            "--output-folder", output_dir,
-            "--overwrite"
-        ], check=True, timeout=600)
-    
-    def _convert_df_to_kpi_format(self, df: pd.DataFrame) -> Dict:
-        """Convert DataFrame to the format expected by KPI calculation functions"""
-        # Convert DataFrame to list of dictionaries (rows)
-        rows_data = df.to_dict('records')
+        # Process the main "Internal:All" CSV for KPI calculation
+        internal_all_csv = os.path.join(output_dir, "Internal_All.csv")
+        
+        if not os.path.exists(internal_all_csv):
+            raise HTTPException(400, "Internal:All data not found in crawl results.")
+        
+        # Stream only the KPI columns, typed, into one compact frame
+        df = build_crawl_frame(internal_all_csv)
         
-        # Create headers list
-        headers = df.columns.tolist()
+        if df.empty:
+            raise HTTPException(400, "No data found in crawl results.")
+        
+        # Calculate all KPIs on the shared frame; tables go to S3 as Parquet
+        # and only KPIs plus table sizes are stored in the database
+        dashboard_data = save_audit(user_id, batch_uuid, build_all_sections(df))
+        
+        # Save to database; without the row nobody can reach the uploaded
+        # tables, so remove them if the commit fails
+        try:
+            db_record = self._save_to_database(
+                uuid=batch_uuid,
+                user_id=user_id,
+                crawl_url=domain,
+                crawl_data=dashboard_data,
+                row_count=len(df),
+                is_seleted ="True"
+            )
+        except Exception:
+            self.db.rollback()
+            delete_audit(user_id, batch_uuid)
+            raise
         
-        # Create the format expected by your KPI functions
         return {
-            "values": [headers] + [list(row.values()) for row in rows_data]
+            "success": True,
+            "message": f"Successfully crawled {domain} and saved to database",
+            "uuid": batch_uuid,
+            "rows_processed": len(df),
+            "database_id": db_record.id,
+            "dashboard_data": dashboard_data
         }
     
     def _save_to_database(
@@ -174,4 +138,27 @@ class ScreamingFrogCrawlService:
         if not record:
             raise HTTPException(404, f"No crawl data found for UUID {uuid}")
         
-        return record.crawl_json_data
\ No newline at end of file
+        return record.crawl_json_data
+    
+    def delete_crawl(self, uuid: str, user_id: int):
+        """Delete a crawl record together with its stored audit tables"""
+        
+        record = (
+            self.db.query(Sf_crawl_data)
+            .filter_by(uuid=uuid, user_id=user_id)
+            .first()
+        )
+        
+        if not record:
+            raise HTTPException(404, f"No crawl data found for UUID {uuid}")
+        
+        # Remove the row in the same transaction as the S3 objects: if the
+        # S3 delete fails the row stays and the delete can be retried
+        self.db.delete(record)
+        self.db.flush()
+        try:
+            delete_audit(user_id, uuid)
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(500, f"Failed to delete crawl tables: {e}")
+        self.db.commit()
@@ -3,7 +3,6 @@ import os
 import subprocess
 import pandas as pd
 import tempfile
-from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
@@ -20,14 +19,14 @@ from typing import List, Dict
 import pandas as pd
 from fastapi import HTTPException
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from google_clients import get_google_service
 
 
 class GoogleSheetsService:
     def __init__(self, integration: Integration):
         self.integration = integration
         self.credentials = self._create_credentials()
-        self.service = build('sheets', 'v4', credentials=self.credentials)
+        self.service = get_google_service('sheets', 'v4', self.credentials)
         self.sheets_api = self.service.spreadsheets()
 
     def _create_credentials(self) -> Credentials:
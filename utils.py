@@ -8,14 +8,13 @@ import json
 import pandas as pd
 from typing import List, Optional
 import os
-import spacy
+from branded_matcher import branded_mask
+from nlp_service import has_brand_entity
 from dotenv import load_dotenv
 load_dotenv()
 from collections import defaultdict
 import json
 import pandas as pd
-# Load the large English model
-nlp = spacy.load("en_core_web_sm")
 
 from jose import JWTError, jwt
 from typing import Optional
@@ -25,6 +24,8 @@ BRANDED_JSON_PATH = os.environ.get("BRANDED_JSON_PATH")
 
 SECRET_KEY = os.environ.get("JWT_SECRET")
 ALGORITHM = os.environ.get("JWT_ALGORITHM")
+# Google Ads KeywordSeed accepts at most 20 keywords per request
+MAX_SEED_KEYWORDS = 20
 print(f"Path: {BRANDED_JSON_PATH}")
 # print(BRANDED_JSON_PATH)
 def remove_keywords(data):
@@ -70,10 +71,8 @@ def add_keywords_to_json(new_keywords):
             
 def filter_non_branded_keywords(keyword_list):
     """Removes keywords that are recognized as brands (ORG or PRODUCT) by spaCy."""
-    return [
-        item for item in keyword_list
-        if not any(ent.label_ in ["ORG", "PRODUCT"] for ent in nlp(item.Keyword).ents)
-    ]
+    is_brand = has_brand_entity([item.Keyword for item in keyword_list], labels=["ORG", "PRODUCT"])
+    return [item for item, branded in zip(keyword_list, is_brand) if not branded]
 
 def flatten_seo_data(json_data, search_volume_df):
     flattened_data = []
@@ -359,24 +358,9 @@ def flatten_ppc_data(json_data, df):
 
 
 def remove_branded_keywords(keywords_list, branded_keywords_list):
-    # Create a new list to store filtered keywords
-    filtered_keywords = []
-    
-    # Convert branded keywords to lowercase for case-insensitive comparison
-    branded_keywords_lower = [brand.lower() for brand in branded_keywords_list]
-    
-    # Filter out branded keywords
-    for keyword_item in keywords_list:
-        keyword_lower = keyword_item.Keyword.lower()
-        
-        # Check if the keyword contains any branded keyword
-        is_branded = any(brand in keyword_lower for brand in branded_keywords_lower)
-        
-        # If not branded, add to filtered list
-        if not is_branded:
-            filtered_keywords.append(keyword_item)
-    
-    return filtered_keywords
+    # Drop every keyword that contains any branded term (case-insensitive)
+    is_branded = branded_mask([item.Keyword for item in keywords_list], branded_keywords_list)
+    return [item for item, branded in zip(keywords_list, is_branded) if not branded]
 
 def filter_by_branded(
     keywords_list,
@@ -387,21 +371,14 @@ def filter_by_branded(
     If include=True, returns only keywords that contain any branded term.
     If include=False, returns only keywords that do NOT contain any branded term.
     """
-    result = []
-    branded_lower = [b.lower() for b in branded_keywords_list]
-
-    for item in keywords_list:
-        has_brand = any(brand in item.Keyword.lower() for brand in branded_lower)
-        if (include and has_brand) or (not include and not has_brand):
-            result.append(item)
-
-    return result
+    has_brand = branded_mask([item.Keyword for item in keywords_list], branded_keywords_list)
+    return [item for item, branded in zip(keywords_list, has_brand) if branded == include]
 
 
 
 def extract_keywords(json_string):
     """Validate JSON and extract 'keywords' list if present.
-    Returns keywords list if valid and <= 20 keywords with duplicates removed,
+    Returns keywords list if valid and <= MAX_SEED_KEYWORDS keywords with duplicates removed,
     or a tuple (False, error_message) otherwise.
     """
     try:
@@ -417,8 +394,8 @@ def extract_keywords(json_string):
                     unique_keywords.append(keyword)
             
 
-            if len(unique_keywords) > 20:
-                return False, "Please enter only 20 keywords."
+            if len(unique_keywords) > MAX_SEED_KEYWORDS:
+                return False, f"Please enter only {MAX_SEED_KEYWORDS} keywords."
                 
             return unique_keywords  
         else:
@@ -492,6 +469,76 @@ def enforce_user_api_limit(user, db):
 
 
 
+def _api_permission(db: Session, user_id: int, api_name: str):
+    """The usage row that meters api_name for this user, reset at the start of each month"""
+    if api_name == "ppc_cluster":
+        permission = db.query(PPCCluster).filter_by(user_id=user_id).first()
+    elif api_name == "social_media":
+        permission = db.query(SocialMedia).filter_by(user_id=user_id).first()         
+    elif api_name == "seo_cluster":
+        permission = db.query(SEOCluster).filter_by(user_id=user_id).first()
+    elif api_name == "seo_csv":
+        permission = db.query(SEOCSV).filter_by(user_id=user_id).first()         
+    elif api_name == "ppc_csv":
+        permission = db.query(PPCCSV).filter_by(user_id=user_id).first()
+    elif api_name == "seo_keywords":
+        permission = db.query(SEOKeywords).filter_by(user_id=user_id).first()        
+    elif api_name == "ppc_keywords":
+        permission = db.query(PPCKeywords).filter_by(user_id=user_id).first()
+    # elif api_name == "social_media_file":
+    #     permission = db.query().filter_by(user_id= user.id).first()    
+    # 
+    elif api_name == "content_generation":
+        permission = db.query(Contentgeneration).filter_by(user_id=user_id).first()  
+    # Add more checks for other APIs here as needed
+    
+    else:
+        raise HTTPException(status_code=403, detail="No permission for this API")
+
+    if not permission:
+        raise HTTPException(status_code=403, detail="No permission for this API")
+
+    # Reset monthly usage if needed
+    now = datetime.utcnow()
+    if permission.last_reset.month != now.month or permission.last_reset.year != now.year:
+        permission.call_count = 0
+        permission.last_reset = now
+    return permission
+
+
+def charge_api_calls(db: Session, user, api_name: str, calls: int):
+    """
+    Charge several calls at once, for requests that cost more than one
+    (e.g. bulk keyword jobs); all or nothing against the monthly limit.
+    """
+    if user.role == "admin" or calls <= 0:
+        return
+
+    permission = _api_permission(db, user.id, api_name)
+    if permission.call_count + calls > permission.call_limit:
+        remaining = max(0, permission.call_limit - permission.call_count)
+        raise HTTPException(
+            status_code=429,
+            detail=f"API call limit exceeded: this request needs {calls} more calls, {remaining} left this month"
+        )
+
+    permission.call_count += calls
+    db.commit()
+
+
+def refund_api_calls(db: Session, user_id: int, api_name: str, calls: int):
+    """
+    Give back calls charged for a request that then failed (e.g. a bulk
+    keyword job the Ads API rejected). Never drops usage below zero, e.g.
+    when the monthly reset happened in between.
+    """
+    if calls <= 0:
+        return
+    permission = _api_permission(db, user_id, api_name)
+    permission.call_count = max(0, permission.call_count - calls)
+    db.commit()
+
+
 def check_api_limit(api_name: str):
     def _inner(request: Request, db: Session = Depends(get_db), user=Depends(get_current_user)):
 
@@ -499,44 +546,7 @@ def check_api_limit(api_name: str):
             return user  # Admin bypasses the API limits
 
         # Check the corresponding table based on the `api_name`
-        if api_name == "ppc_cluster":
-            permission = db.query(PPCCluster).filter_by(user_id=user.id).first()
-        elif api_name == "social_media":
-            permission = db.query(SocialMedia).filter_by(user_id=user.id).first()         
-        elif api_name == "seo_cluster":
-            permission = db.query(SEOCluster).filter_by(user_id=user.id).first()
-        elif api_name == "seo_csv":
-            permission = db.query(SEOCSV).filter_by(user_id=user.id).first()         
-        elif api_name == "ppc_csv":
-            permission = db.query(PPCCSV).filter_by(user_id=user.id).first()
-        elif api_name == "seo_keywords":
-            permission = db.query(SEOKeywords).filter_by(user_id=user.id).first()        
-        elif api_name == "ppc_keywords":
-            permission = db.query(PPCKeywords).filter_by(user_id=user.id).first()
-        elif api_name == "seo_cluster":
-            permission = db.query(SEOCluster).filter_by(user_id=user.id).first()
-        elif api_name == "ppc_cluster":
-            permission = db.query(PPCCluster).filter_by(user_id=user.id).first()
-        elif api_name == "social_media":
-            permission = db.query(SocialMedia).filter_by(user_id=user.id).first()   
-        # elif api_name == "social_media_file":
-        #     permission = db.query().filter_by(user_id= user.id).first()    
-        # 
-        elif api_name == "content_generation":
-            permission = db.query(Contentgeneration).filter_by(user_id=user.id).first()  
-        # Add more checks for other APIs here as needed
-        
-        else:
-            raise HTTPException(status_code=403, detail="No permission for this API")
-
-        if not permission:
-            raise HTTPException(status_code=403, detail="No permission for this API")
-
-        # Reset monthly usage if needed
-        now = datetime.utcnow()
-        if permission.last_reset.month != now.month or permission.last_reset.year != now.year:
-            permission.call_count = 0
-            permission.last_reset = now
+        permission = _api_permission(db, user.id, api_name)
 
         if permission.call_count >= permission.call_limit:
             raise HTTPException(status_code=429, detail="API call limit exceeded")